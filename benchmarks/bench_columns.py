@@ -0,0 +1,54 @@
+"""
+Benchmark: duración total y orden por duración de una
+playlist sintética, con las columnas de SongColumns (NumPy si está instalado)
+frente a recorrer las canciones y sus propiedades en Python.
+
+Uso: python -m benchmarks.bench_columns [canciones]
+"""
+import sys
+import time
+import random
+from model.model import Playlist, Song
+from model import columns
+from model.columns import DURATION
+
+
+def make_playlist(count, seed=1):
+    rng = random.Random(seed)
+    songs = []
+    for i in range(count):
+        song = Song(f"/musica/album{i % 500:03d}/pista{i:06d}.mp3", f"album{i % 500:03d}")
+        song.set_cached_stat(rng.randint(2, 12) * 1024 * 1024, 0)
+        song.set_metadata({'title': f"Pista {i}", 'artist': "Artista", 'duration': rng.randint(60, 900),
+                           'bitrate': rng.choice((128, 192, 256, 320))})
+        songs.append(song)
+    playlist = Playlist()
+    playlist.add_songs(songs)
+    return playlist
+
+
+def timed(label, function, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    print(f"  {label:<28} {(time.perf_counter() - start) / repeat * 1000:8.2f} ms")
+    return result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    playlist = make_playlist(count)
+    song_ids = [song.song_id for song in playlist.songs]
+    print(f"{count} canciones, NumPy {'disponible' if columns.np is not None else 'no disponible'}")
+
+    print("Python (propiedades de Song):")
+    timed("duración total", lambda: sum(song.duration for song in playlist.songs))
+    timed("orden por duración", lambda: sorted(playlist.songs, key=lambda song: song.duration))
+
+    print("Columnas:")
+    timed("duración total", lambda: playlist.columns.total(DURATION))
+    timed("orden por duración", lambda: playlist.columns.order(DURATION, song_ids))
+
+
+if __name__ == "__main__":
+    main()
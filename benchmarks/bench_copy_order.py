@@ -0,0 +1,95 @@
+"""
+Benchmark: compara los órdenes de escritura del planificador de copia
+(por carpeta, más grandes primero, orden de la playlist) con y sin lotes de
+archivos pequeños, copiando a un destino local. Para resultados parecidos a
+una memoria real, usar como destino una imagen FAT32/exFAT montada en loopback.
+
+Uso: python -m benchmarks.bench_copy_order <destino> [carpeta_origen] [flujos]
+     Sin carpeta de origen se genera un conjunto sintético en un directorio temporal.
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+from model.model import Song
+from controller.controller import USBCopyThread
+from utils.copy_plan import COPY_ORDERS
+from utils.utils import format_size
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.flac', '.aac', '.ogg', '.m4a', '.wma', '.opus')
+
+
+def make_synthetic_source(folder, folders=20, songs_per_folder=15, small_per_folder=10, seed=1):
+    """Canciones de 2-8 MB y archivos pequeños de 20-200 KB repartidos en carpetas"""
+    rng = random.Random(seed)
+    for f in range(folders):
+        directory = os.path.join(folder, f"album{f:02d}")
+        os.makedirs(directory, exist_ok=True)
+        sizes = ([rng.randint(2, 8) * 1024 * 1024 for _ in range(songs_per_folder)]
+                 + [rng.randint(20, 200) * 1024 for _ in range(small_per_folder)])
+        rng.shuffle(sizes)
+        for i, size in enumerate(sizes):
+            with open(os.path.join(directory, f"track{i:02d}.mp3"), 'wb') as out:
+                out.write(os.urandom(size))
+
+
+def collect_songs(folder):
+    """Canciones intercaladas entre carpetas, como queda una playlist armada a mano"""
+    songs = []
+    for root, dirs, names in os.walk(folder):
+        for name in names:
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                songs.append(Song(os.path.join(root, name), os.path.relpath(root, folder)))
+    random.Random(2).shuffle(songs)
+    return songs
+
+
+def run(songs, target, order, batch_small_files, streams):
+    shutil.rmtree(target, ignore_errors=True)
+    os.makedirs(target)
+    config = {'album': '', 'genre': '', 'comment': '', 'cover_path': '',
+              'copy_order': order, 'batch_small_files': batch_small_files}
+    thread = USBCopyThread(songs, target, config, streams)
+    start = time.perf_counter()
+    thread.run()  # Síncrono: sin bucle de eventos de Qt
+    os.sync()
+    elapsed = time.perf_counter() - start
+    total = sum(song.size for song in songs)
+    label = f"{order}{' + lotes' if batch_small_files else ''}"
+    print(f"{label:<20} {elapsed:8.3f} s  {format_size(total / elapsed if elapsed > 0 else 0)}/s")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+    target = os.path.join(sys.argv[1], "musicusb_bench")
+    streams = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+
+    temp_source = None
+    if len(sys.argv) > 2 and sys.argv[2] != '-':
+        source = sys.argv[2]
+    else:
+        temp_source = tempfile.mkdtemp(prefix="musicusb_src_")
+        make_synthetic_source(temp_source)
+        source = temp_source
+
+    try:
+        songs = collect_songs(source)
+        if not songs:
+            print("No se encontraron archivos de audio")
+            return
+        print(f"{len(songs)} archivos, {format_size(sum(s.size for s in songs))}, {streams} flujos")
+        for order in COPY_ORDERS:
+            for batch_small_files in (False, True):
+                run(songs, target, order, batch_small_files, streams)
+    finally:
+        shutil.rmtree(target, ignore_errors=True)
+        if temp_source:
+            shutil.rmtree(temp_source, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark de memoria: canciones con el Song anterior (dataclass con __dict__ y
+metadatos en un diccionario) frente al Song actual (__slots__, textos
+compartidos y metadatos en un registro fijo). Se mide con tracemalloc solo lo
+que ocupan las canciones, sin el índice del Playlist.
+
+Uso: python -m benchmarks.bench_memory [canciones]
+"""
+import sys
+import random
+import tracemalloc
+from dataclasses import dataclass
+from typing import Dict, Optional
+from model.model import Song
+from utils.utils import format_size
+
+GENRES = ["Rock", "Pop", "Jazz", "Clásica", "Electrónica", "Hip Hop", "Folk", "Desconocido"]
+
+
+@dataclass
+class LegacySong:
+    """Song anterior, copiado para comparar"""
+    file_path: str
+    destination: str = ""
+
+    def __post_init__(self):
+        self._metadata = None
+        self._size: Optional[int] = None
+        self._mtime_ns: Optional[int] = None
+        self.song_id: Optional[int] = None
+        self.hint: Optional[Dict] = None
+
+    def set_metadata(self, metadata):
+        self._metadata = metadata
+
+
+def song_data(count, seed=1):
+    """
+    Datos como los que llegan del escaneo y de los tags: cada canción trae sus
+    propias copias de destino, artista, álbum y género aunque se repitan.
+    """
+    rng = random.Random(seed)
+    for i in range(count):
+        album = i // 12
+        artist = album // 4
+        yield (f"/home/usuario/Música/artista{artist:05d}/album{album:06d}/{i % 12:02d} pista {i}.mp3",
+               "".join(["album", f"{album:06d}"]),
+               {'title': f"Pista {i}", 'artist': "".join(["Artista ", str(artist)]),
+                'album': "".join(["Álbum ", str(album)]), 'genre': "".join(rng.choice(GENRES)),
+                'bitrate': rng.choice((128, 192, 256, 320)), 'duration': rng.randint(60, 600)})
+
+
+def measure(song_class, count):
+    tracemalloc.start()
+    songs = []
+    for song_id, (file_path, destination, metadata) in enumerate(song_data(count)):
+        song = song_class(file_path, destination)
+        song._size, song._mtime_ns, song.song_id = 5 * 1024 * 1024 + song_id, 1_700_000_000_000_000_000, song_id
+        song.set_metadata(dict(metadata))
+        songs.append(song)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, songs
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    legacy_bytes, legacy = measure(LegacySong, count)
+    del legacy
+    slotted_bytes, slotted = measure(Song, count)
+    print(f"{count} canciones con metadatos")
+    print(f"  anterior   {format_size(legacy_bytes):>12}  ({legacy_bytes / count:6.0f} B/canción)")
+    print(f"  actual     {format_size(slotted_bytes):>12}  ({slotted_bytes / count:6.0f} B/canción)")
+    print(f"  ahorro     {1 - slotted_bytes / legacy_bytes:.0%}")
+
+
+if __name__ == "__main__":
+    main()
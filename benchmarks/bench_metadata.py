@@ -0,0 +1,150 @@
+"""
+Micro-benchmark: lectura de metadatos en una sola pasada frente a la
+implementación anterior (File(easy=True) + segunda lectura sin easy).
+
+Uso: python -m benchmarks.bench_metadata <carpeta_con_audio> [repeticiones]
+"""
+import os
+import sys
+import time
+from typing import Dict, Any
+from mutagen import File
+from mutagen.mp3 import MP3
+from mutagen.flac import FLAC
+from mutagen.mp4 import MP4
+from mutagen.oggvorbis import OggVorbis
+from utils.utils import get_audio_metadata
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.flac', '.aac', '.ogg', '.m4a', '.wma', '.opus')
+
+
+def legacy_get_audio_metadata(file_path: str) -> Dict[str, Any]:
+    """Implementación anterior de utils.get_audio_metadata, copiada para comparar"""
+    metadata = {
+        'title': '',
+        'artist': '',
+        'album': '',
+        'genre': '',
+        'bitrate': 0,
+        'duration': 0
+    }
+    
+    try:
+        file_name = os.path.splitext(os.path.basename(file_path))[0]
+        metadata['title'] = file_name
+        
+        audio = File(file_path, easy=True)
+        if audio is None:
+            return metadata
+        
+        # Función auxiliar para obtener valores de tags
+        def get_tag(tag_name, default=''):
+            if tag_name in audio:
+                value = audio[tag_name]
+                if isinstance(value, list):
+                    return value[0] if value else default
+                return str(value)
+            return default
+        
+        # Obtener metadatos básicos
+        metadata['title'] = get_tag('title', file_name)
+        metadata['artist'] = get_tag('artist', 'Desconocido')
+        metadata['album'] = get_tag('album', 'Desconocido')
+        metadata['genre'] = get_tag('genre', 'Desconocido')
+        
+        # Información técnica
+        if hasattr(audio.info, 'bitrate'):
+            metadata['bitrate'] = audio.info.bitrate // 1000 if audio.info.bitrate > 0 else 0
+        
+        if hasattr(audio.info, 'length'):
+            metadata['duration'] = int(audio.info.length)
+        
+        # Si no se encontraron metadatos con easy=True, intentar con tags específicos por formato
+        if metadata['artist'] == 'Desconocido' or metadata['album'] == 'Desconocido':
+            # Intentar con el archivo sin easy=True para acceder a tags específicos
+            audio_detailed = File(file_path)
+            if audio_detailed:
+                # Para MP3
+                if isinstance(audio_detailed, MP3):
+                    if 'TPE1' in audio_detailed:  # Artista
+                        metadata['artist'] = str(audio_detailed['TPE1'])
+                    if 'TALB' in audio_detailed:  # Álbum
+                        metadata['album'] = str(audio_detailed['TALB'])
+                    if 'TCON' in audio_detailed:  # Género
+                        metadata['genre'] = str(audio_detailed['TCON'])
+                
+                # Para FLAC
+                elif isinstance(audio_detailed, FLAC):
+                    if 'artist' in audio_detailed:
+                        metadata['artist'] = audio_detailed['artist'][0] if audio_detailed['artist'] else 'Desconocido'
+                    if 'album' in audio_detailed:
+                        metadata['album'] = audio_detailed['album'][0] if audio_detailed['album'] else 'Desconocido'
+                    if 'genre' in audio_detailed:
+                        metadata['genre'] = audio_detailed['genre'][0] if audio_detailed['genre'] else 'Desconocido'
+                
+                # Para MP4
+                elif isinstance(audio_detailed, MP4):
+                    if '\xa9ART' in audio_detailed:
+                        metadata['artist'] = audio_detailed['\xa9ART'][0] if audio_detailed['\xa9ART'] else 'Desconocido'
+                    if '\xa9alb' in audio_detailed:
+                        metadata['album'] = audio_detailed['\xa9alb'][0] if audio_detailed['\xa9alb'] else 'Desconocido'
+                    if '\xa9gen' in audio_detailed:
+                        metadata['genre'] = audio_detailed['\xa9gen'][0] if audio_detailed['\xa9gen'] else 'Desconocido'
+                
+                # Para Ogg Vorbis
+                elif isinstance(audio_detailed, OggVorbis):
+                    if 'artist' in audio_detailed:
+                        metadata['artist'] = audio_detailed['artist'][0] if audio_detailed['artist'] else 'Desconocido'
+                    if 'album' in audio_detailed:
+                        metadata['album'] = audio_detailed['album'][0] if audio_detailed['album'] else 'Desconocido'
+                    if 'genre' in audio_detailed:
+                        metadata['genre'] = audio_detailed['genre'][0] if audio_detailed['genre'] else 'Desconocido'
+        
+    except Exception as e:
+        print(f"Error reading metadata for {file_path}: {e}")
+        # En caso de error, al menos tenemos el nombre del archivo como título
+    
+    return metadata
+
+
+def collect_files(folder):
+    files = []
+    for root, dirs, names in os.walk(folder):
+        for name in names:
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                files.append(os.path.join(root, name))
+    return files
+
+
+def run(label, func, files, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for file_path in files:
+            func(file_path)
+    elapsed = time.perf_counter() - start
+    rate = (len(files) * repeat) / elapsed if elapsed > 0 else 0
+    print(f"{label:<12} {elapsed:8.3f} s  {rate:10.1f} archivos/s")
+    return rate
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+    files = collect_files(sys.argv[1])
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    if not files:
+        print("No se encontraron archivos de audio")
+        return
+
+    print(f"{len(files)} archivos x {repeat} repeticiones")
+    # Calentar la caché del sistema de archivos para comparar solo el análisis
+    run("calentar", get_audio_metadata, files, 1)
+    legacy_rate = run("anterior", legacy_get_audio_metadata, files, repeat)
+    single_rate = run("una pasada", get_audio_metadata, files, repeat)
+    if legacy_rate > 0:
+        print(f"Aceleración: {single_rate / legacy_rate:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import os
+import base64
+from typing import Optional
+from PyQt5.QtCore import Qt, QBuffer, QByteArray, QIODevice
+from PyQt5.QtGui import QImage
+from mutagen.id3 import APIC
+from mutagen.mp4 import MP4Cover
+from mutagen.flac import Picture
+
+MIME_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.bmp': 'image/bmp',
+}
+
+
+class PreparedArtwork:
+    """
+    Portada preparada una sola vez por trabajo de copia: bytes de la imagen y
+    los objetos que necesita cada formato (APIC, MP4Cover, Picture de FLAC y
+    el bloque base64 de Vorbis), para no releer ni recodificar por archivo.
+    """
+
+    def __init__(self, data: bytes, mime_type: str):
+        self.data = data
+        self.mime_type = mime_type
+
+        self.apic = APIC(
+            encoding=3,  # UTF-8
+            mime=mime_type,
+            type=3,  # Cover (front)
+            desc='Cover',
+            data=data
+        )
+
+        cover_format = MP4Cover.FORMAT_JPEG if mime_type == 'image/jpeg' else MP4Cover.FORMAT_PNG
+        self.mp4_cover = MP4Cover(data, imageformat=cover_format)
+
+        self.flac_picture = Picture()
+        self.flac_picture.data = data
+        self.flac_picture.type = 3  # Cover (front)
+        self.flac_picture.mime = mime_type
+        self.flac_picture.desc = 'Cover'
+
+        self.vorbis_block = base64.b64encode(self.flac_picture.write()).decode('ascii')
+
+    @classmethod
+    def from_file(cls, cover_path: str, max_dimension: int = 0) -> Optional['PreparedArtwork']:
+        """
+        Lee la portada del disco. Si max_dimension > 0 y la imagen es más grande,
+        se reduce manteniendo la proporción para que ocupe menos en la USB.
+        """
+        if not cover_path or not os.path.exists(cover_path):
+            return None
+
+        with open(cover_path, 'rb') as f:
+            data = f.read()
+        mime_type = MIME_TYPES.get(os.path.splitext(cover_path)[1].lower(), 'image/jpeg')
+
+        if max_dimension and max_dimension > 0:
+            data, mime_type = cls._downscale(data, mime_type, max_dimension)
+
+        return cls(data, mime_type)
+
+    @staticmethod
+    def _downscale(data, mime_type, max_dimension):
+        image = QImage.fromData(data)
+        if image.isNull() or max(image.width(), image.height()) <= max_dimension:
+            return data, mime_type
+
+        image = image.scaled(max_dimension, max_dimension, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+        # PNG si la imagen tiene transparencia, JPEG en cualquier otro caso
+        image_format, new_mime = ('PNG', 'image/png') if image.hasAlphaChannel() else ('JPG', 'image/jpeg')
+        buffer_data = QByteArray()
+        buffer = QBuffer(buffer_data)
+        buffer.open(QIODevice.WriteOnly)
+        if not image.save(buffer, image_format, 90):
+            return data, mime_type
+        buffer.close()
+        return bytes(buffer_data), new_mime
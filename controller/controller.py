@@ -1,80 +1,458 @@
 import os
 import shutil
 import time
-from PyQt5.QtWidgets import QInputDialog
-from PyQt5.QtCore import QThread, pyqtSignal, QMutex
-from model.model import Playlist, Song
+import hashlib
+import threading
+from collections import deque
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from PyQt5.QtCore import QThread, QTimer, pyqtSignal
+from model.model import Playlist
+from model.history import EditHistory, RemoveSongsCommand, MoveSongsCommand, RenameDestinationCommand
+from model.packing import pack_playlist, parse_capacities
+from model.session import SESSION_EXTENSION
 from view.view import PlaylistView
+from controller.artwork import PreparedArtwork
+from controller.metadata_loader import MetadataLoader
+from controller.session_validator import SessionValidator
+from controller.folder_scanner import FolderScanner
+from controller.duplicate_finder import DuplicateFinder
 from mutagen import File
-from mutagen.id3 import ID3, TALB, TCON, COMM, APIC
-from mutagen.mp4 import MP4, MP4Cover
-from mutagen.flac import FLAC, Picture
+from mutagen.id3 import ID3, TALB, TCON
+from mutagen.mp4 import MP4
+from mutagen.flac import FLAC
 from mutagen.oggvorbis import OggVorbis
+from utils.utils import read_id3v2_size, find_flac_audio_offset, format_size, is_audio_file
+from utils.sync_manifest import SyncManifest, file_hash, new_file_digest
+from utils.copy_plan import plan_copy, check_capacity, trim_plan, ORDER_FOLDER
+
+# Número de copias simultáneas por defecto (1 = copia secuencial clásica)
+DEFAULT_COPY_STREAMS = 2
+MAX_COPY_STREAMS = 8
+METADATA_KEYS = ('album', 'genre', 'comment', 'cover_path')
+# Formatos cuyas etiquetas están al principio del archivo y se pueden escribir durante la copia
+TAG_ON_COPY_EXTENSIONS = {'.mp3', '.flac'}
+COPY_CHUNK_SIZE = 1024 * 1024
+# Intervalo mínimo entre señales de progreso (20 Hz como máximo)
+PROGRESS_INTERVAL = 0.05
+# Ventana para estimar la velocidad de copia
+THROUGHPUT_WINDOW = 5.0
+
+class CopyCancelled(Exception):
+    """Se lanza entre bloques cuando el usuario cancela la copia"""
+
+
+class TransferMeter:
+    """Velocidad de copia sobre una ventana deslizante y tiempo restante estimado"""
+    
+    def __init__(self, window=THROUGHPUT_WINDOW):
+        self.window = window
+        self._samples = deque()
+    
+    def add_sample(self, bytes_done, now=None):
+        now = time.monotonic() if now is None else now
+        self._samples.append((now, bytes_done))
+        while len(self._samples) > 2 and now - self._samples[0][0] > self.window:
+            self._samples.popleft()
+    
+    def bytes_per_second(self):
+        if len(self._samples) < 2:
+            return 0.0
+        (start_time, start_bytes), (end_time, end_bytes) = self._samples[0], self._samples[-1]
+        elapsed = end_time - start_time
+        return (end_bytes - start_bytes) / elapsed if elapsed > 0 else 0.0
+    
+    def eta_seconds(self, remaining_bytes):
+        speed = self.bytes_per_second()
+        return remaining_bytes / speed if speed > 0 else -1.0
 
 class USBCopyThread(QThread):
     progress_updated = pyqtSignal(int, int, str)
+    bytes_progress = pyqtSignal('qint64', 'qint64')  # bytes copiados, bytes totales
+    sync_planned = pyqtSignal(int, int, int)  # a copiar, sin cambios, huérfanos borrados
+    copy_planned = pyqtSignal(str, int, int, float)  # orden, archivos, carpetas, segundos estimados
+    plan_trimmed = pyqtSignal(int, 'qint64')  # archivos omitidos por falta de espacio o límite de FAT32, bytes
+    throughput_updated = pyqtSignal(float, float)  # bytes/s, segundos restantes (-1 si se desconoce)
+    file_copied = pyqtSignal(str, 'qint64', float)  # ruta, bytes, segundos de copia
     finished_success = pyqtSignal()
     finished_error = pyqtSignal(str)
     
-    def __init__(self, songs, usb_path, metadata_config):
+    def __init__(self, songs, usb_path, metadata_config, max_streams=DEFAULT_COPY_STREAMS):
         super().__init__()
         self.songs = songs
         self.usb_path = usb_path
         self.metadata_config = metadata_config
-        self._is_cancelled = False
-        self._is_paused = False
-        self.mutex = QMutex()
+        # Con 1 se vuelve a un único flujo, útil para memorias que se saturan con escrituras paralelas
+        self.max_streams = max(1, min(MAX_COPY_STREAMS, int(max_streams or 1)))
+        # _running está activo salvo en pausa; cancelar también lo activa para despertar a los hilos
+        self._running = threading.Event()
+        self._running.set()
+        self._cancelled = threading.Event()
+        self._progress_lock = threading.Lock()
+        # Bytes contados por el archivo en curso de cada hilo de copia (para descontar un intento fallido)
+        self._file_progress = threading.local()
+        self._files_done = 0
+        self._bytes_done = 0
+        self._total_bytes = 0
+        self._artwork = None
+        self._manifest = None
+        self._fingerprint = None
+        self._meter = TransferMeter()
+        self._last_progress_emit = 0.0
+        # (ruta, bytes, segundos) de cada archivo, para diagnosticar memorias lentas
+        self.file_timings = []
+        self.elapsed_seconds = 0.0
+        # Hash del origen calculado durante la copia (solo si se pidió verificar)
+        self._source_hashes = {}
+    
+    @property
+    def _is_cancelled(self):
+        return self._cancelled.is_set()
     
     def cancel(self):
-        self._is_cancelled = True
+        self._cancelled.set()
+        self._running.set()
     
     def set_paused(self, paused):
-        self.mutex.lock()
-        self._is_paused = paused
-        self.mutex.unlock()
+        if paused and not self._is_cancelled:
+            self._running.clear()
+        else:
+            self._running.set()
+    
+    def _checkpoint(self):
+        """Bloquea mientras la copia está en pausa y lanza CopyCancelled si se canceló"""
+        self._running.wait()
+        if self._is_cancelled:
+            raise CopyCancelled()
+    
+    def _has_metadata_changes(self):
+        return any(self.metadata_config.get(key) for key in METADATA_KEYS)
     
     def run(self):
         try:
-            total_files = len(self.songs)
+            jobs = [(song, self._get_destination_path(song.destination, song.file_name))
+                    for song in self.songs]
+            apply_metadata = self._has_metadata_changes()
             
-            for i, song in enumerate(self.songs):
-                if self._is_cancelled:
-                    break
-                
-                # Esperar si está pausado
-                while True:
-                    self.mutex.lock()
-                    paused = self._is_paused
-                    self.mutex.unlock()
-                    if not paused or self._is_cancelled:
-                        break
-                    time.sleep(0.1)  # Pequeña pausa para no consumir muchos recursos
-                
-                if self._is_cancelled:
-                    break
-                
-                # Emitir progreso
-                self.progress_updated.emit(i + 1, total_files, song.file_path)
-                
-                # Determinar ruta destino
-                dest_path = self._get_destination_path(song.destination, song.file_name)
+            # La portada se lee (y se reduce si se pidió) una sola vez por trabajo
+            self._artwork = PreparedArtwork.from_file(self.metadata_config.get('cover_path'),
+                                                      self.metadata_config.get('cover_max_size', 0))
+            
+            if self.metadata_config.get('sync'):
+                jobs = self._plan_sync(jobs, apply_metadata)
+            
+            # Orden de escritura pensado para FAT/exFAT y lotes de archivos pequeños
+            plan = plan_copy(jobs, self.metadata_config.get('copy_order', ORDER_FOLDER),
+                             self.metadata_config.get('batch_small_files', False))
+            plan = self._check_capacity(plan)
+            directories = plan.directories
+            self.copy_planned.emit(plan.order, plan.file_count, len(directories),
+                                   plan.estimate_seconds(self.metadata_config.get('expected_speed')))
+            
+            total_files = plan.file_count
+            self._files_done = 0
+            self._bytes_done = 0
+            self._total_bytes = plan.total_bytes
+            self.file_timings = []
+            self._meter = TransferMeter()
+            self._meter.add_sample(0)
+            started = time.monotonic()
+            
+            # Crear todas las carpetas antes de empezar, desde un solo hilo
+            self._create_directories(directories)
+            
+            # Los datos se copian con varios flujos; los tags se escriben en un hilo aparte
+            # para que la siguiente copia no espere a que termine el etiquetado
+            with ThreadPoolExecutor(max_workers=self.max_streams, thread_name_prefix="usb-copy") as copy_pool, \
+                    ThreadPoolExecutor(max_workers=1, thread_name_prefix="usb-tags") as tag_pool:
+                try:
+                    in_flight = {}
+                    tag_futures = []
                 
-                # Crear directorio si no existe
-                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                    def collect(done):
+                        for future in done:
+                            batch = in_flight.pop(future)
+                            tagged_flags = future.result()  # Propaga errores de copia
+                            for (song, dest_path), tagged in zip(batch, tagged_flags):
+                                if apply_metadata and not tagged:
+                                    tag_futures.append(tag_pool.submit(self._finish_file, song, dest_path, total_files, True))
+                                else:
+                                    self._finish_file(song, dest_path, total_files, False)
                 
-                # Copiar archivo
-                shutil.copy2(song.file_path, dest_path)
+                    for batch in plan.batches:
+                        if self._is_cancelled:
+                            break
+                        self._running.wait()
+                        # Limitar los trabajos en vuelo para que pausa y cancelación respondan rápido
+                        while len(in_flight) >= self.max_streams * 2:
+                            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                            collect(done)
+                        future = copy_pool.submit(self._copy_batch, batch, apply_metadata)
+                        in_flight[future] = batch
                 
-                # Aplicar metadatos si se especificaron
-                if any(self.metadata_config.values()):
-                    self._apply_metadata(dest_path)
+                    while in_flight:
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    for future in tag_futures:
+                        future.result()
+                except BaseException:
+                    # Parar antes de salir del with: su shutdown esperaría a todos los lotes
+                    # en vuelo, que seguirían escribiendo en la USB tras el error
+                    self._cancelled.set()
+                    self._running.set()
+                    copy_pool.shutdown(wait=False, cancel_futures=True)
+                    tag_pool.shutdown(wait=False, cancel_futures=True)
+                    raise
+            
+            self._emit_progress(force=True)
+            self.elapsed_seconds = time.monotonic() - started
+            
+            if self._manifest is not None:
+                if self._is_cancelled:
+                    self._manifest.close()
+                else:
+                    self._manifest.save()
             
             if not self._is_cancelled:
                 self.finished_success.emit()
                 
         except Exception as e:
+            self._cancelled.set()
+            if self._manifest is not None:
+                self._manifest.close()
             self.finished_error.emit(str(e))
     
+    def _plan_sync(self, jobs, apply_metadata):
+        """
+        Sincronización incremental: deja solo los archivos nuevos o modificados
+        según el manifiesto de la USB y, si se pidió, borra los huérfanos.
+        """
+        self._manifest = SyncManifest.load(self.usb_path)
+        self._fingerprint = self._metadata_fingerprint() if apply_metadata else None
+        verify_hash = self.metadata_config.get('verify_hash', False)
+        
+        pending = [(song, dest_path) for song, dest_path in jobs
+                   if self._manifest.needs_copy(song, dest_path, self._fingerprint, verify_hash)]
+        
+        removed = []
+        if self.metadata_config.get('delete_orphans'):
+            removed = self._manifest.remove_orphans(dest_path for _, dest_path in jobs)
+        
+        self.sync_planned.emit(len(pending), len(jobs) - len(pending), len(removed))
+        return pending
+    
+    def _check_capacity(self, plan):
+        """
+        Comprueba el plan contra el espacio libre real y el sistema de archivos de la
+        USB antes de escribir nada. Si no cabe, lo recorta o aborta según la configuración.
+        """
+        report = check_capacity(plan, self.usb_path)
+        if report.fits:
+            return plan
+        
+        if self.metadata_config.get('trim_to_fit'):
+            plan, skipped = trim_plan(plan, report)
+            self.plan_trimmed.emit(len(skipped), sum(song.size for song, _ in skipped))
+            return plan
+        
+        problems = []
+        if report.oversized:
+            names = ", ".join(os.path.basename(song.file_path) for song, _ in report.oversized[:3])
+            problems.append(f"{len(report.oversized)} archivos superan el límite de 4 GB de FAT32 ({names})")
+        if report.shortfall:
+            problems.append(f"Espacio insuficiente en la USB: se necesitan {format_size(report.required_bytes)} "
+                            f"y hay {format_size(report.free_bytes)} libres")
+        raise RuntimeError(". ".join(problems))
+    
+    def _metadata_fingerprint(self):
+        """Huella de la configuración de etiquetas: si cambia, hay que volver a copiar"""
+        digest = hashlib.sha1()
+        for key in ('album', 'genre', 'comment'):
+            digest.update(str(self.metadata_config.get(key, '')).encode('utf-8') + b'\0')
+        if self._artwork:
+            digest.update(self._artwork.data)
+        return digest.hexdigest()
+    
+    def _create_directories(self, directories):
+        """Crea las carpetas destino en orden (padres antes que hijos)"""
+        for directory in directories:
+            os.makedirs(directory, exist_ok=True)
+    
+    @property
+    def average_speed(self):
+        """Bytes por segundo de la última copia completa (0 si no hubo datos)"""
+        if self.elapsed_seconds <= 0:
+            return 0.0
+        return self._bytes_done / self.elapsed_seconds
+    
+    def _copy_batch(self, batch, apply_metadata):
+        """Copia un lote de archivos en el mismo flujo; devuelve un indicador de etiquetado por archivo"""
+        return [self._copy_file(song, dest_path, apply_metadata) for song, dest_path in batch]
+    
+    def _copy_file(self, song, dest_path, apply_metadata):
+        """
+        Copia los datos de un archivo (se ejecuta en el pool de copia).
+        Devuelve True si las etiquetas ya se escribieron durante la copia.
+        """
+        try:
+            self._checkpoint()
+        except CopyCancelled:
+            return True
+        
+        started = time.monotonic()
+        tagged = False
+        try:
+            if apply_metadata and self._can_tag_on_copy(song.file_path):
+                self._file_progress.bytes = 0
+                try:
+                    self._copy_with_tags(song.file_path, dest_path)
+                    tagged = True
+                except CopyCancelled:
+                    raise
+                except Exception as e:
+                    # Si la cabecera no se puede interpretar, copiar tal cual y etiquetar después
+                    print(f"Error escribiendo etiquetas durante la copia de {song.file_path}: {e}")
+                    # La copia completa volverá a contar el archivo entero: descontar lo ya contado
+                    with self._progress_lock:
+                        self._bytes_done -= self._file_progress.bytes
+                    if os.path.exists(dest_path):
+                        self._remove_partial(dest_path)
+            if not tagged:
+                # Al copiar tal cual, el hash de verificación sale de los mismos bloques leídos
+                digest = new_file_digest() if self.metadata_config.get('verify_hash') else None
+                with open(song.file_path, 'rb') as source, open(dest_path, 'wb') as target:
+                    self._copy_stream(source, target, digest)
+                shutil.copystat(song.file_path, dest_path)
+                if digest is not None:
+                    with self._progress_lock:
+                        self._source_hashes[dest_path] = digest.hexdigest()
+        except CopyCancelled:
+            # El destino ya se abrió para escritura: no dejar un archivo a medias en la USB
+            self._remove_partial(dest_path)
+            return True
+        
+        elapsed = time.monotonic() - started
+        self.file_timings.append((song.file_path, song.size, elapsed))
+        self.file_copied.emit(song.file_path, song.size, elapsed)
+        return tagged
+    
+    def _copy_stream(self, source, target, digest=None):
+        """Copia por bloques contando los bytes del origen para el progreso"""
+        while True:
+            self._checkpoint()
+            chunk = source.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            target.write(chunk)
+            if digest is not None:
+                digest.update(chunk)
+            self._add_progress(len(chunk))
+    
+    def _remove_partial(self, dest_path):
+        try:
+            os.remove(dest_path)
+        except OSError as e:
+            print(f"Error eliminando copia parcial {dest_path}: {e}")
+    
+    def _add_progress(self, byte_count):
+        with self._progress_lock:
+            self._bytes_done += byte_count
+        self._file_progress.bytes = getattr(self._file_progress, 'bytes', 0) + byte_count
+        self._emit_progress()
+    
+    def _emit_progress(self, force=False):
+        """Emite bytes, velocidad y tiempo restante como máximo cada PROGRESS_INTERVAL"""
+        now = time.monotonic()
+        with self._progress_lock:
+            if not force and now - self._last_progress_emit < PROGRESS_INTERVAL:
+                return
+            self._last_progress_emit = now
+            bytes_done = self._bytes_done
+            self._meter.add_sample(bytes_done, now)
+            speed = self._meter.bytes_per_second()
+            eta = self._meter.eta_seconds(self._total_bytes - bytes_done)
+        self.bytes_progress.emit(bytes_done, self._total_bytes)
+        self.throughput_updated.emit(speed, eta)
+    
+    def _can_tag_on_copy(self, file_path):
+        if not self.metadata_config.get('tag_on_copy', True):
+            return False
+        return os.path.splitext(file_path)[1].lower() in TAG_ON_COPY_EXTENSIONS
+    
+    def _copy_with_tags(self, source_path, dest_path):
+        """
+        Copia aplicando los metadatos en memoria: se genera la nueva cabecera de
+        etiquetas y se escribe junto con el audio original en una sola pasada
+        secuencial, sin volver a abrir ni reescribir el archivo en la USB.
+        """
+        with open(source_path, 'rb') as source:
+            if source_path.lower().endswith('.mp3'):
+                header = self._render_id3_header(source)
+            else:
+                header = self._render_flac_header(source)
+            # 'source' queda posicionado al inicio del audio
+            audio_offset = source.tell()
+            with open(dest_path, 'wb') as target:
+                target.write(header)
+                self._add_progress(audio_offset)
+                self._copy_stream(source, target)
+        shutil.copystat(source_path, dest_path)
+    
+    def _render_id3_header(self, source):
+        """Devuelve la etiqueta ID3v2 modificada; deja 'source' al inicio del audio"""
+        tag_size = read_id3v2_size(source.read(10))
+        source.seek(0)
+        buffer = BytesIO(source.read(tag_size))
+        tags = ID3(buffer, load_v1=False) if tag_size else ID3()
+        
+        if self.metadata_config['album']:
+            tags.setall('TALB', [TALB(encoding=3, text=[self.metadata_config['album']])])
+        if self.metadata_config['genre']:
+            tags.setall('TCON', [TCON(encoding=3, text=[self.metadata_config['genre']])])
+        if self._artwork:
+            self._set_cover_id3(tags, self._artwork)
+        
+        buffer.seek(0)
+        tags.save(buffer, v1=0)
+        return buffer.getvalue()
+    
+    def _render_flac_header(self, source):
+        """Devuelve los bloques de metadatos FLAC modificados; deja 'source' al inicio del audio"""
+        audio_offset = find_flac_audio_offset(source)
+        source.seek(0)
+        buffer = BytesIO(source.read(audio_offset))
+        audio = FLAC(buffer)
+        
+        if self.metadata_config['album']:
+            audio['album'] = [self.metadata_config['album']]
+        if self.metadata_config['genre']:
+            audio['genre'] = [self.metadata_config['genre']]
+        if self._artwork:
+            self._set_cover_flac(audio, self._artwork)
+        
+        buffer.seek(0)
+        audio.save(buffer)
+        return buffer.getvalue()
+    
+    def _finish_file(self, song, dest_path, total_files, apply_metadata):
+        """Aplica metadatos (si corresponde) y cuenta el archivo como terminado"""
+        if self._is_cancelled:
+            return
+        if apply_metadata:
+            self._apply_metadata(dest_path)
+        if self._manifest is not None:
+            source_hash = None
+            if self.metadata_config.get('verify_hash'):
+                with self._progress_lock:
+                    source_hash = self._source_hashes.pop(dest_path, None)
+                if source_hash is None:
+                    source_hash = file_hash(song.file_path)
+            self._manifest.record(song, dest_path, self._fingerprint, source_hash)
+        with self._progress_lock:
+            self._files_done += 1
+            files_done = self._files_done
+        self.progress_updated.emit(files_done, total_files, song.file_path)
+    
     def _get_destination_path(self, destination, file_name):
         """Construye la ruta destino completa"""
         if not destination or destination == "/":
@@ -108,7 +486,7 @@ class USBCopyThread(QThread):
             audio.save()
             
             # Aplicar portada si se especificó
-            if self.metadata_config['cover_path'] and os.path.exists(self.metadata_config['cover_path']):
+            if self._artwork:
                 self._apply_cover(file_path)
                 
         except Exception as e:
@@ -118,123 +496,107 @@ class USBCopyThread(QThread):
     def _apply_cover(self, file_path):
         """Aplica portada al archivo de audio"""
         try:
-            # Leer imagen
-            with open(self.metadata_config['cover_path'], 'rb') as f:
-                cover_data = f.read()
-
-            # Obtener la extensión del archivo de portada para determinar el MIME type
-            cover_ext = os.path.splitext(self.metadata_config['cover_path'])[1].lower()
-            mime_type = 'image/jpeg'
-            if cover_ext == '.png':
-                mime_type = 'image/png'
-            elif cover_ext == '.bmp':
-                mime_type = 'image/bmp'
+            artwork = self._artwork
 
             # Detectar tipo de archivo de audio y aplicar portada según el formato
             file_ext = os.path.splitext(file_path)[1].lower()
 
             if file_ext == '.mp3':
-                self._apply_cover_mp3(file_path, cover_data, mime_type)
+                self._apply_cover_mp3(file_path, artwork)
             elif file_ext in ['.m4a', '.mp4']:
-                self._apply_cover_mp4(file_path, cover_data, mime_type)
+                self._apply_cover_mp4(file_path, artwork)
             elif file_ext == '.flac':
-                self._apply_cover_flac(file_path, cover_data, mime_type)
+                self._apply_cover_flac(file_path, artwork)
             elif file_ext in ['.ogg', '.oga']:
-                self._apply_cover_ogg(file_path, cover_data, mime_type)
+                self._apply_cover_ogg(file_path, artwork)
             else:
                 # Para otros formatos, intentar con el método easy
-                self._apply_cover_generic(file_path, cover_data, mime_type)
+                self._apply_cover_generic(file_path, artwork)
 
         except Exception as e:
             print(f"Error aplicando portada a {file_path}: {e}")
 
-    def _apply_cover_mp3(self, file_path, cover_data, mime_type):
+    def _apply_cover_mp3(self, file_path, artwork):
         """Aplica portada a archivo MP3"""
-        from mutagen.id3 import ID3, APIC
-
         try:
             audio = ID3(file_path)
         except:
             audio = ID3()
 
-        # Eliminar portadas existentes
-        audio.delall('APIC')
-
-        # Agregar nueva portada
-        audio.add(APIC(
-            encoding=3,  # UTF-8
-            mime=mime_type,
-            type=3,  # Cover (front)
-            desc='Cover',
-            data=cover_data
-        ))
+        self._set_cover_id3(audio, artwork)
         audio.save(file_path)
 
-    def _apply_cover_mp4(self, file_path, cover_data, mime_type):
-        """Aplica portada a archivo MP4/M4A"""
-        from mutagen.mp4 import MP4, MP4Cover
+    def _set_cover_id3(self, tags, artwork):
+        """Reemplaza la portada en unas etiquetas ID3 ya cargadas"""
+        # Eliminar portadas existentes y agregar la nueva (frame APIC ya preparado)
+        tags.delall('APIC')
+        tags.add(artwork.apic)
 
+    def _apply_cover_mp4(self, file_path, artwork):
+        """Aplica portada a archivo MP4/M4A"""
         audio = MP4(file_path)
-        cover_format = MP4Cover.FORMAT_JPEG if mime_type == 'image/jpeg' else MP4Cover.FORMAT_PNG
-        audio['covr'] = [MP4Cover(cover_data, imageformat=cover_format)]
+        audio['covr'] = [artwork.mp4_cover]
         audio.save()
 
-    def _apply_cover_flac(self, file_path, cover_data, mime_type):
+    def _apply_cover_flac(self, file_path, artwork):
         """Aplica portada a archivo FLAC"""
-        from mutagen.flac import FLAC, Picture
-
         audio = FLAC(file_path)
+        self._set_cover_flac(audio, artwork)
+        audio.save()
 
-        # Crear objeto picture
-        picture = Picture()
-        picture.data = cover_data
-        picture.type = 3  # Cover (front)
-        picture.mime = mime_type
-        picture.desc = 'Cover'
-
+    def _set_cover_flac(self, audio, artwork):
+        """Reemplaza la portada en un FLAC ya cargado"""
         # Limpiar imágenes existentes y agregar nueva
         audio.clear_pictures()
-        audio.add_picture(picture)
-        audio.save()
+        audio.add_picture(artwork.flac_picture)
 
-    def _apply_cover_ogg(self, file_path, cover_data, mime_type):
+    def _apply_cover_ogg(self, file_path, artwork):
         """Aplica portada a archivo OGG"""
-        import base64
-        from mutagen.oggvorbis import OggVorbis
-
         audio = OggVorbis(file_path)
-
-        # Crear objeto picture FLAC
-        from mutagen.flac import Picture
-        picture = Picture()
-        picture.data = cover_data
-        picture.type = 3
-        picture.mime = mime_type
-        picture.desc = 'Cover'
-
-        # Codificar en base64
-        picture_data = base64.b64encode(picture.write()).decode('ascii')
-        audio['metadata_block_picture'] = [picture_data]
+        # Bloque Picture de FLAC ya codificado en base64
+        audio['metadata_block_picture'] = [artwork.vorbis_block]
         audio.save()
 
-    def _apply_cover_generic(self, file_path, cover_data, mime_type):
+    def _apply_cover_generic(self, file_path, artwork):
         """Intenta aplicar portada usando el método easy de mutagen"""
         audio = File(file_path, easy=True)
         if audio is not None:
             # Para algunos formatos, se puede usar el tag 'coverart' o 'cover'
             if 'coverart' in audio:
-                audio['coverart'] = cover_data
+                audio['coverart'] = artwork.data
             elif 'cover' in audio:
-                audio['cover'] = cover_data
+                audio['cover'] = artwork.data
             audio.save()
 
 
 
 class PlaylistController:
-    def __init__(self):
+    def __init__(self, metadata_workers=None):
         self.model = Playlist()
         self.view = PlaylistView()
         
+        # Lectura de metadatos en segundo plano
+        self.metadata_loader = MetadataLoader(max_workers=metadata_workers)
+        self.metadata_loader.batch_loaded.connect(self.on_metadata_loaded)
+        
+        # Revalidación en segundo plano de las sesiones restauradas
+        self.session_validator = SessionValidator()
+        self.session_validator.batch_checked.connect(self.on_session_checked)
+        self.session_validator.finished.connect(self.on_session_validated)
+        # Copia o reparto que espera a que terminen de revalidarse los tamaños
+        self._pending_action = None
+        
+        # Exploración de carpetas soltadas en segundo plano
+        self.folder_scanner = FolderScanner(accept=lambda path, entry: self.is_audio_file(path))
+        self.folder_scanner.batch_found.connect(self.on_scan_batch)
+        self.folder_scanner.progress_updated.connect(self.on_scan_progress)
+        self.folder_scanner.scan_finished.connect(self.on_scan_finished)
+        
+        # Confirmación de duplicados en segundo plano
+        self.duplicate_finder = DuplicateFinder()
+        self.duplicate_finder.progress_updated.connect(self.on_duplicates_progress)
+        self.duplicate_finder.finished.connect(self.on_duplicates_found)
+        
         # Conectar señales de la vista
         self.view.files_dropped.connect(self.handle_files_dropped)
         self.view.song_selection_changed.connect(self.handle_selection_changed)
@@ -248,13 +610,31 @@ class PlaylistController:
         self.view.new_playlist_requested.connect(self.new_playlist)
         self.view.close_playlist_requested.connect(self.close_playlist)
         self.view.copy_to_usb_requested.connect(self.copy_to_usb)
+        self.view.split_across_usbs_requested.connect(self.split_across_usbs)
         self.view.base_changed.connect(self.on_base_changed)
         self.view.pause_state_changed.connect(self.on_pause_state_changed)
+        self.view.cancel_scan_requested.connect(self.cancel_scan)
+        self.view.find_duplicates_requested.connect(self.find_duplicates)
+        self.view.undo_requested.connect(self.undo)
+        self.view.redo_requested.connect(self.redo)
+        self.view.closing.connect(self.shutdown)
+        
+        # Deshacer/rehacer de las ediciones de la playlist
+        self.history = EditHistory()
         
         # Estado actual
-        self.selected_indices = []
+        self.selected_song_ids = []
         self.base_1024 = True
         self.copy_thread = None
+        self.last_copy_speed = 0.0
+        # Confirmar el contenido de los archivos soltados (no solo la extensión)
+        self.sniff_audio = True
+        
+        # Carga progresiva de playlists: se procesa un bloque por vuelta del bucle de eventos
+        self._playlist_loader = None
+        self._load_timer = QTimer()
+        self._load_timer.setInterval(0)
+        self._load_timer.timeout.connect(self._load_next_chunk)
         
         # Actualizar vista inicial
         self.update_view()
@@ -269,71 +649,128 @@ class PlaylistController:
             self.copy_thread.set_paused(paused)
     
     def handle_files_dropped(self, file_paths):
-        new_songs = []
-        
-        for path in file_paths:
-            if os.path.isfile(path):
-                # Es un archivo individual
-                if self.is_audio_file(path):
-                    new_songs.append(Song(file_path=path))
-            elif os.path.isdir(path):
-                # Es una carpeta, explorar recursivamente
-                folder_songs = self.get_audio_files_from_folder(path)
-                for song_path in folder_songs:
-                    # Usar el nombre de la carpeta como destino
-                    folder_name = os.path.basename(path)
-                    new_songs.append(Song(file_path=song_path, destination=folder_name))
-        
-        self.model.add_songs(new_songs)
+        """Explora lo soltado en segundo plano; las canciones llegan por lotes a on_scan_batch"""
+        self.view.show_status("Buscando archivos de audio... (Esc para cancelar)")
+        self.folder_scanner.scan(file_paths)
+    
+    def on_scan_batch(self, generation, songs):
+        if generation != self.folder_scanner.generation:
+            return  # Exploración cancelada
+        self.model.add_songs(songs)
+        self.view.update_playlist_info(self.model)
+        self.metadata_loader.enqueue(songs)
+    
+    def on_scan_progress(self, generation, found):
+        if generation == self.folder_scanner.generation:
+            self.view.show_status(f"Buscando archivos de audio... {found} encontrados (Esc para cancelar)")
+    
+    def on_scan_finished(self, generation, found):
+        if generation == self.folder_scanner.generation:
+            message = f"{found} archivos de audio añadidos"
+            repeated = self.model.duplicates.path_duplicates
+            if repeated:
+                message += f" ({repeated} repetidos en la playlist)"
+            self.view.show_status(message, 5000)
+    
+    def cancel_scan(self):
+        self.folder_scanner.cancel()
+        self.duplicate_finder.cancel()
+        self.view.show_status("Búsqueda cancelada", 3000)
+    
+    def find_duplicates(self, full_hash=False):
+        """Confirma los candidatos del índice de duplicados en segundo plano"""
+        if not self.model.songs:
+            return
+        self.view.show_status("Buscando duplicados... (Esc para cancelar)")
+        self.duplicate_finder.start(self.model.duplicates.candidates(), full_hash)
+    
+    def on_duplicates_progress(self, generation, done, total):
+        if generation == self.duplicate_finder.generation:
+            self.view.show_status(f"Comparando archivos... {done}/{total} (Esc para cancelar)")
+    
+    def on_duplicates_found(self, generation, groups):
+        if generation != self.duplicate_finder.generation:
+            return
+        self.view.show_status("")
+        groups = self.model.get_duplicate_groups(groups)
+        if not self.view.confirm_remove_duplicates(groups):
+            return
+        extra_ids = [song.song_id for group in groups for song in group.extra_songs]
+        self._execute(RemoveSongsCommand(extra_ids, description="Eliminar duplicados"))
+        self.selected_song_ids = []
         self.update_view()
+        self.view.show_status(f"{len(extra_ids)} duplicados eliminados", 5000)
     
     def is_audio_file(self, file_path):
-        audio_extensions = {'.mp3', '.wav', '.flac', '.aac', '.ogg', '.m4a', '.wma', '.opus'}
-        return any(file_path.lower().endswith(ext) for ext in audio_extensions)
+        # Se llama desde los hilos del explorador: la lectura de la cabecera va en paralelo
+        return is_audio_file(file_path, sniff=self.sniff_audio)
     
-    def get_audio_files_from_folder(self, folder_path):
-        audio_files = []
-        for root, dirs, files in os.walk(folder_path):
-            for file in files:
-                if self.is_audio_file(file):
-                    audio_files.append(os.path.join(root, file))
-        return audio_files
+    def on_metadata_loaded(self, generation, loaded):
+        """Recibe un lote de (canción, metadatos) leídos en segundo plano"""
+        if generation != self.metadata_loader.generation:
+            return  # Lote de una playlist que ya se reemplazó
+        songs = []
+        for song, metadata in loaded:
+            song.set_metadata(metadata)
+            songs.append(song)
+        self.model.notify_songs_updated(songs)
+        # La duración total depende de los metadatos recién leídos
+        self.view.update_playlist_info(self.model)
     
-    def handle_selection_changed(self, indices):
-        self.selected_indices = indices
+    def handle_selection_changed(self, song_ids):
+        self.selected_song_ids = song_ids
     
-    def delete_selected_songs(self):
-        if self.selected_indices:
-            self.model.remove_songs(self.selected_indices)
-            self.selected_indices = []
+    def _execute(self, command):
+        """Aplica una edición guardándola en el historial de deshacer"""
+        if self.history.execute(self.model, command):
             self.update_view()
     
-    def delete_unselected_songs(self):
-        if self.selected_indices:
-            self.model.remove_unselected_songs(self.selected_indices)
-            self.selected_indices = []
+    def undo(self):
+        command = self.history.undo(self.model)
+        if command is not None:
             self.update_view()
-        else:
-            # Si no hay selección, eliminar todas
-            self.model.songs.clear()
+            self._current_selection()
+            self.view.show_status(f"Deshecho: {command.description}", 3000)
+    
+    def redo(self):
+        command = self.history.redo(self.model)
+        if command is not None:
             self.update_view()
+            self._current_selection()
+            self.view.show_status(f"Rehecho: {command.description}", 3000)
     
-    def change_destination(self, indices, new_destination):
-        if not indices or not new_destination:
+    def _current_selection(self):
+        """
+        Selección que se ve en el árbol: el modelo la conserva al quitar o recolocar
+        filas sin emitir selectionChanged, así que se lee en el momento de la acción.
+        """
+        self.selected_song_ids = self.view.get_selected_song_ids()
+        return self.selected_song_ids
+    
+    def delete_selected_songs(self):
+        song_ids = self._current_selection()
+        if song_ids:
+            self._execute(RemoveSongsCommand(song_ids))
+    
+    def delete_unselected_songs(self):
+        # Si no hay selección, se eliminan todas
+        self._execute(RemoveSongsCommand(self._current_selection(), keep=True,
+                                         description="Eliminar no seleccionadas"))
+    
+    def change_destination(self, song_ids, new_destination):
+        if not song_ids or not new_destination:
             return
         
-        self.model.update_destination(indices, new_destination)
-        self.update_view()
+        self._execute(MoveSongsCommand(song_ids, new_destination))
     
     def rename_destination(self, old_destination, new_destination):
         if old_destination and new_destination:
-            self.model.rename_destination(old_destination, new_destination)
-            self.update_view()
+            self._execute(RenameDestinationCommand(old_destination, new_destination))
     
     def remove_destination(self, destination):
         if destination:
-            self.model.remove_destination(destination)
-            self.update_view()
+            self._execute(RemoveSongsCommand(self.model.get_group_song_ids(destination),
+                                             description="Eliminar destino"))
     
     def save_playlist(self):
         if not self.model.songs:
@@ -343,7 +780,10 @@ class PlaylistController:
         filename = self.view.get_save_filename()
         if filename:
             try:
-                self.model.save_to_m3u(filename)
+                if filename.lower().endswith(SESSION_EXTENSION):
+                    self.model.save_session(filename)
+                else:
+                    self.model.save_to_m3u(filename, relative=self.view.use_relative_paths())
                 self.view.show_message("Éxito", "Playlist guardada correctamente")
             except Exception as e:
                 self.view.show_message("Error", f"No se pudo guardar: {str(e)}", True)
@@ -351,52 +791,224 @@ class PlaylistController:
     def load_playlist(self):
         filename = self.view.get_load_filename()
         if filename:
-            try:
-                self.model.load_from_m3u(filename)
-                self.update_view()
-                self.view.show_message("Éxito", "Playlist cargada correctamente")
-            except Exception as e:
-                self.view.show_message("Error", f"No se pudo cargar: {str(e)}", True)
+            self.metadata_loader.cancel()
+            self.folder_scanner.cancel()
+            self.duplicate_finder.cancel()
+            self._stop_playlist_load()
+            self.history.clear()
+            self.selected_song_ids = []
+            if filename.lower().endswith(SESSION_EXTENSION):
+                self.load_session(filename)
+                return
+            # Sin stat en el hilo de la interfaz: los tamaños se revalidan en segundo plano
+            self._playlist_loader = self.model.iter_load_m3u(filename, defer_stat=True)
+            self._load_timer.start()
+    
+    def load_session(self, filename):
+        """Restaura una sesión al instante y revalida los archivos en segundo plano"""
+        try:
+            self.model.load_session(filename)
+        except Exception as e:
+            self.update_view()
+            self.view.show_message("Error", f"No se pudo cargar: {str(e)}", True)
+            return
+        self.update_view()
+        self.session_validator.start(self.model.songs)
+        self.metadata_loader.enqueue(self.model.songs)
+        self.view.show_message("Éxito", "Sesión cargada correctamente")
+    
+    def on_session_checked(self, generation, results):
+        """Aplica un lote de stat de la revalidación; lo que cambió vuelve a leer sus tags"""
+        if generation != self.session_validator.generation:
+            return
+        changed = self.model.apply_revalidation(results)
+        if changed:
+            self.metadata_loader.enqueue(changed)
+            self.view.update_playlist_info(self.model)
+    
+    def on_session_validated(self, generation):
+        if generation == self.session_validator.generation and self._playlist_loader is None:
+            self._run_pending_action()
+    
+    def _when_sizes_ready(self, action):
+        """
+        Ejecuta la acción con los tamaños ya revalidados por SessionValidator; si la
+        carga o la revalidación siguen en curso, la ejecuta al terminar (sin stat en
+        el hilo de la interfaz).
+        """
+        if self._playlist_loader is None and not self.session_validator.is_running:
+            action()
+            return
+        self._pending_action = action
+        self.view.show_status("Comprobando los archivos antes de continuar...")
+    
+    def _run_pending_action(self):
+        action, self._pending_action = self._pending_action, None
+        if action is not None:
+            self.view.show_status("")
+            action()
+    
+    def _load_next_chunk(self):
+        """Añade el siguiente bloque de la playlist; la vista se actualiza por filas insertadas"""
+        try:
+            songs = next(self._playlist_loader)
+        except StopIteration:
+            # La revalidación de los tamaños sigue en curso
+            self._load_timer.stop()
+            self._playlist_loader = None
+            self._report_load_result()
+            if not self.session_validator.is_running:
+                self._run_pending_action()
+            return
+        except Exception as e:
+            self._stop_playlist_load()
+            self.update_view()
+            self.view.show_message("Error", f"No se pudo cargar: {str(e)}", True)
+            return
+        
+        self.session_validator.extend(songs)
+        # Las canciones con datos de #EXTINF ya se pueden mostrar: sus tags se leen al final
+        self.metadata_loader.enqueue(sorted(songs, key=lambda song: song.hint is not None))
+        self.view.update_playlist_info(self.model)
+    
+    def _stop_playlist_load(self):
+        """Detiene una carga progresiva en curso (p.ej. al abrir otra playlist)"""
+        self._load_timer.stop()
+        self.session_validator.cancel()
+        self._pending_action = None
+        if self._playlist_loader is not None:
+            self._playlist_loader.close()
+            self._playlist_loader = None
+    
+    def _report_load_result(self):
+        errors = self.model.load_errors
+        if not errors:
+            self.view.show_message("Éxito", "Playlist cargada correctamente")
+            return
+        details = "\n".join(str(error) for error in errors[:10])
+        if len(errors) > 10:
+            details += f"\n... y {len(errors) - 10} más"
+        self.view.show_message("Playlist cargada con avisos",
+                               f"Se ignoraron {len(errors)} líneas:\n{details}")
     
     def new_playlist(self):
+        self._stop_playlist_load()
+        self.folder_scanner.cancel()
+        self.duplicate_finder.cancel()
+        self.metadata_loader.cancel()
+        self.history.clear()
         self.model = Playlist()
-        self.selected_indices = []
+        self.selected_song_ids = []
         self.update_view()
     
     def close_playlist(self):
+        self._stop_playlist_load()
+        self.folder_scanner.cancel()
+        self.duplicate_finder.cancel()
+        self.metadata_loader.cancel()
+        self.history.clear()
         self.model = Playlist()
-        self.selected_indices = []
+        self.selected_song_ids = []
         self.update_view()
     
-    def copy_to_usb(self, usb_path, metadata_config):
-        """Implementa la copia a USB con configuración de metadatos"""
+    def copy_to_usb(self, usb_path, metadata_config, songs=None):
+        """
+        Implementa la copia a USB con configuración de metadatos. 'songs' permite
+        copiar solo una parte (p.ej. las canciones de un StickPlan del reparto).
+        """
         if not self.model.songs:
             self.view.show_message("Error", "No hay canciones para copiar", True)
             return
         
+        # Los tamaños se revalidan en segundo plano al cargar: esperar si aún no terminó
+        self._when_sizes_ready(lambda: self._start_copy(usb_path, metadata_config, songs))
+    
+    def _start_copy(self, usb_path, metadata_config, songs):
+        if songs is None:
+            songs = list(self.model.songs)
+        
         # Crear y mostrar diálogo de progreso
-        total_files = len(self.model.songs)
+        total_files = len(songs)
         self.progress_dialog = self.view.show_copy_progress(total_files)
         
         # Conectar señales del diálogo de progreso
         self.progress_dialog.rejected.connect(self.on_copy_cancelled)
         
         # Crear y ejecutar hilo de copia
-        self.copy_thread = USBCopyThread(self.model.songs, usb_path, metadata_config)
+        streams = metadata_config.get('streams', DEFAULT_COPY_STREAMS)
+        # La estimación de duración usa la velocidad medida en la copia anterior
+        if self.last_copy_speed:
+            metadata_config = dict(metadata_config, expected_speed=self.last_copy_speed)
+        self.copy_thread = USBCopyThread(songs, usb_path, metadata_config, streams)
         self.copy_thread.progress_updated.connect(self.on_copy_progress_updated)
+        self.copy_thread.bytes_progress.connect(self.view.update_copy_bytes)
+        self.copy_thread.sync_planned.connect(self.view.show_copy_sync_summary)
+        self.copy_thread.copy_planned.connect(self.view.show_copy_plan)
+        self.copy_thread.plan_trimmed.connect(self.view.show_copy_trimmed)
+        self.copy_thread.throughput_updated.connect(self.view.update_copy_throughput)
         self.copy_thread.finished_success.connect(self.on_copy_finished)
         self.copy_thread.finished_error.connect(self.on_copy_error)
+        self.progress_dialog.pause_state_changed.connect(self.on_pause_state_changed)
         self.copy_thread.start()
     
+    def split_across_usbs(self, capacities_text, base_path):
+        """Reparte la playlist entre varias memorias y guarda una .m3u por memoria"""
+        if not self.model.songs:
+            self.view.show_message("Error", "No hay canciones para repartir", True)
+            return
+        try:
+            capacities = parse_capacities(capacities_text)
+        except ValueError as e:
+            self.view.show_message("Error", f"Capacidades no válidas: {e}", True)
+            return
+        
+        self._when_sizes_ready(lambda: self._export_split(capacities, base_path))
+    
+    def _export_split(self, capacities, base_path):
+        result = pack_playlist(self.model, capacities)
+        
+        folder, file_name = os.path.split(base_path)
+        base_name = os.path.splitext(file_name)[0]
+        try:
+            result.export_m3u(folder, base_name)
+        except Exception as e:
+            self.view.show_message("Error", f"Error al guardar las playlists: {str(e)}", True)
+            return
+        
+        lines = []
+        for stick in result.used_sticks:
+            lines.append(f"USB {stick.index + 1}: {len(stick.songs)} canciones, "
+                         f"{format_size(stick.used_bytes)} usados, {format_size(stick.free_bytes)} libres")
+        if result.split_destinations:
+            lines.append(f"Carpetas repartidas entre varias USB: {', '.join(sorted(result.split_destinations))}")
+        if result.unassigned:
+            lines.append(f"{len(result.unassigned)} canciones no caben en ninguna USB")
+        self.view.show_message("Reparto en varias USB", "\n".join(lines), bool(result.unassigned))
+    
     def on_copy_progress_updated(self, current, total, current_file):
         """Actualiza el progreso de copia"""
         self.view.update_copy_progress(current, total, current_file)
     
     def on_copy_finished(self):
         """Maneja la finalización exitosa de la copia"""
-        self.view.close_copy_progress()
-        self.view.show_message("Éxito", "Copia a USB completada")
+        # Cerrar el diálogo emite rejected y on_copy_cancelled suelta el hilo: guardarlo antes
+        thread = self.copy_thread
         self.copy_thread = None
+        self.view.close_copy_progress()
+        # Solo copias con volumen suficiente dan una velocidad representativa
+        if sum(size for _, size, _ in thread.file_timings) >= 16 * 1024 * 1024:
+            self.last_copy_speed = thread.average_speed
+        message = "Copia a USB completada"
+        slow_files = self._slow_files_report(thread.file_timings)
+        if slow_files:
+            message += "\n\nArchivos más lentos:\n" + slow_files
+        self.view.show_message("Éxito", message)
+    
+    def _slow_files_report(self, file_timings, limit=5):
+        """Líneas con los archivos más lentos de la copia (velocidad efectiva)"""
+        timed = [(size / elapsed, path, elapsed) for path, size, elapsed in file_timings if elapsed > 0]
+        return "\n".join(f"{os.path.basename(path)} — {format_size(speed)}/s ({elapsed:.2f} s)"
+                         for speed, path, elapsed in sorted(timed)[:limit])
     
     def on_copy_error(self, error_message):
         """Maneja errores durante la copia"""
@@ -407,8 +1019,9 @@ class PlaylistController:
     def on_copy_cancelled(self):
         """Maneja la cancelación de la copia"""
         if self.copy_thread and self.copy_thread.isRunning():
+            # La cancelación se atiende entre bloques, así que esperar al hilo es breve y seguro
             self.copy_thread.cancel()
-            self.copy_thread.wait(1000)  # Esperar máximo 1 segundo
+            self.copy_thread.wait()
         self.view.close_copy_progress()
         self.copy_thread = None
     
@@ -417,4 +1030,11 @@ class PlaylistController:
         self.view.update_playlist_info(self.model)
     
     def show(self):
-        self.view.show()
\ No newline at end of file
+        self.view.show()
+    
+    def shutdown(self):
+        """Detiene el trabajo en segundo plano al cerrar la ventana"""
+        self._stop_playlist_load()
+        self.folder_scanner.cancel()
+        self.duplicate_finder.cancel()
+        self.metadata_loader.shutdown()
\ No newline at end of file
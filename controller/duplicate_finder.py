@@ -0,0 +1,44 @@
+import threading
+from PyQt5.QtCore import QObject, pyqtSignal
+from model.duplicates import find_duplicates
+
+
+class DuplicateFinder(QObject):
+    """
+    Confirma en segundo plano los candidatos del índice de duplicados (lee bloques
+    de los archivos y, si se pide, el hash completo en varios hilos) y envía los
+    grupos encontrados como pares (motivo, ids).
+    """
+    progress_updated = pyqtSignal(int, int, int)  # generación, archivos leídos, total
+    finished = pyqtSignal(int, list)  # generación, grupos (motivo, ids)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.generation = 0
+        self._cancel_event = threading.Event()
+
+    def start(self, candidates, full_hash=False):
+        self.cancel()
+        worker = threading.Thread(
+            target=self._run,
+            args=(candidates, full_hash, self.generation, self._cancel_event),
+            daemon=True
+        )
+        worker.start()
+
+    def cancel(self):
+        self._cancel_event.set()
+        self._cancel_event = threading.Event()
+        self.generation += 1
+
+    def _run(self, candidates, full_hash, generation, cancel_event):
+        def progress(done, total):
+            self.progress_updated.emit(generation, done, total)
+
+        try:
+            groups = find_duplicates(candidates, full_hash, cancel_event, progress)
+        except Exception as e:
+            print(f"Error finding duplicates: {e}")
+            groups = []
+        if not cancel_event.is_set():
+            self.finished.emit(generation, groups)
@@ -0,0 +1,157 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtCore import QObject, pyqtSignal
+from model.model import Song
+
+DEFAULT_BATCH_SIZE = 500
+# Como mínimo se envía un lote cada este intervalo aunque no esté lleno
+BATCH_INTERVAL = 0.1
+# Hilos para clasificar archivos (leer su cabecera) mientras se recorre cada carpeta
+CLASSIFY_WORKERS = 8
+
+
+class FolderScanner(QObject):
+    """
+    Explora archivos y carpetas soltados en un hilo de trabajo con os.scandir.
+    Las canciones encontradas se envían por lotes (con el stat del recorrido ya
+    aplicado) y las exploraciones se atienden en orden; cancel() las descarta todas.
+    """
+    batch_found = pyqtSignal(int, list)  # generación, canciones nuevas
+    progress_updated = pyqtSignal(int, int)  # generación, archivos encontrados
+    scan_finished = pyqtSignal(int, int)  # generación, total encontrado
+
+    def __init__(self, accept=None, batch_size: int = DEFAULT_BATCH_SIZE, parent=None):
+        super().__init__(parent)
+        # accept(ruta, DirEntry o None) decide si el archivo es audio
+        self.accept = accept or (lambda path, entry: True)
+        self.batch_size = batch_size
+        self.generation = 0
+        self._cancel_event = threading.Event()
+        self._requests = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self._classify_pool = ThreadPoolExecutor(max_workers=CLASSIFY_WORKERS, thread_name_prefix="scan-classify")
+
+    def scan(self, paths):
+        """Programa la exploración de rutas soltadas (archivos o carpetas)"""
+        self._requests.put((list(paths), self.generation, self._cancel_event))
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="folder-scan", daemon=True)
+                self._worker.start()
+
+    def cancel(self):
+        """Detiene la exploración en curso y descarta las pendientes"""
+        self._cancel_event.set()
+        self._cancel_event = threading.Event()
+        self.generation += 1
+
+    def _run(self):
+        while True:
+            try:
+                paths, generation, cancel_event = self._requests.get(timeout=1.0)
+            except queue.Empty:
+                with self._lock:
+                    if self._requests.empty():
+                        self._worker = None
+                        return
+                continue
+            if not cancel_event.is_set():
+                self._scan_paths(paths, generation, cancel_event)
+
+    def _scan_paths(self, paths, generation, cancel_event):
+        found = 0
+        batch = []
+        last_emit = time.monotonic()
+
+        def flush(force=False):
+            nonlocal batch, last_emit
+            now = time.monotonic()
+            if batch and (force or len(batch) >= self.batch_size or now - last_emit >= BATCH_INTERVAL):
+                self.batch_found.emit(generation, batch)
+                self.progress_updated.emit(generation, found)
+                batch = []
+                last_emit = now
+
+        for path in paths:
+            if cancel_event.is_set():
+                return
+            if os.path.isdir(path):
+                # Usar el nombre de la carpeta como destino
+                destination = os.path.basename(os.path.normpath(path))
+                for song in self._walk(path, destination, cancel_event):
+                    batch.append(song)
+                    found += 1
+                    flush()
+            elif os.path.isfile(path) and self.accept(path, None):
+                song = Song(file_path=path)
+                try:
+                    song.set_stat(os.stat(path))
+                except OSError:
+                    pass
+                batch.append(song)
+                found += 1
+                flush()
+
+        if cancel_event.is_set():
+            return
+        flush(force=True)
+        self.scan_finished.emit(generation, found)
+
+    def _classify(self, entry):
+        try:
+            return self.accept(entry.path, entry)
+        except Exception as e:
+            print(f"Error classifying {entry.path}: {e}")
+            return False
+
+    def _walk(self, folder, destination, cancel_event):
+        """Recorrido iterativo; no entra dos veces en la misma carpeta (bucles de enlaces)"""
+        visited = set()
+        pending = [folder]
+        while pending:
+            if cancel_event.is_set():
+                return
+            directory = pending.pop()
+            try:
+                st = os.stat(directory)
+            except OSError:
+                continue
+            key = (st.st_dev, st.st_ino)
+            if key in visited:
+                continue
+            visited.add(key)
+
+            try:
+                with os.scandir(directory) as entries:
+                    entries = sorted(entries, key=lambda entry: entry.name)
+            except OSError as e:
+                print(f"Error scanning {directory}: {e}")
+                continue
+
+            subdirs, files = [], []
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        subdirs.append(entry.path)
+                    elif entry.is_file():
+                        files.append(entry)
+                except OSError:
+                    continue
+
+            # La clasificación puede leer la cabecera de cada archivo: se hace en paralelo
+            accepted = self._classify_pool.map(self._classify, files)
+            for entry, is_audio in zip(files, accepted):
+                if not is_audio:
+                    continue
+                try:
+                    song = Song(file_path=entry.path, destination=destination)
+                    song.set_stat(entry.stat())
+                except OSError:
+                    continue
+                yield song
+            # Pila: invertir para recorrer las subcarpetas en orden alfabético
+            pending.extend(reversed(subdirs))
@@ -0,0 +1,98 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtCore import QObject, pyqtSignal
+
+DEFAULT_BATCH_SIZE = 64
+
+
+def default_worker_count() -> int:
+    # La lectura de tags es sobre todo E/S, así que conviene tener más hilos que núcleos
+    return min(16, (os.cpu_count() or 2) * 2)
+
+
+class MetadataLoader(QObject):
+    """
+    Lee los metadatos de las canciones en segundo plano con un pool de hilos.
+    Los resultados se envían por lotes mediante señales Qt, de modo que la vista
+    solo actualiza las filas afectadas y el hilo de la interfaz nunca se bloquea.
+    Un único hilo repartidor atiende en orden las peticiones de enqueue().
+    """
+    batch_loaded = pyqtSignal(int, list)  # generación, pares (canción, metadatos)
+
+    def __init__(self, max_workers: int = None, batch_size: int = DEFAULT_BATCH_SIZE, parent=None):
+        super().__init__(parent)
+        self.max_workers = max_workers or default_worker_count()
+        self.batch_size = batch_size
+        self.generation = 0
+        self._cancel_event = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix="metadata")
+        self._requests = queue.Queue()
+        self._dispatcher = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, songs):
+        """Programa la lectura de metadatos de las canciones que aún no los tienen"""
+        pending = [song for song in songs if not song.has_metadata]
+        if not pending:
+            return
+        self._requests.put((pending, self.generation, self._cancel_event))
+        with self._lock:
+            if self._dispatcher is None or not self._dispatcher.is_alive():
+                self._dispatcher = threading.Thread(target=self._run, name="metadata-dispatch", daemon=True)
+                self._dispatcher.start()
+
+    def cancel(self):
+        """Cancela todos los trabajos pendientes (p.ej. al reemplazar la playlist)"""
+        self._cancel_event.set()
+        self._cancel_event = threading.Event()
+        self.generation += 1
+
+    def shutdown(self):
+        """Cancela lo pendiente y cierra el pool (al cerrar la aplicación)"""
+        self.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self):
+        while True:
+            try:
+                songs, generation, cancel_event = self._requests.get(timeout=1.0)
+            except queue.Empty:
+                with self._lock:
+                    if self._requests.empty():
+                        self._dispatcher = None
+                        return
+                continue
+            if not cancel_event.is_set():
+                self._dispatch(songs, generation, cancel_event)
+
+    def _dispatch(self, songs, generation, cancel_event):
+        for start in range(0, len(songs), self.batch_size):
+            if cancel_event.is_set():
+                return
+
+            batch = songs[start:start + self.batch_size]
+            try:
+                loaded = list(self._executor.map(self._load_song, batch, [cancel_event] * len(batch)))
+            except RuntimeError:
+                # El pool se cerró mientras había trabajo en curso
+                return
+
+            if cancel_event.is_set():
+                return
+
+            self.batch_loaded.emit(generation, [result for result in loaded if result is not None])
+
+    @staticmethod
+    def _load_song(song, cancel_event):
+        # La canción no se modifica aquí: los metadatos se asignan en el hilo de la interfaz
+        # al recibir el lote, para que la vista nunca vea cambios sin la notificación
+        if cancel_event.is_set():
+            return None
+        try:
+            return song, song.read_metadata()
+        except Exception as e:
+            print(f"Error loading metadata for {song.file_path}: {e}")
+            return None
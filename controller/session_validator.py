@@ -0,0 +1,78 @@
+import os
+import threading
+from PyQt5.QtCore import QObject, pyqtSignal
+
+DEFAULT_BATCH_SIZE = 500
+
+
+class SessionValidator(QObject):
+    """
+    Revalida en segundo plano las canciones restauradas de una sesión: hace stat de
+    cada archivo y envía los resultados por lotes al hilo de la interfaz, que los
+    aplica con Playlist.apply_revalidation. Las canciones no se modifican aquí.
+    """
+    batch_checked = pyqtSignal(int, list)  # generación, pares (canción, stat o None)
+    finished = pyqtSignal(int)  # generación; cuando terminan todas las canciones añadidas
+    _run_finished = pyqtSignal(int)  # generación; una llamada a extend() terminada
+
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE, parent=None):
+        super().__init__(parent)
+        self.batch_size = batch_size
+        self.generation = 0
+        self._cancel_event = threading.Event()
+        # Los lotes de extend() se revalidan de uno en uno y no en paralelo
+        self._run_lock = threading.Lock()
+        # Llamadas a extend() de esta generación cuyo final aún no llegó al hilo de la interfaz
+        self._pending_runs = 0
+        self._run_finished.connect(self._on_run_finished)
+
+    @property
+    def is_running(self) -> bool:
+        """True hasta que se entregue el último lote (se consulta desde el hilo de la interfaz)"""
+        return self._pending_runs > 0
+
+    def start(self, songs):
+        self.cancel()
+        self.extend(songs)
+
+    def extend(self, songs):
+        """Añade canciones a la revalidación en curso sin cancelarla (p.ej. carga por bloques)"""
+        self._pending_runs += 1
+        worker = threading.Thread(
+            target=self._run,
+            args=(list(songs), self.generation, self._cancel_event),
+            daemon=True
+        )
+        worker.start()
+
+    def cancel(self):
+        self._cancel_event.set()
+        self._cancel_event = threading.Event()
+        self.generation += 1
+        self._pending_runs = 0
+
+    def _run(self, songs, generation, cancel_event):
+        with self._run_lock:
+            self._check(songs, generation, cancel_event)
+
+    def _check(self, songs, generation, cancel_event):
+        for start in range(0, len(songs), self.batch_size):
+            if cancel_event.is_set():
+                return
+            results = []
+            for song in songs[start:start + self.batch_size]:
+                try:
+                    results.append((song, os.stat(song.file_path)))
+                except OSError:
+                    results.append((song, None))
+            self.batch_checked.emit(generation, results)
+        if not cancel_event.is_set():
+            self._run_finished.emit(generation)
+
+    def _on_run_finished(self, generation):
+        # Llega por la cola de eventos, detrás de los lotes de esa llamada
+        if generation != self.generation:
+            return
+        self._pending_runs -= 1
+        if not self._pending_runs:
+            self.finished.emit(generation)
@@ -0,0 +1,111 @@
+from typing import Dict, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él las columnas son listas de Python
+    np = None
+
+# Columnas numéricas que se guardan por canción
+SIZE = 'size'
+DURATION = 'duration'
+BITRATE = 'bitrate'
+NUMERIC_COLUMNS = (SIZE, DURATION, BITRATE)
+INITIAL_CAPACITY = 1024
+
+
+def song_values(song) -> Tuple[int, int, int]:
+    """(tamaño, duración, bitrate) con los datos ya leídos; la duración puede venir de #EXTINF"""
+    if song.has_metadata:
+        return song.size, int(song.duration or 0), int(song.bitrate or 0)
+    duration = song.hint.duration if song.hint else 0
+    return song.size, int(duration or 0), 0
+
+
+class SongColumns:
+    """
+    Copia en columnas (tamaño, duración, bitrate) de los datos numéricos de las
+    canciones, que Playlist mantiene en cada cambio. Con NumPy los totales y los
+    órdenes se calculan vectorizados.
+    Cada canción ocupa una fila; las bajas la dejan a cero para reutilizarla.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._rows: Dict[int, int] = {}  # song_id -> fila
+        self._free: List[int] = []
+        self._used = 0  # Filas ocupadas alguna vez (las siguientes están sin usar)
+        self._columns = {name: self._zeros(INITIAL_CAPACITY) for name in NUMERIC_COLUMNS}
+
+    @staticmethod
+    def _zeros(length):
+        return np.zeros(length, dtype=np.int64) if np is not None else [0] * length
+
+    def _grow(self):
+        capacity = len(self._columns[SIZE]) * 2
+        self._columns = {name: self._resized(column, capacity) for name, column in self._columns.items()}
+
+    @staticmethod
+    def _resized(column, capacity):
+        if np is None:
+            return column + [0] * (capacity - len(column))
+        grown = np.zeros(capacity, dtype=np.int64)
+        grown[:len(column)] = column
+        return grown
+
+    def __len__(self):
+        return len(self._rows)
+
+    # --- Mantenimiento (lo llama Playlist) ---
+
+    def add(self, song):
+        if self._free:
+            row = self._free.pop()
+        else:
+            if self._used == len(self._columns[SIZE]):
+                self._grow()
+            row = self._used
+            self._used += 1
+        self._rows[song.song_id] = row
+        self._write(row, song)
+
+    def remove(self, song):
+        row = self._rows.pop(song.song_id, None)
+        if row is None:
+            return
+        for column in self._columns.values():
+            column[row] = 0
+        self._free.append(row)
+
+    def update(self, song):
+        """Vuelve a leer tamaño, duración y bitrate (p.ej. tras cargar los metadatos)"""
+        row = self._rows.get(song.song_id)
+        if row is not None:
+            self._write(row, song)
+
+    def _write(self, row, song):
+        size, duration, bitrate = song_values(song)
+        self._columns[SIZE][row] = size
+        self._columns[DURATION][row] = duration
+        self._columns[BITRATE][row] = bitrate
+
+    # --- Consultas ---
+
+    def total(self, column: str) -> int:
+        values = self._columns[column][:self._used]
+        return int(values.sum()) if np is not None else sum(values)
+
+    def order(self, column: str, song_ids: List[int], reverse: bool = False) -> List[int]:
+        """
+        Posiciones de song_ids ordenadas por la columna (estable, como list.sort);
+        con NumPy es un argsort sobre los valores de esas filas.
+        """
+        if np is not None:
+            rows = np.fromiter((self._rows[song_id] for song_id in song_ids), dtype=np.int64,
+                               count=len(song_ids))
+            keys = self._columns[column][rows]
+            return np.argsort(-keys if reverse else keys, kind='stable').tolist()
+        values = self._columns[column]
+        keys = [values[self._rows[song_id]] for song_id in song_ids]
+        return sorted(range(len(keys)), key=keys.__getitem__, reverse=reverse)
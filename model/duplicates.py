@@ -0,0 +1,305 @@
+import os
+import hashlib
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from utils.sync_manifest import file_hash
+from model.metadata import UNKNOWN
+
+# Bloques del principio y del final que se comparan en el nivel 1
+QUICK_HASH_BLOCK = 64 * 1024
+# Diferencia máxima de duración (s) para considerar iguales dos versiones de una canción
+DURATION_TOLERANCE = 2
+FINGERPRINT_WORKERS = 8
+
+# Motivo de cada grupo, del más fiable al menos fiable
+MATCH_PATH = 'path'
+MATCH_CONTENT = 'content'
+MATCH_METADATA = 'metadata'
+MATCH_STRENGTH = {MATCH_PATH: 0, MATCH_CONTENT: 1, MATCH_METADATA: 2}
+
+
+# Signos ASCII que se cambian por espacios al normalizar
+_PUNCTUATION = str.maketrans({char: " " for char in map(chr, range(128)) if not char.isalnum()})
+
+
+def path_key(file_path: str) -> str:
+    return os.path.normcase(os.path.normpath(file_path))
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """Minúsculas, sin acentos ni signos: 'Canción (Live)' -> 'cancion live'"""
+    if not text:
+        return ""
+    if text.isascii():
+        return " ".join(text.translate(_PUNCTUATION).lower().split())
+    text = unicodedata.normalize('NFKD', text)
+    text = "".join(char if char.isalnum() else " " for char in text if not unicodedata.combining(char))
+    return " ".join(text.casefold().split())
+
+
+def tag_key(song) -> Optional[Tuple[Tuple[str, str], int]]:
+    """((artista, título) normalizados, duración) de los metadatos ya leídos o de #EXTINF"""
+    if song.has_metadata:
+        info = song.metadata
+        artist, title, duration = info.artist, info.title, info.duration
+    elif song.hint:
+        duration, artist, title = song.hint
+    else:
+        return None
+    # Sin tags (artista desconocido) o sin duración no hay con qué comparar; un título
+    # igual al nombre del archivo es válido: muchos archivos se llaman como la canción
+    if not duration or not artist or artist == UNKNOWN:
+        return None
+    artist, title = normalize_text(artist), normalize_text(title)
+    if not artist or not title:
+        return None
+    return (artist, title), int(duration)
+
+
+def quick_fingerprint(file_path: str, size: int) -> Optional[bytes]:
+    """Hash del primer y el último bloque; distingue casi todos los archivos del mismo tamaño"""
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    try:
+        with open(file_path, 'rb') as f:
+            digest.update(f.read(QUICK_HASH_BLOCK))
+            if size > QUICK_HASH_BLOCK:
+                f.seek(max(QUICK_HASH_BLOCK, size - QUICK_HASH_BLOCK))
+                digest.update(f.read(QUICK_HASH_BLOCK))
+    except OSError:
+        return None
+    return digest.digest()
+
+
+def _full_hash(file_path: str) -> Optional[str]:
+    try:
+        return file_hash(file_path)
+    except OSError:
+        return None
+
+
+class DuplicateCandidates(NamedTuple):
+    """Copia de los grupos candidatos para procesar fuera del hilo de la interfaz"""
+    path_groups: List[List[int]]  # ids con la misma ruta
+    size_groups: List[List[Tuple[int, str, int]]]  # (id, ruta, tamaño) con el mismo tamaño
+    tag_groups: List[List[int]]  # ids con mismo artista y título y duración parecida
+
+
+class DuplicateGroup(NamedTuple):
+    """Canciones repetidas en el orden de la playlist; se conserva la primera"""
+    reason: str
+    songs: List
+
+    @property
+    def extra_songs(self) -> List:
+        return self.songs[1:]
+
+    @property
+    def wasted_bytes(self) -> int:
+        return sum(song.size for song in self.extra_songs)
+
+
+class DuplicateIndex:
+    """
+    Índice de posibles duplicados que Playlist mantiene en cada alta, baja o cambio:
+    canciones por ruta, por tamaño y por (artista, título) normalizados. Todo es en
+    memoria; la lectura de archivos para confirmar se hace con find_duplicates.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._by_path: Dict[str, Set[int]] = {}
+        self._by_size: Dict[int, Dict[int, str]] = {}
+        self._by_tags: Dict[Tuple[str, str], Dict[int, int]] = {}
+        # id -> claves con las que está indexada cada canción
+        self._keys: Dict[int, Tuple] = {}
+        # Canciones cuya ruta ya estaba en la playlist
+        self.path_duplicates = 0
+
+    def add(self, song):
+        path, size, tags = path_key(song.file_path), song.size, tag_key(song)
+        self._keys[song.song_id] = (path, size, tags)
+
+        same_path = self._by_path.get(path)
+        if same_path is None:
+            self._by_path[path] = {song.song_id}
+        else:
+            same_path.add(song.song_id)
+            self.path_duplicates += 1
+        if size:
+            self._add_to(self._by_size, size, song.song_id, song.file_path)
+        if tags is not None:
+            self._add_to(self._by_tags, tags[0], song.song_id, tags[1])
+
+    def remove(self, song):
+        keys = self._keys.pop(song.song_id, None)
+        if keys is None:
+            return
+        path, size, tags = keys
+
+        same_path = self._by_path[path]
+        same_path.discard(song.song_id)
+        if same_path:
+            self.path_duplicates -= 1
+        else:
+            del self._by_path[path]
+        self._discard(self._by_size, size, song.song_id)
+        if tags is not None:
+            self._discard(self._by_tags, tags[0], song.song_id)
+
+    def update(self, song):
+        """Vuelve a indexar una canción cuyo tamaño o metadatos cambiaron"""
+        if song.song_id in self._keys:
+            self.remove(song)
+            self.add(song)
+
+    @staticmethod
+    def _add_to(buckets, key, song_id, value):
+        bucket = buckets.get(key)
+        if bucket is None:
+            buckets[key] = {song_id: value}
+        else:
+            bucket[song_id] = value
+
+    @staticmethod
+    def _discard(buckets, key, song_id):
+        bucket = buckets.get(key)
+        if bucket is not None:
+            bucket.pop(song_id, None)
+            if not bucket:
+                del buckets[key]
+
+    def candidates(self) -> DuplicateCandidates:
+        """Solo los grupos con más de una canción; cuesta lo que el número de colisiones"""
+        path_groups = [sorted(ids) for ids in self._by_path.values() if len(ids) > 1]
+        size_groups = [[(song_id, file_path, size) for song_id, file_path in sorted(songs.items())]
+                       for size, songs in self._by_size.items() if len(songs) > 1]
+
+        tag_groups = []
+        for durations in self._by_tags.values():
+            if len(durations) < 2:
+                continue
+            # Cada grupo abarca como mucho la tolerancia desde su primera duración (sin
+            # encadenar vecinas: 200, 202 y 204 no acaban en el mismo grupo)
+            cluster, first = [], None
+            for song_id, duration in sorted(durations.items(), key=lambda item: item[1]):
+                if cluster and duration - first > DURATION_TOLERANCE:
+                    if len(cluster) > 1:
+                        tag_groups.append(sorted(cluster))
+                    cluster = []
+                if not cluster:
+                    first = duration
+                cluster.append(song_id)
+            if len(cluster) > 1:
+                tag_groups.append(sorted(cluster))
+        return DuplicateCandidates(path_groups, size_groups, tag_groups)
+
+
+class _Groups:
+    """Unión de conjuntos: une los grupos de todos los niveles y recuerda el motivo menos fiable"""
+
+    def __init__(self):
+        self._parent: Dict[int, int] = {}
+        self._reason: Dict[int, str] = {}
+
+    def _find(self, song_id):
+        parent = self._parent.setdefault(song_id, song_id)
+        while parent != song_id:
+            grandparent = self._parent[parent]
+            self._parent[song_id] = grandparent
+            song_id, parent = parent, grandparent
+        return song_id
+
+    def join(self, song_ids, reason):
+        root = self._find(song_ids[0])
+        for song_id in song_ids[1:]:
+            other = self._find(song_id)
+            if other != root:
+                self._parent[other] = root
+                reason = max(reason, self._reason.pop(other, reason), key=MATCH_STRENGTH.get)
+        self._reason[root] = max(reason, self._reason.get(root, reason), key=MATCH_STRENGTH.get)
+
+    def groups(self) -> List[Tuple[str, List[int]]]:
+        members: Dict[int, List[int]] = {}
+        for song_id in self._parent:
+            members.setdefault(self._find(song_id), []).append(song_id)
+        return sorted(((self._reason[root], sorted(ids)) for root, ids in members.items()),
+                      key=lambda group: group[1][0])
+
+
+def find_duplicates(candidates: DuplicateCandidates, full_hash: bool = False,
+                    cancel_event=None, progress=None) -> List[Tuple[str, List[int]]]:
+    """
+    Confirma los candidatos por niveles y devuelve grupos (motivo, ids ordenados):
+    1. misma ruta, o mismo tamaño y mismo hash del primer y último bloque;
+    2. mismo artista y título normalizados con duración parecida (reconversiones);
+    3. si full_hash, los grupos del nivel 1 por contenido se confirman con el hash
+       completo, calculado en varios hilos (hashlib suelta el GIL al leer bloques
+       grandes y el coste es sobre todo de E/S).
+    progress(hechos, total) informa de los archivos leídos. Devuelve [] si se cancela.
+    """
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    groups = _Groups()
+    for song_ids in candidates.path_groups:
+        groups.join(song_ids, MATCH_PATH)
+
+    # Nivel 1: las canciones de la misma ruta se leen una sola vez
+    files = {}
+    for size_group in candidates.size_groups:
+        for song_id, file_path, size in size_group:
+            files.setdefault(path_key(file_path), (file_path, size))
+    total = len(files)
+    fingerprints = {}
+    with ThreadPoolExecutor(max_workers=FINGERPRINT_WORKERS) as pool:
+        for done, (key, fingerprint) in enumerate(zip(files, pool.map(
+                lambda item: quick_fingerprint(*item), files.values())), 1):
+            if cancelled():
+                pool.shutdown(cancel_futures=True)
+                return []
+            fingerprints[key] = fingerprint
+            if progress is not None and done % 200 == 0:
+                progress(done, total)
+
+    content_groups = []
+    for size_group in candidates.size_groups:
+        by_fingerprint: Dict[bytes, List[Tuple[int, str]]] = {}
+        for song_id, file_path, size in size_group:
+            fingerprint = fingerprints.get(path_key(file_path))
+            if fingerprint is not None:
+                by_fingerprint.setdefault(fingerprint, []).append((song_id, file_path))
+        content_groups.extend(group for group in by_fingerprint.values()
+                              if len({path_key(file_path) for _, file_path in group}) > 1)
+
+    # Nivel 3: separar los que solo coinciden en los bloques comparados
+    if full_hash and content_groups:
+        paths = list({path_key(file_path): file_path
+                      for group in content_groups for _, file_path in group}.items())
+        hashes = {}
+        with ThreadPoolExecutor(max_workers=FINGERPRINT_WORKERS) as pool:
+            for done, ((key, _), digest) in enumerate(zip(paths, pool.map(
+                    _full_hash, [file_path for _, file_path in paths])), 1):
+                if cancelled():
+                    pool.shutdown(cancel_futures=True)
+                    return []
+                hashes[key] = digest
+                if progress is not None:
+                    progress(done, len(paths))
+        confirmed = []
+        for group in content_groups:
+            by_hash: Dict[str, List[Tuple[int, str]]] = {}
+            for song_id, file_path in group:
+                digest = hashes.get(path_key(file_path))
+                if digest is not None:
+                    by_hash.setdefault(digest, []).append((song_id, file_path))
+            confirmed.extend(same for same in by_hash.values() if len(same) > 1)
+        content_groups = confirmed
+
+    for group in content_groups:
+        groups.join([song_id for song_id, _ in group], MATCH_CONTENT)
+    for song_ids in candidates.tag_groups:
+        groups.join(song_ids, MATCH_METADATA)
+    return groups.groups()
@@ -0,0 +1,181 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import List, Optional
+
+# Límites del historial: órdenes guardadas y canciones referenciadas en total
+MAX_COMMANDS = 100
+MAX_SONGS = 500000
+
+
+class EditCommand(ABC):
+    """
+    Operación de edición reversible. apply() la ejecuta sobre el Playlist y guarda
+    solo lo necesario para deshacerla (canciones afectadas y sus posiciones);
+    devuelve False si no cambió nada. revert() la deshace.
+    """
+    description = ""
+
+    @abstractmethod
+    def apply(self, playlist) -> bool:
+        """Aplica la orden; devuelve False si no cambió nada"""
+
+    @abstractmethod
+    def revert(self, playlist):
+        """Deshace la orden"""
+
+    @property
+    def size(self) -> int:
+        """Canciones que referencia la orden (para acotar la memoria del historial)"""
+        return 0
+
+
+class RemoveSongsCommand(EditCommand):
+    """Baja de canciones por ids; con keep=True se conservan los ids y se quita el resto"""
+
+    def __init__(self, song_ids, keep: bool = False, description: str = "Eliminar canciones"):
+        self.song_ids = set(song_ids)
+        self.keep = keep
+        self.description = description
+        self.songs: List = []
+        self.positions: List[int] = []
+        self.group_positions: List[int] = []
+
+    def apply(self, playlist) -> bool:
+        # En el orden de la playlist, que es el que devuelve remove_songs
+        if self.keep:
+            doomed = [song for song in playlist.songs if song.song_id not in self.song_ids]
+            # Rehacer debe quitar exactamente las mismas canciones
+            self.song_ids, self.keep = {song.song_id for song in doomed}, False
+        else:
+            doomed = [song for song in playlist.songs if song.song_id in self.song_ids]
+        if not doomed:
+            return False
+        self.positions, self.group_positions = playlist.locate_songs(doomed)
+        self.songs = playlist.remove_songs({song.song_id for song in doomed})
+        return True
+
+    def revert(self, playlist):
+        playlist.restore_songs(self.songs, self.positions, self.group_positions)
+
+    @property
+    def size(self) -> int:
+        return len(self.songs)
+
+
+class MoveSongsCommand(EditCommand):
+    """Cambio de destino de unas canciones"""
+
+    def __init__(self, song_ids, new_destination: str, description: str = "Cambiar destino"):
+        self.song_ids = list(song_ids)
+        self.new_destination = new_destination
+        self.description = description
+        self.songs: List = []
+        self.old_destinations: List[str] = []
+        self.group_positions: List[int] = []
+
+    def _affected(self, playlist):
+        return [song for song in playlist.get_songs(self.song_ids)
+                if song.destination != self.new_destination]
+
+    def _move(self, playlist):
+        playlist.update_destination(self.song_ids, self.new_destination)
+
+    def apply(self, playlist) -> bool:
+        self.songs = self._affected(playlist)
+        if not self.songs:
+            return False
+        self.old_destinations = [song.destination for song in self.songs]
+        _, self.group_positions = playlist.locate_songs(self.songs)
+        self._move(playlist)
+        return True
+
+    def revert(self, playlist):
+        playlist.restore_destinations(self.songs, self.old_destinations, self.group_positions)
+
+    @property
+    def size(self) -> int:
+        return len(self.songs)
+
+
+class RenameDestinationCommand(MoveSongsCommand):
+    """Renombrar un destino: se deshace devolviendo sus canciones, aunque se fusionara con otro"""
+
+    def __init__(self, old_destination: str, new_destination: str):
+        super().__init__([], new_destination, "Renombrar destino")
+        self.old_destination = old_destination
+        self.merged = False
+
+    def _affected(self, playlist):
+        if self.old_destination == self.new_destination:
+            return []
+        return playlist.get_songs(playlist.get_group_song_ids(self.old_destination))
+
+    def _move(self, playlist):
+        self.merged = self.new_destination in playlist.get_all_destinations()
+        playlist.rename_destination(self.old_destination, self.new_destination)
+
+    def revert(self, playlist):
+        if self.merged:
+            super().revert(playlist)
+        else:
+            # Sin fusión basta con volver a renombrar: el grupo sigue en su sitio
+            playlist.rename_destination(self.new_destination, self.old_destination)
+
+
+class EditHistory:
+    """
+    Historial de deshacer/rehacer. Cada orden guarda solo el cambio (no copias de
+    la lista), y deshacer o rehacer cuesta lo que ese cambio. Se descartan las
+    órdenes más antiguas al pasar de max_commands o de max_songs canciones.
+    """
+
+    def __init__(self, max_commands: int = MAX_COMMANDS, max_songs: int = MAX_SONGS):
+        self.max_commands = max_commands
+        self.max_songs = max_songs
+        self._undo = deque()
+        self._redo: List[EditCommand] = []
+        self._songs = 0
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+        self._songs = 0
+
+    @property
+    def can_undo(self) -> bool:
+        return bool(self._undo)
+
+    @property
+    def can_redo(self) -> bool:
+        return bool(self._redo)
+
+    def execute(self, playlist, command: EditCommand) -> bool:
+        """Aplica la orden y la guarda; devuelve False si no cambió nada"""
+        if not command.apply(playlist):
+            return False
+        self._redo.clear()
+        self._push(command)
+        return True
+
+    def undo(self, playlist) -> Optional[EditCommand]:
+        if not self._undo:
+            return None
+        command = self._undo.pop()
+        self._songs -= command.size
+        command.revert(playlist)
+        self._redo.append(command)
+        return command
+
+    def redo(self, playlist) -> Optional[EditCommand]:
+        if not self._redo:
+            return None
+        command = self._redo.pop()
+        if command.apply(playlist):
+            self._push(command)
+        return command
+
+    def _push(self, command: EditCommand):
+        self._undo.append(command)
+        self._songs += command.size
+        while self._undo and (len(self._undo) > self.max_commands or self._songs > self.max_songs):
+            self._songs -= self._undo.popleft().size
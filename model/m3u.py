@@ -0,0 +1,147 @@
+import os
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse, unquote
+from urllib.request import url2pathname
+from utils.utils import atomic_write
+
+M3U_CHUNK_SIZE = 2000
+DESTINATION_PREFIX = "#DESTINO:"
+EXTINF_PREFIX = "#EXTINF:"
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+class M3UEntry(NamedTuple):
+    """Una canción leída de la playlist, con las pistas de #EXTINF si las había"""
+    file_path: str
+    destination: str
+    duration: Optional[int] = None
+    artist: Optional[str] = None
+    title: Optional[str] = None
+
+
+class M3UParseError(NamedTuple):
+    line_number: int
+    line: str
+    reason: str
+
+    def __str__(self):
+        return f"línea {self.line_number}: {self.reason} ({self.line[:80]})"
+
+
+def parse_extinf(value: str):
+    """
+    Interpreta '#EXTINF:duración,artista - título'. Devuelve (duración, artista, título);
+    lanza ValueError si la duración no es un número.
+    """
+    duration_text, _, display = value.partition(',')
+    # La duración puede llevar atributos detrás: '#EXTINF:123 tvg-id="x",Título'
+    duration = int(float(duration_text.split()[0])) if duration_text.strip() else -1
+    artist, title = None, display.strip() or None
+    if title and ' - ' in title:
+        artist, title = (part.strip() for part in title.split(' - ', 1))
+    return (duration if duration >= 0 else None), artist or None, title or None
+
+
+def resolve_entry_path(entry: str, base_dir: str) -> Optional[str]:
+    """Ruta absoluta de una entrada (relativa a la carpeta de la playlist o URI file://)"""
+    if entry.startswith('file://'):
+        return url2pathname(unquote(urlparse(entry).path))
+    if '://' in entry:
+        return None  # Flujos de red: no se pueden copiar a una USB
+    if not os.path.isabs(entry):
+        entry = os.path.join(base_dir, entry)
+    return os.path.normpath(entry)
+
+
+def iter_m3u(file_path: str, chunk_size: int = M3U_CHUNK_SIZE,
+             errors: Optional[List[M3UParseError]] = None) -> Iterator[List[M3UEntry]]:
+    """
+    Lee la playlist línea a línea y devuelve las entradas en bloques de chunk_size,
+    sin cargar el archivo entero en memoria. Las líneas que no se pueden interpretar
+    se añaden a 'errors' (si se pasa) con su número de línea y se ignoran.
+    """
+    base_dir = os.path.dirname(os.path.abspath(file_path))
+    destination = ""
+    hint = None
+    hint_line, hint_text = 0, ""
+    chunk: List[M3UEntry] = []
+
+    def report(line_number, line, reason):
+        if errors is not None:
+            errors.append(M3UParseError(line_number, line, reason))
+
+    with open(file_path, 'r', encoding='utf-8-sig', errors='replace') as file:
+        for line_number, raw_line in enumerate(file, 1):
+            line = raw_line.strip()
+            if not line:
+                continue
+
+            if line.startswith(DESTINATION_PREFIX):
+                destination = line[len(DESTINATION_PREFIX):].strip()
+            elif line.startswith(EXTINF_PREFIX):
+                if hint is not None:
+                    report(hint_line, hint_text, "#EXTINF sin archivo a continuación")
+                try:
+                    hint = parse_extinf(line[len(EXTINF_PREFIX):])
+                    hint_line, hint_text = line_number, line
+                except ValueError:
+                    hint = None
+                    report(line_number, line, "duración de #EXTINF no válida")
+            elif line.startswith("#"):
+                continue  # #EXTM3U y otras directivas que no usamos
+            elif '\ufffd' in line or '\0' in line:
+                report(line_number, line, "la ruta no es texto UTF-8 válido")
+                hint = None
+            else:
+                path = resolve_entry_path(line, base_dir)
+                if path is None:
+                    report(line_number, line, "las URL de red no se pueden copiar")
+                else:
+                    duration, artist, title = hint or (None, None, None)
+                    chunk.append(M3UEntry(path, destination, duration, artist, title))
+                    if len(chunk) >= chunk_size:
+                        yield chunk
+                        chunk = []
+                hint = None
+
+    if hint is not None:
+        report(hint_line, hint_text, "#EXTINF sin archivo a continuación")
+    if chunk:
+        yield chunk
+
+
+def format_extinf(duration: int, artist: Optional[str], title: Optional[str]) -> str:
+    display = f"{artist} - {title}" if artist and title else (title or "")
+    return f"{EXTINF_PREFIX}{duration},{display}"
+
+
+def _entry_path(file_path: str, base_dir: Optional[str]) -> str:
+    if base_dir is None:
+        return file_path
+    try:
+        return os.path.relpath(file_path, base_dir)
+    except ValueError:
+        return file_path  # Otra unidad en Windows: no hay ruta relativa posible
+
+
+def write_m3u(file_path: str, groups: Iterable[Tuple[str, Iterable[M3UEntry]]],
+              relative: bool = False):
+    """
+    Escribe la playlist de forma atómica: se genera un archivo temporal en la misma
+    carpeta y se renombra al terminar, así un fallo a mitad nunca deja una playlist
+    corrupta. 'groups' son pares (destino, entradas); el destino raíz ("" o "/") debe
+    ir primero porque sus canciones no llevan #DESTINO.
+    """
+    base_dir = os.path.dirname(os.path.abspath(file_path)) if relative else None
+
+    def lines():
+        yield "#EXTM3U\n"
+        for destination, entries in groups:
+            if destination and destination != "/":
+                yield f"{DESTINATION_PREFIX}{destination}\n"
+            for entry in entries:
+                if entry.duration is not None or entry.title:
+                    yield format_extinf(entry.duration or 0, entry.artist, entry.title) + "\n"
+                yield _entry_path(entry.file_path, base_dir) + "\n"
+
+    atomic_write(file_path, lambda file: file.writelines(lines()), buffering=WRITE_BUFFER_SIZE)
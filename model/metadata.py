@@ -0,0 +1,41 @@
+import sys
+from typing import Any, Dict, NamedTuple, Optional
+
+UNKNOWN = 'Desconocido'
+
+
+def intern_text(value):
+    """
+    Una sola copia en memoria de los textos que se repiten en miles de canciones
+    (destinos, artistas, álbumes, géneros). Lo que no es texto se devuelve tal cual.
+    """
+    return sys.intern(value) if type(value) is str else value
+
+
+class SongMetadata(NamedTuple):
+    """Metadatos leídos de los tags, en un registro fijo en lugar de un diccionario"""
+    title: str = ''
+    artist: str = UNKNOWN
+    album: str = UNKNOWN
+    genre: str = UNKNOWN
+    bitrate: int = 0
+    duration: int = 0
+
+    @classmethod
+    def from_dict(cls, metadata: Dict[str, Any]) -> 'SongMetadata':
+        """Convierte el diccionario de get_audio_metadata o de la caché"""
+        return cls(
+            str(metadata.get('title') or ''),
+            intern_text(str(metadata.get('artist') or UNKNOWN)),
+            intern_text(str(metadata.get('album') or UNKNOWN)),
+            intern_text(str(metadata.get('genre') or UNKNOWN)),
+            int(metadata.get('bitrate') or 0),
+            int(metadata.get('duration') or 0),
+        )
+
+
+class SongHint(NamedTuple):
+    """Datos de #EXTINF para mostrar la canción antes de leer sus tags"""
+    duration: int
+    artist: Optional[str]
+    title: Optional[str]
@@ -1,15 +1,36 @@
 import os
-from typing import List, Dict, Set
-from dataclasses import dataclass
-from utils.utils import get_file_size, format_size, get_audio_metadata, format_duration
+import itertools
+from typing import List, Dict, Set, Optional, Union, Sequence, Iterable, Tuple
+from utils.utils import format_size, format_duration
+from utils.metadata_cache import get_metadata_cache
+from model.m3u import iter_m3u, write_m3u, M3UEntry, M3U_CHUNK_SIZE
+from model import session
+from model.duplicates import DuplicateIndex, DuplicateGroup
+from model.columns import SongColumns, DURATION
+from model.metadata import SongMetadata, SongHint, intern_text, UNKNOWN
 
-@dataclass
 class Song:
-    file_path: str
-    destination: str = ""
+    """
+    Canción de la playlist. Usa __slots__ (sin __dict__ por instancia) y comparte
+    los textos repetidos: con cientos de miles de canciones la memoria importa.
+    """
+    __slots__ = ('file_path', 'destination', '_metadata', '_size', '_mtime_ns', 'song_id', 'hint')
     
-    def __post_init__(self):
-        self._metadata = None
+    def __init__(self, file_path: str, destination: str = ""):
+        self.file_path = file_path
+        # Muchas canciones comparten destino: una sola copia del texto
+        self.destination = intern_text(destination)
+        self._metadata: Optional[SongMetadata] = None
+        # Tamaño y fecha de modificación se leen una sola vez (ver refresh_stat)
+        self._size: Optional[int] = None
+        self._mtime_ns: Optional[int] = None
+        # Identificador estable que asigna el Playlist al añadir la canción
+        self.song_id: Optional[int] = None
+        # Datos de #EXTINF (duración, artista, título) para mostrar antes de leer los tags
+        self.hint: Optional[SongHint] = None
+    
+    def __repr__(self):
+        return f"Song(file_path={self.file_path!r}, destination={self.destination!r})"
     
     @property
     def file_name(self):
@@ -17,103 +38,448 @@ class Song:
     
     @property
     def size(self):
-        return get_file_size(self.file_path)
+        if self._size is None:
+            self.refresh_stat()
+        return self._size
+    
+    @property
+    def mtime_ns(self):
+        if self._mtime_ns is None:
+            self.refresh_stat()
+        return self._mtime_ns
+    
+    def set_stat(self, stat_result: os.stat_result):
+        """Usa un stat ya obtenido (p.ej. durante el escaneo de carpetas)"""
+        self._size = stat_result.st_size
+        self._mtime_ns = stat_result.st_mtime_ns
+    
+    def set_cached_stat(self, size: int, mtime_ns: int):
+        """Tamaño y fecha guardados (p.ej. en una sesión), pendientes de revalidar"""
+        self._size = size
+        self._mtime_ns = mtime_ns
+    
+    def refresh_stat(self) -> bool:
+        """Vuelve a leer tamaño y fecha del archivo; devuelve True si cambiaron"""
+        try:
+            st = os.stat(self.file_path)
+            size, mtime_ns = st.st_size, st.st_mtime_ns
+        except (OSError, FileNotFoundError):
+            size, mtime_ns = 0, 0
+        changed = (size, mtime_ns) != (self._size, self._mtime_ns)
+        self._size, self._mtime_ns = size, mtime_ns
+        return changed
+    
+    def copy(self) -> 'Song':
+        """Copia independiente (sin song_id) que conserva tamaño y metadatos ya leídos"""
+        song = Song(self.file_path, self.destination)
+        song._size, song._mtime_ns = self._size, self._mtime_ns
+        song._metadata = self._metadata
+        song.hint = self.hint
+        return song
+    
+    def to_m3u_entry(self) -> M3UEntry:
+        """Entrada de playlist con #EXTINF a partir de los metadatos ya leídos (o la pista original)"""
+        metadata = self._metadata
+        if metadata is not None:
+            return M3UEntry(self.file_path, self.destination, metadata.duration,
+                            metadata.artist if metadata.artist != UNKNOWN else None,
+                            metadata.title or self.file_name)
+        if self.hint:
+            return M3UEntry(self.file_path, self.destination, *self.hint)
+        return M3UEntry(self.file_path, self.destination)
+    
+    @classmethod
+    def from_m3u_entry(cls, entry: M3UEntry) -> 'Song':
+        song = cls(entry.file_path, entry.destination)
+        if entry.duration is not None or entry.title:
+            song.hint = SongHint(entry.duration or 0, intern_text(entry.artist), entry.title)
+        return song
     
     def size_formatted(self, base_1024: bool = True):
         return format_size(self.size, base_1024)
     
     @property
-    def metadata(self):
+    def has_metadata(self):
+        return self._metadata is not None
+    
+    def read_metadata(self) -> SongMetadata:
+        """Lee los metadatos (desde la caché si es posible) sin guardarlos; seguro desde hilos de trabajo"""
+        if self._metadata is not None:
+            return self._metadata
+        # Con el tamaño y la fecha ya conocidos la caché no necesita otro stat;
+        # 0 es un stat pendiente de revalidar (sesión o playlist cargada en diferido)
+        size, mtime_ns = (self._size, self._mtime_ns) if self._mtime_ns else (None, None)
+        return SongMetadata.from_dict(get_metadata_cache().get_metadata(self.file_path, size, mtime_ns))
+    
+    def set_metadata(self, metadata: Union[SongMetadata, Dict, None]):
+        if isinstance(metadata, dict):
+            metadata = SongMetadata.from_dict(metadata)
+        self._metadata = metadata
+    
+    def load_metadata(self):
+        """Lee y guarda los metadatos; desde hilos de trabajo usar read_metadata"""
         if self._metadata is None:
-            self._metadata = get_audio_metadata(self.file_path)
+            self._metadata = self.read_metadata()
         return self._metadata
     
+    @property
+    def metadata(self):
+        return self.load_metadata()
+    
     @property
     def title(self):
-        return self.metadata.get('title', self.file_name)
+        return self.metadata.title or self.file_name
     
     @property
     def artist(self):
-        return self.metadata.get('artist', 'Desconocido')
+        return self.metadata.artist
     
     @property
     def album(self):
-        return self.metadata.get('album', 'Desconocido')
+        return self.metadata.album
     
     @property
     def genre(self):
-        return self.metadata.get('genre', 'Desconocido')
+        return self.metadata.genre
     
     @property
     def bitrate(self):
-        return self.metadata.get('bitrate', 0)
+        return self.metadata.bitrate
     
     @property
     def duration(self):
-        return self.metadata.get('duration', 0)
+        return self.metadata.duration
     
     @property
     def duration_formatted(self):
         return format_duration(self.duration)
 
+# Eventos que Playlist envía a sus observadores (p.ej. el modelo del árbol)
+SONGS_ADDED = 'songs_added'
+SONGS_REMOVED = 'songs_removed'
+SONGS_MOVED = 'songs_moved'
+SONGS_UPDATED = 'songs_updated'
+DESTINATION_RENAMED = 'destination_renamed'
+PLAYLIST_RESET = 'playlist_reset'
+SONGS_RESTORED = 'songs_restored'  # Canciones devueltas a su posición anterior (deshacer)
+
+
+def _insert_at(items: list, entries: List[Tuple[int, object]]) -> list:
+    """
+    Inserta cada valor en su posición original (entries: pares (posición, valor)).
+    Una sola pasada con rebanadas, sin un list.insert por elemento.
+    """
+    entries.sort(key=lambda entry: entry[0])
+    result = []
+    start = 0
+    for position, value in entries:
+        take = position - len(result)
+        if take > 0:
+            result.extend(items[start:start + take])
+            start += take
+        result.append(value)
+    result.extend(items[start:])
+    return result
+
 class Playlist:
     def __init__(self):
         self.songs: List[Song] = []
         self.file_path: str = ""
+        self._listeners = []
+        self._next_id = itertools.count(1)
+        self._songs_by_id: Dict[int, Song] = {}
+        # Índice de grupos: destino -> ids de sus canciones (en orden de inserción)
+        self._groups: Dict[str, List[int]] = {}
+        # Totales mantenidos incrementalmente en cada alta, baja o movimiento
+        self._total_size = 0
+        self._destination_sizes: Dict[str, int] = {}
+        # Posibles duplicados (misma ruta, tamaño o artista y título), también incremental
+        self.duplicates = DuplicateIndex()
+        # Tamaño, duración y bitrate en columnas para totales y ordenación vectorizados
+        self.columns = SongColumns()
+        # Líneas que no se pudieron interpretar en la última carga (M3UParseError)
+        self.load_errors = []
+    
+    def add_listener(self, listener):
+        """Registra una función listener(evento, *datos) que se llama tras cada cambio"""
+        self._listeners.append(listener)
+    
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+    
+    def _notify(self, event, *args):
+        for listener in list(self._listeners):
+            listener(event, *args)
+    
+    def _index_song(self, song: Song):
+        song.song_id = next(self._next_id)
+        self._songs_by_id[song.song_id] = song
+        self._groups.setdefault(song.destination, []).append(song.song_id)
+        self._add_size(song.destination, song.size)
+        self.duplicates.add(song)
+        self.columns.add(song)
+    
+    def _add_size(self, destination: str, size: int):
+        self._total_size += size
+        remaining = self._destination_sizes.get(destination, 0) + size
+        if remaining or destination in self._groups:
+            self._destination_sizes[destination] = remaining
+        else:
+            self._destination_sizes.pop(destination, None)
+    
+    def _unindex_songs(self, songs: List[Song]):
+        """Quita las canciones del índice de grupos (usa su destino actual)"""
+        by_destination = {}
+        removed_sizes = {}
+        for song in songs:
+            self._songs_by_id.pop(song.song_id, None)
+            by_destination.setdefault(song.destination, set()).add(song.song_id)
+            removed_sizes[song.destination] = removed_sizes.get(song.destination, 0) + song.size
+        
+        for destination, song_ids in by_destination.items():
+            remaining = [song_id for song_id in self._groups.get(destination, [])
+                         if song_id not in song_ids]
+            if remaining:
+                self._groups[destination] = remaining
+            else:
+                self._groups.pop(destination, None)
+            self._add_size(destination, -removed_sizes[destination])
+    
+    def _forget_songs(self, songs: List[Song]):
+        """Bajas definitivas: además de los grupos, las quita del índice de duplicados y de las columnas"""
+        self._unindex_songs(songs)
+        for song in songs:
+            self.duplicates.remove(song)
+            self.columns.remove(song)
+    
+    def _restore_index(self, song: Song):
+        """Vuelve a indexar una canción que se quitó, con su mismo song_id (sin tocar los grupos)"""
+        self._songs_by_id[song.song_id] = song
+        self.duplicates.add(song)
+        self.columns.add(song)
+    
+    def _reset_index(self):
+        self._songs_by_id = {}
+        self._groups = {}
+        self._total_size = 0
+        self._destination_sizes = {}
+        self.duplicates.clear()
+        self.columns.clear()
+        for song in self.songs:
+            self._index_song(song)
+    
+    def get_song(self, song_id: int) -> Optional[Song]:
+        return self._songs_by_id.get(song_id)
+    
+    def get_songs(self, song_ids: List[int]) -> List[Song]:
+        """Canciones con esos ids, ignorando los que ya no existen"""
+        return [self._songs_by_id[song_id] for song_id in song_ids if song_id in self._songs_by_id]
+    
+    def get_group_song_ids(self, destination: str) -> List[int]:
+        return list(self._groups.get(destination, []))
+    
+    def get_duplicate_groups(self, groups) -> List[DuplicateGroup]:
+        """Convierte los grupos (motivo, ids) de find_duplicates, ignorando canciones ya quitadas"""
+        result = []
+        for reason, song_ids in groups:
+            songs = self.get_songs(song_ids)
+            if len(songs) > 1:
+                result.append(DuplicateGroup(reason, songs))
+        return result
     
     def add_song(self, song: Song):
-        self.songs.append(song)
+        self.add_songs([song])
     
     def add_songs(self, songs: List[Song]):
+        if not songs:
+            return
+        for song in songs:
+            self._index_song(song)
         self.songs.extend(songs)
+        self._notify(SONGS_ADDED, list(songs))
     
-    def remove_song(self, index: int):
-        if 0 <= index < len(self.songs):
-            self.songs.pop(index)
+    def locate_songs(self, songs: List[Song]) -> Tuple[List[int], List[int]]:
+        """
+        Posición de cada canción en self.songs y dentro de su grupo de destino, para
+        poder devolverlas a su sitio con restore_songs o restore_destinations.
+        """
+        wanted = {song.song_id for song in songs}
+        positions = {song.song_id: position for position, song in enumerate(self.songs)
+                     if song.song_id in wanted}
+        group_positions = {}
+        for destination in {song.destination for song in songs}:
+            for position, song_id in enumerate(self._groups.get(destination, [])):
+                if song_id in wanted:
+                    group_positions[song_id] = position
+        return ([positions[song.song_id] for song in songs],
+                [group_positions[song.song_id] for song in songs])
     
-    def remove_songs(self, indices: List[int]):
-        # Ordenar índices de mayor a menor para evitar problemas al eliminar
-        for index in sorted(indices, reverse=True):
-            if 0 <= index < len(self.songs):
-                self.songs.pop(index)
+    def restore_songs(self, songs: List[Song], positions: List[int], group_positions: List[int]):
+        """Deshace una baja: reinserta las canciones (con sus ids) donde estaban"""
+        if not songs:
+            return
+        self.songs = _insert_at(self.songs, list(zip(positions, songs)))
+        by_destination = {}
+        for song, group_position in zip(songs, group_positions):
+            self._restore_index(song)
+            by_destination.setdefault(song.destination, []).append((group_position, song.song_id))
+        for destination, entries in by_destination.items():
+            self._groups[destination] = _insert_at(self._groups.get(destination, []), entries)
+            self._add_size(destination, sum(self._songs_by_id[song_id].size for _, song_id in entries))
+        self._notify(SONGS_RESTORED, list(songs))
     
-    def remove_unselected_songs(self, selected_indices: List[int]):
-        all_indices = set(range(len(self.songs)))
-        selected_set = set(selected_indices)
-        unselected_indices = sorted(all_indices - selected_set, reverse=True)
-        
-        for index in unselected_indices:
-            self.songs.pop(index)
+    def restore_destinations(self, songs: List[Song], destinations: List[str], group_positions: List[int]):
+        """Deshace un cambio de destino: cada canción vuelve a su destino y posición anteriores"""
+        moves = [move for move in zip(songs, destinations, group_positions)
+                 if move[0].song_id in self._songs_by_id]
+        if not moves:
+            return
+        songs = [song for song, _, _ in moves]
+        self._unindex_songs(songs)
+        by_destination = {}
+        for song, destination, group_position in moves:
+            song.destination = destination
+            self._songs_by_id[song.song_id] = song
+            by_destination.setdefault(destination, []).append((group_position, song.song_id))
+        for destination, entries in by_destination.items():
+            self._groups[destination] = _insert_at(self._groups.get(destination, []), entries)
+            self._add_size(destination, sum(self._songs_by_id[song_id].size for _, song_id in entries))
+        self._notify(SONGS_RESTORED, songs)
+    
+    def remove_song(self, song_id: int) -> List[Song]:
+        return self.remove_songs([song_id])
+    
+    def retain(self, keep_mask: Sequence[bool]) -> List[Song]:
+        """
+        Bajas en bloque: conserva las canciones cuya posición en self.songs vale True
+        en keep_mask. La lista y los índices se reconstruyen en una sola pasada y se
+        envía un único aviso. Devuelve las canciones quitadas, en su orden.
+        """
+        if len(keep_mask) != len(self.songs):
+            raise ValueError("La máscara no corresponde a las canciones de la playlist")
+        kept, removed = [], []
+        for song, keep in zip(self.songs, keep_mask):
+            (kept if keep else removed).append(song)
+        if not removed:
+            return removed
+        self.songs = kept
+        self._forget_songs(removed)
+        self._notify(SONGS_REMOVED, removed)
+        return removed
+    
+    def remove_songs(self, song_ids: Iterable[int]) -> List[Song]:
+        """Elimina las canciones con los ids indicados; devuelve las quitadas"""
+        to_remove = song_ids if isinstance(song_ids, (set, frozenset)) else set(song_ids)
+        if not to_remove:
+            return []
+        return self.retain([song.song_id not in to_remove for song in self.songs])
+    
+    def remove_unselected_songs(self, selected_ids: Iterable[int]) -> List[Song]:
+        """Conserva solo las canciones con los ids indicados; devuelve las quitadas"""
+        keep = selected_ids if isinstance(selected_ids, (set, frozenset)) else set(selected_ids)
+        return self.retain([song.song_id in keep for song in self.songs])
+    
+    def clear(self):
+        self.songs.clear()
+        self._reset_index()
+        self._notify(PLAYLIST_RESET)
+    
+    def notify_songs_updated(self, songs: List[Song]):
+        """Avisa de que cambiaron los datos (p.ej. metadatos) de estas canciones"""
+        if songs:
+            for song in songs:
+                self.duplicates.update(song)
+                self.columns.update(song)
+            self._notify(SONGS_UPDATED, list(songs))
     
     def get_songs_by_destination(self) -> Dict[str, List[Song]]:
         result = {}
-        for song in self.songs:
-            dest = song.destination if song.destination else "/"
+        for destination, song_ids in self._groups.items():
+            dest = destination if destination else "/"
             if dest not in result:
                 result[dest] = []
-            result[dest].append(song)
+            result[dest].extend(self._songs_by_id[song_id] for song_id in song_ids)
         return result
     
     def get_all_destinations(self) -> Set[str]:
-        return set(song.destination for song in self.songs)
+        return set(self._groups)
     
-    def update_destination(self, indices: List[int], new_destination: str):
-        for index in indices:
-            if 0 <= index < len(self.songs):
-                self.songs[index].destination = new_destination
+    def _move_songs(self, songs: List[Song], new_destination: str):
+        self._unindex_songs(songs)
+        target = self._groups.setdefault(new_destination, [])
+        for song in songs:
+            song.destination = new_destination
+            self._songs_by_id[song.song_id] = song
+            target.append(song.song_id)
+        self._add_size(new_destination, sum(song.size for song in songs))
+    
+    def _rename_group(self, old_destination: str, new_destination: str, songs: List[Song]):
+        """Cambia la clave del grupo sin moverlo: conserva su posición en la playlist guardada"""
+        self._groups = {new_destination if destination == old_destination else destination: song_ids
+                        for destination, song_ids in self._groups.items()}
+        self._destination_sizes[new_destination] = self._destination_sizes.pop(old_destination, 0)
+        for song in songs:
+            song.destination = new_destination
+    
+    def update_destination(self, song_ids: List[int], new_destination: str):
+        moved = [song for song in self.get_songs(song_ids) if song.destination != new_destination]
+        if moved:
+            self._move_songs(moved, new_destination)
+            self._notify(SONGS_MOVED, moved)
     
     def rename_destination(self, old_destination: str, new_destination: str):
-        for song in self.songs:
-            if song.destination == old_destination:
-                song.destination = new_destination
+        renamed = self.get_songs(self._groups.get(old_destination, []))
+        if renamed and old_destination != new_destination:
+            if new_destination in self._groups:
+                self._move_songs(renamed, new_destination)
+            else:
+                self._rename_group(old_destination, new_destination, renamed)
+            self._notify(DESTINATION_RENAMED, old_destination, new_destination, renamed)
     
-    def remove_destination(self, destination: str):
+    def remove_destination(self, destination: str) -> List[Song]:
         # Eliminar todas las canciones con este destino
-        self.songs = [song for song in self.songs if song.destination != destination]
+        return self.remove_songs(self._groups.get(destination, []))
     
     @property
     def total_size(self):
-        return sum(song.size for song in self.songs)
+        return self._total_size
+    
+    @property
+    def total_duration(self) -> int:
+        """Duración total en segundos de lo ya leído (metadatos o #EXTINF)"""
+        return self.columns.total(DURATION)
+    
+    def get_destination_size(self, destination: str) -> int:
+        """Tamaño total de un destino (con el mismo criterio que get_songs_by_destination)"""
+        if destination == "/":
+            return self._destination_sizes.get("", 0) + self._destination_sizes.get("/", 0)
+        return self._destination_sizes.get(destination, 0)
+    
+    def get_destination_sizes(self) -> Dict[str, int]:
+        return dict(self._destination_sizes)
+    
+    def apply_revalidation(self, results: List) -> List[Song]:
+        """
+        Aplica los stat obtenidos en segundo plano: pares (canción, stat o None si el
+        archivo ya no existe). Las canciones cambiadas pierden sus metadatos para que
+        se vuelvan a leer; devuelve esas canciones.
+        """
+        changed = []
+        for song, stat_result in results:
+            if song.song_id not in self._songs_by_id:
+                continue  # Se quitó de la playlist mientras se revalidaba
+            size, mtime_ns = (stat_result.st_size, stat_result.st_mtime_ns) if stat_result else (0, 0)
+            if (size, mtime_ns) == (song.size, song.mtime_ns):
+                continue
+            self._add_size(song.destination, size - song.size)
+            # Sin fecha anterior (carga con defer_stat) los metadatos ya se leyeron del archivo actual
+            if song.mtime_ns:
+                song.set_metadata(None)
+            song.set_cached_stat(size, mtime_ns)
+            changed.append(song)
+        self.notify_songs_updated(changed)
+        return changed
     
     def total_size_mb(self, base_1024: bool = True):
         from utils.utils import bytes_to_mb
@@ -123,47 +489,84 @@ class Playlist:
         return format_size(self.total_size, base_1024)
     
     def load_from_m3u(self, file_path: str):
+        """Carga la playlist completa de una vez (ver iter_load_m3u para carga progresiva)"""
         self.file_path = file_path
         self.songs.clear()
+        self._reset_index()
+        self.load_errors = []
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                lines = file.readlines()
-            
-            i = 0
-            current_destination = ""
-            while i < len(lines):
-                line = lines[i].strip()
-                
-                if line.startswith("#DESTINO:"):
-                    current_destination = line[9:].strip()
-                elif not line.startswith("#") and line and not line.isspace():
-                    # Es una ruta de archivo
-                    song = Song(file_path=line, destination=current_destination)
+            for chunk in iter_m3u(file_path, errors=self.load_errors):
+                for entry in chunk:
+                    song = Song.from_m3u_entry(entry)
+                    self._index_song(song)
                     self.songs.append(song)
-                
-                i += 1
-                
-        except Exception as e:
-            print(f"Error loading playlist: {e}")
+        finally:
+            self._notify(PLAYLIST_RESET)
+    
+    def iter_load_m3u(self, file_path: str, chunk_size: int = M3U_CHUNK_SIZE, defer_stat: bool = False):
+        """
+        Carga la playlist por bloques. Es un generador: el primer paso vacía la playlist
+        y cada paso añade el siguiente bloque de canciones (notificando SONGS_ADDED)
+        y lo devuelve. Cerrar el generador detiene la carga. Las líneas mal formadas
+        quedan en load_errors. Con defer_stat no se hace stat de los archivos: las
+        canciones entran con tamaño 0 y se corrigen después con apply_revalidation.
+        """
+        self.file_path = file_path
+        self.songs.clear()
+        self._reset_index()
+        self.load_errors = []
+        self._notify(PLAYLIST_RESET)
+        
+        for chunk in iter_m3u(file_path, chunk_size, self.load_errors):
+            songs = [Song.from_m3u_entry(entry) for entry in chunk]
+            if defer_stat:
+                for song in songs:
+                    song.set_cached_stat(0, 0)
+            self.add_songs(songs)
+            yield songs
+    
+    def save_session(self, file_path: str):
+        """Guarda la playlist con tamaños y metadatos en el formato binario de sesión"""
+        # En el orden de la playlist, que es el de la vista sin ordenar y el de la copia
+        session.save_session(file_path, self.songs)
+        self.file_path = file_path
+    
+    def load_session(self, file_path: str):
+        """Restaura una sesión sin leer tags ni hacer stat; revalidar después con apply_revalidation"""
+        entries = session.load_session(file_path)
+        self.file_path = file_path
+        self.songs.clear()
+        self._reset_index()
+        self.load_errors = []
+        for path, destination, size, mtime_ns, metadata in entries:
+            song = Song(path, destination)
+            song.set_cached_stat(size, mtime_ns)
+            if metadata is not None:
+                song.set_metadata(metadata)
+            self._index_song(song)
+            self.songs.append(song)
+        self._notify(PLAYLIST_RESET)
     
-    def save_to_m3u(self, file_path: str = None):
+    def save_to_m3u(self, file_path: str = None, relative: bool = False):
+        """
+        Guarda la playlist con #EXTINF de los metadatos ya leídos. Los grupos se
+        escriben en el orden del índice, con la raíz primero; 'relative' guarda
+        las rutas relativas a la carpeta de la playlist.
+        """
         if file_path:
             self.file_path = file_path
         
+        root_ids = self._groups.get("", []) + self._groups.get("/", [])
+        groups = [("", root_ids)] + [(destination, song_ids) for destination, song_ids in self._groups.items()
+                                     if destination and destination != "/"]
+        
+        def entries(song_ids):
+            return (self._songs_by_id[song_id].to_m3u_entry() for song_id in song_ids)
+        
         try:
-            with open(self.file_path, 'w', encoding='utf-8') as file:
-                file.write("#EXTM3U\n")
-                
-                songs_by_dest = self.get_songs_by_destination()
-                
-                for destination, songs in songs_by_dest.items():
-                    if destination and destination != "/":
-                        file.write(f"#DESTINO:{destination}\n")
-                    
-                    for song in songs:
-                        file.write(f"{song.file_path}\n")
-                        
+            write_m3u(self.file_path, ((destination, entries(song_ids)) for destination, song_ids in groups),
+                      relative)
         except Exception as e:
             print(f"Error saving playlist: {e}")
             raise
\ No newline at end of file
@@ -0,0 +1,147 @@
+import os
+from bisect import bisect_left, insort
+from typing import List, Set
+from model.model import Playlist, Song
+from utils.copy_plan import size_on_disk, DEFAULT_CLUSTER_SIZE
+
+# Parte de la capacidad nominal que ocupan las tablas FAT y sectores reservados
+FILESYSTEM_RESERVE = 0.03
+
+
+class StickPlan:
+    """Canciones asignadas a una memoria USB"""
+
+    def __init__(self, index: int, capacity: int):
+        self.index = index
+        self.capacity = capacity
+        self.songs: List[Song] = []
+        self.used_bytes = 0
+        self.destinations: Set[str] = set()
+
+    @property
+    def free_bytes(self) -> int:
+        return self.capacity - self.used_bytes
+
+    def to_playlist(self) -> Playlist:
+        """Playlist independiente con las canciones de esta memoria"""
+        playlist = Playlist()
+        playlist.add_songs([song.copy() for song in self.songs])
+        return playlist
+
+
+class PackingResult:
+    def __init__(self, sticks: List[StickPlan], unassigned: List[Song], split_destinations: Set[str]):
+        self.sticks = sticks
+        self.unassigned = unassigned  # Canciones que no caben en ninguna memoria
+        self.split_destinations = split_destinations  # Carpetas repartidas entre varias memorias
+
+    @property
+    def used_sticks(self) -> List[StickPlan]:
+        return [stick for stick in self.sticks if stick.songs]
+
+    def export_m3u(self, folder: str, base_name: str) -> List[str]:
+        """Guarda una playlist .m3u por memoria usada; devuelve las rutas creadas"""
+        paths = []
+        for stick in self.used_sticks:
+            path = os.path.join(folder, f"{base_name}_usb{stick.index + 1}.m3u")
+            stick.to_playlist().save_to_m3u(path)
+            paths.append(path)
+        return paths
+
+
+class _BestFit:
+    """Memorias ordenadas por espacio libre para encontrar la más justa en O(log n)"""
+
+    def __init__(self, sticks: List[StickPlan]):
+        self._entries = sorted((stick.free_bytes, stick.index) for stick in sticks)
+        self._sticks = sticks
+
+    def find(self, size: int):
+        """Memoria con menos espacio libre en la que aún cabe 'size' (o None)"""
+        pos = bisect_left(self._entries, (size, -1))
+        if pos == len(self._entries):
+            return None
+        return self._sticks[self._entries[pos][1]]
+
+    def charge(self, stick: StickPlan, size: int):
+        self._entries.remove((stick.free_bytes, stick.index))
+        stick.used_bytes += size
+        insort(self._entries, (stick.free_bytes, stick.index))
+
+
+def pack_playlist(playlist: Playlist, capacities: List[int],
+                  cluster_size: int = DEFAULT_CLUSTER_SIZE,
+                  reserve: float = FILESYSTEM_RESERVE) -> PackingResult:
+    """
+    Reparte la playlist entre varias memorias (best-fit decreasing). Cada carpeta
+    destino se asigna entera a la memoria más justa donde quepa; solo si no cabe
+    en ninguna se reparten sus canciones una a una. El tamaño de cada canción se
+    redondea a clústeres y cada carpeta cuenta un clúster para sus entradas.
+    """
+    sticks = [StickPlan(i, int(capacity * (1 - reserve))) for i, capacity in enumerate(capacities)]
+    best_fit = _BestFit(sticks)
+    unassigned: List[Song] = []
+
+    folders = []
+    for destination, songs in playlist.get_songs_by_destination().items():
+        folder_cost = 0 if destination == "/" else cluster_size
+        cost = folder_cost + sum(size_on_disk(song.size, cluster_size) for song in songs)
+        folders.append((cost, destination, songs))
+    folders.sort(key=lambda folder: folder[0], reverse=True)
+
+    loose: List[Song] = []
+    for cost, destination, songs in folders:
+        stick = best_fit.find(cost)
+        if stick is None:
+            loose.extend(songs)
+            continue
+        best_fit.charge(stick, cost)
+        stick.songs.extend(songs)
+        stick.destinations.add(destination)
+
+    # Carpetas que no caben enteras: canción a canción, de mayor a menor
+    loose.sort(key=lambda song: song.size, reverse=True)
+    for song in loose:
+        destination = song.destination or "/"
+        folder_cost = 0 if destination == "/" else cluster_size
+        size = size_on_disk(song.size, cluster_size)
+        stick = best_fit.find(size + folder_cost)
+        if stick is None:
+            unassigned.append(song)
+            continue
+        if destination in stick.destinations:
+            folder_cost = 0
+        best_fit.charge(stick, size + folder_cost)
+        stick.songs.append(song)
+        stick.destinations.add(destination)
+
+    # Carpetas que terminaron en más de una memoria
+    seen: Set[str] = set()
+    split: Set[str] = set()
+    for stick in sticks:
+        split.update(seen & stick.destinations)
+        seen.update(stick.destinations)
+    return PackingResult(sticks, unassigned, split)
+
+
+def parse_capacities(text: str, unit: int = 1000 ** 3) -> List[int]:
+    """
+    Interpreta una lista de capacidades en GB: "16, 16, 32" o "4x16".
+    Lanza ValueError si el texto no es válido.
+    """
+    capacities = []
+    for part in text.replace(';', ',').split(','):
+        part = part.strip().lower()
+        if not part:
+            continue
+        count = 1
+        if 'x' in part:
+            count_text, part = part.split('x', 1)
+            count = int(count_text)
+        size = float(part.replace('gb', '').strip())
+        if count <= 0 or size <= 0:
+            raise ValueError(f"Capacidad no válida: {part}")
+        capacities.extend([int(size * unit)] * count)
+    if not capacities:
+        raise ValueError("No se indicó ninguna capacidad")
+    return capacities
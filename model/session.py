@@ -0,0 +1,105 @@
+import struct
+from typing import List, Tuple, Dict, Optional
+from model.metadata import SongMetadata
+from utils.utils import atomic_write
+
+SESSION_EXTENSION = ".musicusb"
+SESSION_MAGIC = b"MUSB"
+SESSION_VERSION = 1
+
+# Cabecera: firma, versión, nº de canciones, nº de cadenas, bytes de la tabla de cadenas
+HEADER = struct.Struct('<4sHIIQ')
+# Registro fijo por canción: índices de cadenas (ruta, destino, título, artista, álbum,
+# género), tamaño, mtime, bitrate, duración y si hay metadatos
+RECORD = struct.Struct('<IIIIIIQqIIB')
+NO_STRING = 0xFFFFFFFF
+
+
+class SessionFormatError(ValueError):
+    """El archivo no es una sesión válida o es de una versión no soportada"""
+
+
+class _StringTable:
+    """Cadenas sin repetir (destinos, artistas, álbumes...) referenciadas por índice"""
+
+    def __init__(self):
+        self.strings: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def add(self, value: Optional[str]) -> int:
+        if value is None:
+            return NO_STRING
+        index = self._index.get(value)
+        if index is None:
+            index = self._index[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+
+def save_session(file_path: str, songs) -> None:
+    """
+    Guarda canciones, destinos, tamaños, fechas y metadatos ya leídos en un archivo
+    binario compacto que se puede reabrir sin leer tags ni hacer stat de cada archivo.
+    La escritura es atómica (archivo temporal y renombrado).
+    """
+    table = _StringTable()
+    records = bytearray()
+    count = 0
+    for song in songs:
+        metadata = song.metadata if song.has_metadata else None
+        if metadata is not None:
+            text = [table.add(metadata.title), table.add(metadata.artist),
+                    table.add(metadata.album), table.add(metadata.genre)]
+            bitrate, duration, has_metadata = metadata.bitrate, metadata.duration, 1
+        else:
+            text, bitrate, duration, has_metadata = [NO_STRING] * 4, 0, 0, 0
+        records += RECORD.pack(table.add(song.file_path), table.add(song.destination), *text,
+                               song.size, song.mtime_ns, bitrate, duration, has_metadata)
+        count += 1
+
+    # '\0' no puede aparecer en rutas ni en tags, así que sirve de separador
+    blob = "\0".join(value.replace("\0", "") for value in table.strings).encode('utf-8', 'surrogatepass')
+
+    def write(f):
+        f.write(HEADER.pack(SESSION_MAGIC, SESSION_VERSION, count, len(table.strings), len(blob)))
+        f.write(blob)
+        f.write(records)
+
+    atomic_write(file_path, write, binary=True)
+
+
+def load_session(file_path: str) -> List[Tuple]:
+    """
+    Lee una sesión y devuelve tuplas (ruta, destino, tamaño, mtime_ns, SongMetadata o None).
+    Los textos repetidos (destinos, artistas...) son el mismo objeto en todas las canciones.
+    """
+    with open(file_path, 'rb') as f:
+        data = f.read()
+
+    if len(data) < HEADER.size:
+        raise SessionFormatError("Archivo de sesión truncado")
+    magic, version, count, string_count, blob_size = HEADER.unpack_from(data)
+    if magic != SESSION_MAGIC:
+        raise SessionFormatError("No es un archivo de sesión de MusicUSB")
+    if version != SESSION_VERSION:
+        raise SessionFormatError(f"Versión de sesión no soportada: {version}")
+
+    blob_start = HEADER.size
+    records_start = blob_start + blob_size
+    if len(data) != records_start + count * RECORD.size:
+        raise SessionFormatError("Archivo de sesión truncado")
+
+    strings = data[blob_start:records_start].decode('utf-8', 'surrogatepass').split("\0") if string_count else []
+    if len(strings) != string_count:
+        raise SessionFormatError("Tabla de cadenas dañada")
+
+    entries = []
+    view = memoryview(data)[records_start:]
+    for (path, destination, title, artist, album, genre,
+         size, mtime_ns, bitrate, duration, has_metadata) in RECORD.iter_unpack(view):
+        metadata = None
+        if has_metadata:
+            metadata = SongMetadata(strings[title], strings[artist], strings[album], strings[genre],
+                                    bitrate, duration)
+        entries.append((strings[path], strings[destination], size, mtime_ns, metadata))
+    return entries
@@ -0,0 +1,66 @@
+"""
+Copia completa a través del controlador: debe terminar con el mensaje de éxito
+y guardar la velocidad medida. Uso: python -m unittest discover tests
+"""
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+from controller.controller import PlaylistController
+from model.model import Song
+
+CONFIG = {'album': '', 'genre': '', 'comment': '', 'cover_path': ''}
+
+
+class CopyToUsbTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.source = os.path.join(self.folder, "origen")
+        self.usb = os.path.join(self.folder, "usb")
+        os.makedirs(self.source)
+        os.makedirs(self.usb)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_copy_runs_to_completion(self):
+        songs = []
+        for i, size in enumerate((9, 9)):
+            path = os.path.join(self.source, f"pista{i}.mp3")
+            with open(path, 'wb') as f:
+                f.write(os.urandom(size * 1024 * 1024))
+            songs.append(Song(path, "album"))
+
+        controller = PlaylistController()
+        controller.metadata_loader.enqueue = lambda songs: None
+        messages = []
+        controller.view.show_message = lambda title, text, error=False: messages.append((title, text, error))
+        controller.model.add_songs(songs)
+
+        controller.copy_to_usb(self.usb, CONFIG)
+        deadline = time.monotonic() + 30
+        while not messages and time.monotonic() < deadline:
+            self.app.processEvents()
+            time.sleep(0.01)
+
+        self.assertEqual(len(messages), 1)
+        title, text, error = messages[0]
+        self.assertEqual(title, "Éxito")
+        self.assertFalse(error)
+        self.assertIsNone(controller.copy_thread)
+        self.assertTrue(controller.last_copy_speed)
+        copied = [name for _, _, names in os.walk(self.usb) for name in names]
+        self.assertEqual(sorted(copied), ["pista0.mp3", "pista1.mp3"])
+
+
+if __name__ == '__main__':
+    unittest.main()
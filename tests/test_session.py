@@ -0,0 +1,46 @@
+"""
+Guardar y restaurar una sesión conserva el orden de la playlist.
+Uso: python -m unittest discover tests
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from model.model import Playlist, Song
+from model.session import SESSION_EXTENSION
+
+
+class SessionRoundTripTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_order_survives_round_trip(self):
+        # Destinos intercalados: agrupar por destino al guardar cambiaría el orden
+        songs = []
+        for i, destination in enumerate(["a", "b", "a", "", "c", "b", "a"]):
+            song = Song(os.path.join(self.folder, f"pista{i}.mp3"), destination)
+            song.set_cached_stat(1000 + i, 10 + i)
+            if i % 2:
+                song.set_metadata({'title': f"Pista {i}", 'artist': "Artista", 'duration': 60 + i})
+            songs.append(song)
+        playlist = Playlist()
+        playlist.add_songs(songs)
+
+        path = os.path.join(self.folder, "sesion" + SESSION_EXTENSION)
+        playlist.save_session(path)
+        restored = Playlist()
+        restored.load_session(path)
+
+        self.assertEqual([(song.file_path, song.destination, song.size, song.mtime_ns) for song in restored.songs],
+                         [(song.file_path, song.destination, song.size, song.mtime_ns) for song in songs])
+        self.assertEqual([song.has_metadata for song in restored.songs], [song.has_metadata for song in songs])
+        self.assertEqual(restored.total_size, playlist.total_size)
+        self.assertEqual(restored.get_destination_sizes(), playlist.get_destination_sizes())
+
+
+if __name__ == '__main__':
+    unittest.main()
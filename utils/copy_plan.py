@@ -0,0 +1,263 @@
+import os
+import sys
+import shutil
+from typing import List, Tuple, Optional
+
+# Órdenes de escritura disponibles
+ORDER_FOLDER = 'folder'            # Carpeta por carpeta, archivos por nombre
+ORDER_LARGEST_FIRST = 'largest'    # Los más grandes primero
+ORDER_PLAYLIST = 'playlist'        # Tal como están en la playlist
+COPY_ORDERS = (ORDER_FOLDER, ORDER_LARGEST_FIRST, ORDER_PLAYLIST)
+
+# Archivos por debajo de este tamaño se pueden agrupar en un solo trabajo
+SMALL_FILE_SIZE = 512 * 1024
+BATCH_MAX_BYTES = 8 * 1024 * 1024
+BATCH_MAX_FILES = 32
+
+# Estimación cuando todavía no se ha medido la velocidad real de la memoria
+DEFAULT_WRITE_SPEED = 10 * 1024 * 1024
+# Coste fijo por archivo en FAT: entrada de directorio, tabla FAT y cierre
+PER_FILE_OVERHEAD = 0.03
+
+# FAT32 no admite archivos de 4 GB o más
+FAT32_MAX_FILE_SIZE = 4 * 1024 ** 3 - 1
+FAT32_NAMES = ('vfat', 'msdos', 'fat', 'fat32')
+# Si no se puede averiguar el tamaño de clúster, suponer el de una memoria exFAT grande
+DEFAULT_CLUSTER_SIZE = 128 * 1024
+
+
+class CopyPlan:
+    """
+    Orden en que se escribirán los archivos en la USB, agrupados en lotes.
+    Cada lote es una lista de (song, ruta_destino) que copia un mismo flujo.
+    """
+
+    def __init__(self, batches: List[List[Tuple]], order: str):
+        self.batches = batches
+        self.order = order
+
+    @property
+    def jobs(self) -> List[Tuple]:
+        return [job for batch in self.batches for job in batch]
+
+    @property
+    def file_count(self) -> int:
+        return sum(len(batch) for batch in self.batches)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(song.size for batch in self.batches for song, _ in batch)
+
+    @property
+    def directories(self) -> List[str]:
+        """Carpetas destino ordenadas (los padres antes que los hijos)"""
+        return sorted(set(os.path.dirname(dest_path) for batch in self.batches for _, dest_path in batch))
+
+    def estimate_seconds(self, bytes_per_second: Optional[float] = None) -> float:
+        speed = bytes_per_second if bytes_per_second and bytes_per_second > 0 else DEFAULT_WRITE_SPEED
+        return self.total_bytes / speed + self.file_count * PER_FILE_OVERHEAD
+
+
+def _folder_key(job):
+    song, dest_path = job
+    directory, name = os.path.split(dest_path)
+    return directory, name.lower()
+
+
+def order_jobs(jobs: List[Tuple], order: str = ORDER_FOLDER) -> List[Tuple]:
+    """
+    Ordena los trabajos de copia. Por carpeta, las entradas de cada directorio
+    se crean seguidas y la memoria agrupa mejor las escrituras; los más grandes
+    primero equilibran los flujos en paralelo y dejan los archivos cortos al final.
+    """
+    if order == ORDER_FOLDER:
+        return sorted(jobs, key=_folder_key)
+    if order == ORDER_LARGEST_FIRST:
+        return sorted(jobs, key=lambda job: (-job[0].size, _folder_key(job)))
+    return list(jobs)
+
+
+def batch_jobs(jobs: List[Tuple], batch_small_files: bool = False) -> List[List[Tuple]]:
+    """Agrupa archivos pequeños consecutivos de la misma carpeta en un solo lote"""
+    if not batch_small_files:
+        return [[job] for job in jobs]
+
+    batches = []
+    current = []
+    current_bytes = 0
+    current_dir = None
+    for job in jobs:
+        song, dest_path = job
+        directory = os.path.dirname(dest_path)
+        if song.size >= SMALL_FILE_SIZE:
+            if current:
+                batches.append(current)
+                current, current_bytes = [], 0
+            batches.append([job])
+            continue
+        if current and (directory != current_dir
+                        or current_bytes + song.size > BATCH_MAX_BYTES
+                        or len(current) >= BATCH_MAX_FILES):
+            batches.append(current)
+            current, current_bytes = [], 0
+        current.append(job)
+        current_bytes += song.size
+        current_dir = directory
+    if current:
+        batches.append(current)
+    return batches
+
+
+def plan_copy(jobs: List[Tuple], order: str = ORDER_FOLDER, batch_small_files: bool = False) -> CopyPlan:
+    """Planifica la copia: orden de escritura y lotes de archivos pequeños"""
+    if order not in COPY_ORDERS:
+        order = ORDER_FOLDER
+    return CopyPlan(batch_jobs(order_jobs(jobs, order), batch_small_files), order)
+
+
+def _linux_filesystem(path: str) -> str:
+    """Tipo de sistema de archivos según /proc/mounts (el punto de montaje más largo que contiene path)"""
+    path = os.path.realpath(path)
+    best, fs_type = "", ""
+    try:
+        with open('/proc/mounts', 'r', encoding='utf-8') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount_point = fields[1].replace('\\040', ' ')
+                if (path == mount_point or path.startswith(mount_point.rstrip('/') + '/')) \
+                        and len(mount_point) > len(best):
+                    best, fs_type = mount_point, fields[2]
+    except OSError:
+        pass
+    return fs_type
+
+
+def _windows_volume_info(path: str) -> Tuple[str, int]:
+    import ctypes
+    root = os.path.splitdrive(os.path.abspath(path))[0] + "\\"
+    fs_name = ctypes.create_unicode_buffer(64)
+    if not ctypes.windll.kernel32.GetVolumeInformationW(root, None, 0, None, None, None, fs_name, len(fs_name)):
+        return "", 0
+    sectors_per_cluster = ctypes.c_ulong()
+    bytes_per_sector = ctypes.c_ulong()
+    free_clusters = ctypes.c_ulong()
+    total_clusters = ctypes.c_ulong()
+    if not ctypes.windll.kernel32.GetDiskFreeSpaceW(root, ctypes.byref(sectors_per_cluster),
+                                                     ctypes.byref(bytes_per_sector),
+                                                     ctypes.byref(free_clusters),
+                                                     ctypes.byref(total_clusters)):
+        return fs_name.value, 0
+    return fs_name.value, sectors_per_cluster.value * bytes_per_sector.value
+
+
+def detect_filesystem(path: str) -> Tuple[str, int]:
+    """Devuelve (tipo de sistema de archivos en minúsculas, tamaño de clúster en bytes)"""
+    fs_type, cluster_size = "", 0
+    try:
+        if sys.platform == 'win32':
+            fs_type, cluster_size = _windows_volume_info(path)
+        else:
+            if sys.platform.startswith('linux'):
+                fs_type = _linux_filesystem(path)
+            st = os.statvfs(path)
+            cluster_size = st.f_frsize or st.f_bsize
+    except (OSError, AttributeError, ValueError) as e:
+        print(f"Error detecting filesystem for {path}: {e}")
+    return fs_type.lower(), cluster_size or DEFAULT_CLUSTER_SIZE
+
+
+def size_on_disk(size: int, cluster_size: int) -> int:
+    """Espacio real que ocupa un archivo: clústeres completos"""
+    if size <= 0:
+        return 0
+    return -(-size // cluster_size) * cluster_size
+
+
+class CapacityReport:
+    """Resultado de comprobar un plan de copia contra el espacio real de la USB"""
+
+    def __init__(self, filesystem: str, cluster_size: int, free_bytes: int,
+                 required_bytes: int, oversized: List[Tuple]):
+        self.filesystem = filesystem
+        self.cluster_size = cluster_size
+        self.free_bytes = free_bytes
+        self.required_bytes = required_bytes
+        self.oversized = oversized  # Trabajos que superan el límite de FAT32
+
+    @property
+    def is_fat32(self) -> bool:
+        return self.filesystem in FAT32_NAMES
+
+    @property
+    def shortfall(self) -> int:
+        return max(0, self.required_bytes - self.free_bytes)
+
+    @property
+    def fits(self) -> bool:
+        return not self.oversized and self.shortfall == 0
+
+
+def _reclaimed_bytes(dest_path: str, cluster_size: int) -> int:
+    """Espacio que se libera al sobrescribir un archivo que ya está en la USB"""
+    try:
+        return size_on_disk(os.path.getsize(dest_path), cluster_size)
+    except OSError:
+        return 0
+
+
+def _required_bytes(jobs: List[Tuple], cluster_size: int) -> int:
+    required = 0
+    for song, dest_path in jobs:
+        required += size_on_disk(song.size, cluster_size) - _reclaimed_bytes(dest_path, cluster_size)
+    # Cada carpeta nueva ocupa al menos un clúster para sus entradas
+    new_directories = set(os.path.dirname(dest_path) for _, dest_path in jobs)
+    required += sum(cluster_size for directory in new_directories if not os.path.isdir(directory))
+    return required
+
+
+def check_capacity(plan: CopyPlan, usb_path: str) -> CapacityReport:
+    """
+    Estima el espacio que ocupará el plan en la USB (redondeando cada archivo a
+    clústeres) y lo compara con el espacio libre real, antes de escribir nada.
+    """
+    filesystem, cluster_size = detect_filesystem(usb_path)
+    free_bytes = shutil.disk_usage(usb_path).free
+    jobs = plan.jobs
+    oversized = []
+    if filesystem in FAT32_NAMES:
+        oversized = [job for job in jobs if job[0].size > FAT32_MAX_FILE_SIZE]
+    return CapacityReport(filesystem, cluster_size, free_bytes,
+                          _required_bytes(jobs, cluster_size), oversized)
+
+
+def trim_plan(plan: CopyPlan, report: CapacityReport) -> Tuple[CopyPlan, List[Tuple]]:
+    """
+    Quita del plan los archivos que FAT32 no admite y, respetando el orden, los
+    que ya no caben en el espacio libre. Devuelve (plan recortado, trabajos omitidos).
+    """
+    oversized = set(id(job[0]) for job in report.oversized)
+    cluster_size = report.cluster_size
+    available = report.free_bytes
+    known_directories = set()
+    batches, skipped = [], []
+    for batch in plan.batches:
+        kept = []
+        for song, dest_path in batch:
+            if id(song) in oversized:
+                skipped.append((song, dest_path))
+                continue
+            needed = size_on_disk(song.size, cluster_size) - _reclaimed_bytes(dest_path, cluster_size)
+            directory = os.path.dirname(dest_path)
+            if directory not in known_directories and not os.path.isdir(directory):
+                needed += cluster_size
+            if needed > available:
+                skipped.append((song, dest_path))
+                continue
+            available -= needed
+            known_directories.add(directory)
+            kept.append((song, dest_path))
+        if kept:
+            batches.append(kept)
+    return CopyPlan(batches, plan.order), skipped
@@ -0,0 +1,193 @@
+import os
+import json
+import atexit
+import sqlite3
+import threading
+from typing import Dict, Any, Optional
+from utils.utils import get_audio_metadata, read_audio_metadata, get_config_dir
+
+CACHE_FILE_NAME = "metadata_cache.sqlite"
+DEFAULT_MAX_ENTRIES = 200000
+# Número de escrituras pendientes antes de hacer commit a disco
+COMMIT_EVERY = 500
+
+
+class MetadataCache:
+    """
+    Caché persistente de metadatos de audio.
+    Cada entrada se identifica por (ruta absoluta, tamaño, mtime_ns), de modo que
+    un archivo modificado se vuelve a leer con mutagen automáticamente.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_entries: int = DEFAULT_MAX_ENTRIES):
+        if db_path is None:
+            db_path = os.path.join(get_config_dir(), CACHE_FILE_NAME)
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending_writes = 0
+        # Contador lógico para el LRU (más barato que pedir la hora en cada acceso)
+        self._clock = 0
+        self._touched: Dict[str, int] = {}
+
+        try:
+            self._conn = self._connect(db_path)
+        except sqlite3.Error as e:
+            # Si no se puede abrir el archivo (p.ej. carpeta de solo lectura) usar memoria
+            print(f"Error opening metadata cache {db_path}: {e}")
+            self.db_path = ":memory:"
+            self._conn = self._connect(self.db_path)
+
+        row = self._conn.execute("SELECT COUNT(*), COALESCE(MAX(last_access), 0) FROM metadata").fetchone()
+        self._entries, self._clock = row[0], row[1]
+
+    def _connect(self, db_path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS metadata ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " data TEXT NOT NULL,"
+            " last_access INTEGER NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_metadata_last_access ON metadata(last_access)")
+        conn.commit()
+        return conn
+
+    def get_metadata(self, file_path: str, size: Optional[int] = None,
+                     mtime_ns: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Devuelve los metadatos del archivo, leyendo con mutagen solo si no están en caché.
+        Si ya se conocen tamaño y mtime_ns se usan como clave; si no, se hace un stat.
+        """
+        path = os.path.abspath(file_path)
+        if size is None or mtime_ns is None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                # Sin stat no hay clave fiable: leer directamente sin cachear
+                return get_audio_metadata(file_path)
+            size, mtime_ns = st.st_size, st.st_mtime_ns
+
+        metadata = self.lookup(path, size, mtime_ns)
+        if metadata is not None:
+            return metadata
+
+        metadata, complete = read_audio_metadata(file_path)
+        # Si la lectura falló (p.ej. error pasajero en una memoria extraíble) no se guarda
+        # el título de reserva: se vuelve a intentar la próxima vez
+        if complete:
+            self.store(path, size, mtime_ns, metadata)
+        return metadata
+
+    def lookup(self, path: str, size: int, mtime_ns: int) -> Optional[Dict[str, Any]]:
+        """Busca una entrada válida; devuelve None si no existe o si el archivo cambió"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, data FROM metadata WHERE path = ?", (path,)
+            ).fetchone()
+            if row is None or row[0] != size or row[1] != mtime_ns:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._clock += 1
+            self._touched[path] = self._clock
+        return json.loads(row[2])
+
+    def store(self, path: str, size: int, mtime_ns: int, metadata: Dict[str, Any]):
+        """Guarda (o reemplaza) los metadatos de un archivo"""
+        data = json.dumps(metadata, ensure_ascii=False)
+        with self._lock:
+            self._clock += 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO metadata (path, size, mtime_ns, data, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (path, size, mtime_ns, data, self._clock)
+            )
+            self._touched.pop(path, None)
+            self._pending_writes += 1
+            if self._pending_writes >= COMMIT_EVERY:
+                self._commit_locked()
+
+    def invalidate(self, file_path: str):
+        """Elimina la entrada de un archivo para forzar su relectura"""
+        path = os.path.abspath(file_path)
+        with self._lock:
+            self._conn.execute("DELETE FROM metadata WHERE path = ?", (path,))
+            self._touched.pop(path, None)
+            self._pending_writes += 1
+            self._commit_locked()
+
+    def clear(self):
+        """Vacía la caché por completo y reinicia los contadores"""
+        with self._lock:
+            self._conn.execute("DELETE FROM metadata")
+            self._conn.commit()
+            self._touched.clear()
+            self._pending_writes = 0
+            self._entries = 0
+            self.hits = 0
+            self.misses = 0
+
+    def flush(self):
+        """Escribe en disco los cambios pendientes"""
+        with self._lock:
+            self._commit_locked()
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores de aciertos/fallos y número de entradas"""
+        with self._lock:
+            self._commit_locked()
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': self._entries,
+                'max_entries': self.max_entries,
+            }
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    def _commit_locked(self):
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE metadata SET last_access = ? WHERE path = ?",
+                [(access, path) for path, access in self._touched.items()]
+            )
+            self._touched.clear()
+        self._conn.commit()
+        self._pending_writes = 0
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
+        if self._entries > self.max_entries:
+            self._evict_locked(self._entries - self.max_entries)
+
+    def _evict_locked(self, count: int):
+        """Elimina las entradas usadas hace más tiempo (LRU)"""
+        self._conn.execute(
+            "DELETE FROM metadata WHERE path IN "
+            "(SELECT path FROM metadata ORDER BY last_access ASC LIMIT ?)",
+            (count,)
+        )
+        self._conn.commit()
+        self._entries -= count
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_metadata_cache() -> MetadataCache:
+    """Devuelve la caché compartida de la aplicación (se crea al primer uso)"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = MetadataCache()
+            atexit.register(_default_cache.close)
+        return _default_cache
@@ -0,0 +1,197 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Dict, Any, Iterable, List, Optional
+from utils.utils import atomic_write
+
+MANIFEST_FILE_NAME = ".musicusb_manifest.json"
+JOURNAL_FILE_NAME = ".musicusb_manifest.journal"
+MANIFEST_VERSION = 1
+# FAT guarda la fecha de modificación con resolución de 2 segundos
+FAT_MTIME_TOLERANCE_NS = 2_000_000_000
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def new_file_digest():
+    """BLAKE2b: rápido y suficiente para detectar cambios de contenido"""
+    return hashlib.blake2b(digest_size=16)
+
+
+def file_hash(file_path: str) -> str:
+    """Hash del contenido del archivo"""
+    digest = new_file_digest()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SyncManifest:
+    """
+    Registro, guardado en la propia USB, de los archivos que ya se copiaron.
+    Cada archivo terminado se añade a un diario (una línea JSON) en el momento,
+    de modo que si la copia se interrumpe la siguiente sincronización continúa
+    exactamente donde se quedó. Al terminar, el diario se compacta en el manifiesto.
+    """
+
+    def __init__(self, usb_path: str):
+        self.usb_path = usb_path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._journal = None
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.usb_path, MANIFEST_FILE_NAME)
+
+    @property
+    def journal_path(self) -> str:
+        return os.path.join(self.usb_path, JOURNAL_FILE_NAME)
+
+    @classmethod
+    def load(cls, usb_path: str) -> 'SyncManifest':
+        manifest = cls(usb_path)
+        try:
+            with open(manifest.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                manifest.entries = data.get('entries', {})
+        except (OSError, ValueError) as e:
+            if os.path.exists(manifest.manifest_path):
+                print(f"Error reading sync manifest: {e}")
+
+        # Aplicar lo registrado por una copia anterior que no llegó a terminar
+        try:
+            with open(manifest.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # Última línea a medio escribir
+                    if record.get('deleted'):
+                        manifest.entries.pop(record['path'], None)
+                    else:
+                        manifest.entries[record['path']] = record['entry']
+        except OSError:
+            pass
+        return manifest
+
+    def relative_path(self, dest_path: str) -> str:
+        return os.path.relpath(dest_path, self.usb_path).replace(os.sep, '/')
+
+    def needs_copy(self, song, dest_path: str, fingerprint: Optional[str],
+                   verify_hash: bool = False) -> bool:
+        """Decide si el archivo destino falta o está desactualizado respecto al origen"""
+        try:
+            st = os.stat(dest_path)
+        except OSError:
+            return True
+
+        relative = self.relative_path(dest_path)
+        entry = self.entries.get(relative)
+        if entry is not None:
+            if (entry.get('source') != song.file_path
+                    or entry.get('source_size') != song.size
+                    or entry.get('source_mtime_ns') != song.mtime_ns
+                    or entry.get('fingerprint') != fingerprint):
+                return True
+            if st.st_size != entry.get('size') or st.st_mtime_ns != entry.get('mtime_ns'):
+                return True  # Alguien modificó el archivo en la USB
+            if verify_hash:
+                # El hash solo se calcula si lo barato ya coincide
+                source_hash = file_hash(song.file_path)
+                if 'source_hash' not in entry:
+                    # Entrada sin hash (p.ej. etiquetada al copiar): se completa, no se recopia
+                    self._append({'path': relative, 'entry': dict(entry, source_hash=source_hash)})
+                    return False
+                return entry['source_hash'] != source_hash
+            return False
+
+        # Sin manifiesto solo se puede comparar con el origen si no se cambian etiquetas
+        if fingerprint is not None:
+            return True
+        if st.st_size != song.size or abs(st.st_mtime_ns - song.mtime_ns) > FAT_MTIME_TOLERANCE_NS:
+            return True
+        if verify_hash:
+            return file_hash(dest_path) != file_hash(song.file_path)
+        return False
+
+    def record(self, song, dest_path: str, fingerprint: Optional[str], source_hash: Optional[str] = None):
+        """Registra un archivo ya copiado por completo (seguro desde varios hilos)"""
+        st = os.stat(dest_path)
+        entry = {
+            'source': song.file_path,
+            'source_size': song.size,
+            'source_mtime_ns': song.mtime_ns,
+            'fingerprint': fingerprint,
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+        }
+        if source_hash is not None:
+            entry['source_hash'] = source_hash
+        self._append({'path': self.relative_path(dest_path), 'entry': entry})
+
+    def remove_orphans(self, planned_dest_paths: Iterable[str]) -> List[str]:
+        """
+        Borra de la USB los archivos que copió una sincronización anterior y que ya
+        no están en la playlist. Nunca toca archivos que no figuren en el manifiesto.
+        """
+        planned = set(self.relative_path(path) for path in planned_dest_paths)
+        removed = []
+        for relative in list(self.entries):
+            if relative in planned:
+                continue
+            full_path = os.path.join(self.usb_path, *relative.split('/'))
+            try:
+                os.remove(full_path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Error deleting orphan {full_path}: {e}")
+                continue
+            self._append({'path': relative, 'deleted': True})
+            removed.append(full_path)
+            self._remove_empty_dirs(os.path.dirname(full_path))
+        return removed
+
+    def save(self):
+        """Compacta el diario en el manifiesto (escritura atómica) y lo elimina"""
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            atomic_write(self.manifest_path,
+                         lambda f: json.dump({'version': MANIFEST_VERSION, 'entries': self.entries}, f))
+            try:
+                os.remove(self.journal_path)
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        """Cierra el diario sin compactar (p.ej. al cancelar); se aplicará en la próxima carga"""
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    def _append(self, record):
+        with self._lock:
+            if record.get('deleted'):
+                self.entries.pop(record['path'], None)
+            else:
+                self.entries[record['path']] = record['entry']
+            if self._journal is None:
+                self._journal = open(self.journal_path, 'a', encoding='utf-8')
+            self._journal.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._journal.flush()
+
+    def _remove_empty_dirs(self, directory):
+        usb_root = os.path.abspath(self.usb_path)
+        directory = os.path.abspath(directory)
+        while directory != usb_root and directory.startswith(usb_root):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break  # No está vacía
+            directory = os.path.dirname(directory)
@@ -1,6 +1,6 @@
 import os
 import colorsys
-from typing import Tuple, Dict, Any
+from typing import Tuple, Dict, Any, Callable, IO
 from mutagen import File
 from mutagen.mp3 import MP3
 from mutagen.flac import FLAC
@@ -8,6 +8,45 @@ from mutagen.mp4 import MP4
 from mutagen.oggvorbis import OggVorbis
 from mutagen.oggopus import OggOpus
 from mutagen.asf import ASF
+from mutagen.id3 import ID3
+from mutagen.apev2 import APEv2
+
+APP_NAME = "MusicUSB"
+
+def get_config_dir() -> str:
+    """Devuelve (y crea si hace falta) la carpeta de configuración del usuario"""
+    if os.name == 'nt':
+        base = os.environ.get('APPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CONFIG_HOME') or os.path.join(os.path.expanduser('~'), '.config')
+    config_dir = os.path.join(base, APP_NAME)
+    os.makedirs(config_dir, exist_ok=True)
+    return config_dir
+
+def atomic_write(file_path: str, writer: Callable[[IO], None], binary: bool = False,
+                 buffering: int = -1):
+    """
+    Escribe un archivo de forma atómica: writer(f) rellena un temporal en la misma
+    carpeta, que se vuelca a disco y se renombra al terminar. Si algo falla, el
+    archivo anterior queda intacto y el temporal se borra.
+    """
+    temp_path = file_path + ".tmp"
+    try:
+        if binary:
+            f = open(temp_path, 'wb', buffering=buffering)
+        else:
+            f = open(temp_path, 'w', encoding='utf-8', buffering=buffering)
+        with f:
+            writer(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
 
 def get_file_size(file_path: str) -> int:
     try:
@@ -101,8 +140,59 @@ def find_suitable_usb_size(total_size_mb: float, base_1024: bool = True) -> int:
     
     return 256  # Tamaño máximo
 
+# Claves de cada formato para los campos normalizados (lectura en una sola pasada)
+ID3_TAG_KEYS = {'title': 'TIT2', 'artist': 'TPE1', 'album': 'TALB', 'genre': 'TCON'}
+MP4_TAG_KEYS = {'title': '\xa9nam', 'artist': '\xa9ART', 'album': '\xa9alb', 'genre': '\xa9gen'}
+VORBIS_TAG_KEYS = {'title': 'title', 'artist': 'artist', 'album': 'album', 'genre': 'genre'}
+ASF_TAG_KEYS = {'title': 'Title', 'artist': 'Author', 'album': 'WM/AlbumTitle', 'genre': 'WM/Genre'}
+APE_TAG_KEYS = {'title': 'Title', 'artist': 'Artist', 'album': 'Album', 'genre': 'Genre'}
+
+# Tabla de despacho: clase de archivo de mutagen -> claves de sus tags
+FORMAT_TAG_KEYS = {
+    MP3: ID3_TAG_KEYS,
+    FLAC: VORBIS_TAG_KEYS,
+    MP4: MP4_TAG_KEYS,
+    OggVorbis: VORBIS_TAG_KEYS,
+    OggOpus: VORBIS_TAG_KEYS,
+    ASF: ASF_TAG_KEYS,
+}
+
+def _get_tag_keys(audio) -> Dict[str, str]:
+    """Busca las claves del formato; para otros formatos decide según el tipo de tags"""
+    for cls in type(audio).__mro__:
+        if cls in FORMAT_TAG_KEYS:
+            return FORMAT_TAG_KEYS[cls]
+    
+    tags = audio.tags
+    if isinstance(tags, ID3):
+        return ID3_TAG_KEYS
+    if isinstance(tags, APEv2):
+        return APE_TAG_KEYS
+    return VORBIS_TAG_KEYS
+
+def _tag_to_text(value) -> str:
+    """Convierte un valor de tag (frame ID3, lista, atributo ASF...) en texto"""
+    if value is None:
+        return ''
+    # TCON puede guardar el género como número ("(17)"); .genres lo traduce
+    genres = getattr(value, 'genres', None)
+    if genres:
+        return str(genres[0]).strip()
+    if hasattr(value, 'text'):
+        value = value.text
+    if isinstance(value, (list, tuple)):
+        value = value[0] if value else ''
+    return str(value).strip()
+
 def get_audio_metadata(file_path: str) -> Dict[str, Any]:
+    return read_audio_metadata(file_path)[0]
 
+def read_audio_metadata(file_path: str) -> Tuple[Dict[str, Any], bool]:
+    """
+    Como get_audio_metadata, pero indica además si el resultado se puede cachear (True)
+    o si la lectura falló y solo se devuelve el nombre del archivo como título (False).
+    Un formato que mutagen no reconoce también es definitivo mientras el archivo no cambie.
+    """
     metadata = {
         'title': '',
         'artist': '',
@@ -116,78 +206,64 @@ def get_audio_metadata(file_path: str) -> Dict[str, Any]:
         file_name = os.path.splitext(os.path.basename(file_path))[0]
         metadata['title'] = file_name
         
-        audio = File(file_path, easy=True)
+        # Una sola lectura del archivo: sin easy=True para acceder a los tags nativos
+        audio = File(file_path)
         if audio is None:
-            return metadata
+            return metadata, True
         
-        # Función auxiliar para obtener valores de tags
-        def get_tag(tag_name, default=''):
-            if tag_name in audio:
-                value = audio[tag_name]
-                if isinstance(value, list):
-                    return value[0] if value else default
-                return str(value)
-            return default
+        defaults = {
+            'title': file_name,
+            'artist': 'Desconocido',
+            'album': 'Desconocido',
+            'genre': 'Desconocido'
+        }
         
-        # Obtener metadatos básicos
-        metadata['title'] = get_tag('title', file_name)
-        metadata['artist'] = get_tag('artist', 'Desconocido')
-        metadata['album'] = get_tag('album', 'Desconocido')
-        metadata['genre'] = get_tag('genre', 'Desconocido')
+        tags = audio.tags
+        tag_keys = _get_tag_keys(audio) if tags is not None else {}
+        for field, default in defaults.items():
+            key = tag_keys.get(field)
+            value = _tag_to_text(tags.get(key)) if key else ''
+            metadata[field] = value or default
         
         # Información técnica
-        if hasattr(audio.info, 'bitrate'):
-            metadata['bitrate'] = audio.info.bitrate // 1000 if audio.info.bitrate > 0 else 0
-        
-        if hasattr(audio.info, 'length'):
-            metadata['duration'] = int(audio.info.length)
-        
-        # Si no se encontraron metadatos con easy=True, intentar con tags específicos por formato
-        if metadata['artist'] == 'Desconocido' or metadata['album'] == 'Desconocido':
-            # Intentar con el archivo sin easy=True para acceder a tags específicos
-            audio_detailed = File(file_path)
-            if audio_detailed:
-                # Para MP3
-                if isinstance(audio_detailed, MP3):
-                    if 'TPE1' in audio_detailed:  # Artista
-                        metadata['artist'] = str(audio_detailed['TPE1'])
-                    if 'TALB' in audio_detailed:  # Álbum
-                        metadata['album'] = str(audio_detailed['TALB'])
-                    if 'TCON' in audio_detailed:  # Género
-                        metadata['genre'] = str(audio_detailed['TCON'])
-                
-                # Para FLAC
-                elif isinstance(audio_detailed, FLAC):
-                    if 'artist' in audio_detailed:
-                        metadata['artist'] = audio_detailed['artist'][0] if audio_detailed['artist'] else 'Desconocido'
-                    if 'album' in audio_detailed:
-                        metadata['album'] = audio_detailed['album'][0] if audio_detailed['album'] else 'Desconocido'
-                    if 'genre' in audio_detailed:
-                        metadata['genre'] = audio_detailed['genre'][0] if audio_detailed['genre'] else 'Desconocido'
-                
-                # Para MP4
-                elif isinstance(audio_detailed, MP4):
-                    if '\xa9ART' in audio_detailed:
-                        metadata['artist'] = audio_detailed['\xa9ART'][0] if audio_detailed['\xa9ART'] else 'Desconocido'
-                    if '\xa9alb' in audio_detailed:
-                        metadata['album'] = audio_detailed['\xa9alb'][0] if audio_detailed['\xa9alb'] else 'Desconocido'
-                    if '\xa9gen' in audio_detailed:
-                        metadata['genre'] = audio_detailed['\xa9gen'][0] if audio_detailed['\xa9gen'] else 'Desconocido'
-                
-                # Para Ogg Vorbis
-                elif isinstance(audio_detailed, OggVorbis):
-                    if 'artist' in audio_detailed:
-                        metadata['artist'] = audio_detailed['artist'][0] if audio_detailed['artist'] else 'Desconocido'
-                    if 'album' in audio_detailed:
-                        metadata['album'] = audio_detailed['album'][0] if audio_detailed['album'] else 'Desconocido'
-                    if 'genre' in audio_detailed:
-                        metadata['genre'] = audio_detailed['genre'][0] if audio_detailed['genre'] else 'Desconocido'
+        info = audio.info
+        bitrate = getattr(info, 'bitrate', 0) or 0
+        metadata['bitrate'] = bitrate // 1000 if bitrate > 0 else 0
+        metadata['duration'] = int(getattr(info, 'length', 0) or 0)
         
     except Exception as e:
         print(f"Error reading metadata for {file_path}: {e}")
         # En caso de error, al menos tenemos el nombre del archivo como título
+        return metadata, False
     
-    return metadata
+    return metadata, True
+
+def read_id3v2_size(header: bytes) -> int:
+    """Tamaño total de una etiqueta ID3v2 a partir de sus 10 primeros bytes (0 si no hay)"""
+    if len(header) < 10 or header[:3] != b'ID3':
+        return 0
+    # El tamaño está codificado en 4 bytes "syncsafe" (7 bits útiles por byte)
+    size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+    has_footer = header[5] & 0x10
+    return size + (20 if has_footer else 10)
+
+def find_flac_audio_offset(fileobj) -> int:
+    """Posición donde empiezan los frames de audio de un FLAC (tras los bloques de metadatos)"""
+    fileobj.seek(0)
+    offset = read_id3v2_size(fileobj.read(10))
+    fileobj.seek(offset)
+    if fileobj.read(4) != b'fLaC':
+        raise ValueError("No es un archivo FLAC válido")
+    offset += 4
+    
+    while True:
+        block_header = fileobj.read(4)
+        if len(block_header) < 4:
+            raise ValueError("Bloque de metadatos FLAC incompleto")
+        offset += 4 + int.from_bytes(block_header[1:4], 'big')
+        fileobj.seek(offset)
+        if block_header[0] & 0x80:  # Último bloque de metadatos
+            return offset
 
 def format_duration(seconds: int) -> str:
     """Formatea la duración de segundos a MM:SS"""
@@ -195,4 +271,128 @@ def format_duration(seconds: int) -> str:
         return "00:00"
     minutes = seconds // 60
     seconds = seconds % 60
-    return f"{minutes:02d}:{seconds:02d}"
\ No newline at end of file
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+# Extensiones de audio aceptadas directamente y otras que solo se aceptan si el contenido es audio
+AUDIO_EXTENSIONS = frozenset({'.mp3', '.wav', '.flac', '.aac', '.ogg', '.m4a', '.wma', '.opus'})
+EXTRA_AUDIO_EXTENSIONS = frozenset({'.mp2', '.mpga', '.m4b', '.oga', '.aif', '.aiff', '.aifc',
+                                    '.ape', '.wv', '.mka', '.adts'})
+SNIFF_SIZE = 4096
+
+# Firmas al inicio del archivo
+AUDIO_MAGIC = (
+    b'ID3',                                                # MP3 (y AAC) con etiqueta ID3v2
+    b'fLaC',                                               # FLAC
+    b'OggS',                                               # Ogg (Vorbis, Opus, FLAC)
+    b'\x30\x26\xb2\x75\x8e\x66\xcf\x11',                   # ASF (WMA)
+    b'MAC ',                                               # Monkey's Audio
+    b'wvpk',                                               # WavPack
+    b'ADIF',                                               # AAC ADIF
+    b'\x1a\x45\xdf\xa3',                                   # Matroska (MKA)
+)
+
+
+# Bitrates (kbps) por índice: MPEG-1 capas I, II y III; MPEG-2/2.5 capa I, y capas II y III
+_MPEG_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# Frecuencias de muestreo por bits de versión (3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5)
+_MPEG_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def _mpeg_frame_length(head: bytes, i: int) -> int:
+    """
+    Longitud de la trama MPEG audio (MP1/2/3) o AAC ADTS que empieza en la posición i:
+    0 si ahí no hay una cabecera válida, -1 si es válida pero de longitud desconocida
+    (bitrate libre o cabecera ADTS cortada).
+    """
+    if i + 3 >= len(head) or head[i] != 0xFF or (head[i + 1] & 0xE0) != 0xE0:
+        return 0
+    b1, b2 = head[i + 1], head[i + 2]
+    version = (b1 >> 3) & 0x03
+    if version == 0x01:
+        return 0  # Versión reservada
+    layer = 4 - ((b1 >> 1) & 0x03)
+    if layer == 4:
+        # ADTS: sincronía de 12 bits y capa 0; la longitud va en 13 bits de la cabecera
+        if (b1 & 0xF6) != 0xF0 or (b2 >> 2) & 0x0F > 12:
+            return 0
+        if i + 5 >= len(head):
+            return -1
+        length = ((head[i + 3] & 0x03) << 11) | (head[i + 4] << 3) | (head[i + 5] >> 5)
+        return length if length >= 7 else 0
+    bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 0x03
+    if bitrate_index == 0x0F or rate_index == 0x03:
+        return 0
+    if bitrate_index == 0:
+        return -1  # Bitrate libre
+    bitrate = _MPEG_BITRATES[(1 if version == 3 else 2, layer)][bitrate_index] * 1000
+    sample_rate = _MPEG_SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 0x01
+    if layer == 1:
+        return (12 * bitrate // sample_rate + padding) * 4
+    if layer == 3 and version != 3:
+        return 72 * bitrate // sample_rate + padding
+    return 144 * bitrate // sample_rate + padding
+
+
+def _find_mpeg_audio(head: bytes) -> bool:
+    """
+    Busca en la cabecera la primera trama MPEG/ADTS confirmada por otra trama válida
+    justo a continuación. Si la siguiente queda fuera de lo leído, basta con una trama
+    al principio (tras el posible relleno de ceros), que es lo habitual en un MP3 sin ID3.
+    """
+    start = len(head) - len(head.lstrip(b'\x00'))
+    i = head.find(b'\xff')
+    while i != -1:
+        length = _mpeg_frame_length(head, i)
+        if length:
+            following = i + length
+            if length > 0 and following + 3 < len(head):
+                if _mpeg_frame_length(head, following):
+                    return True
+            elif i == start:
+                return True
+        i = head.find(b'\xff', i + 1)
+    return False
+
+
+def sniff_audio(head: bytes) -> bool:
+    """Reconoce audio por los primeros bytes del archivo"""
+    if head.startswith(AUDIO_MAGIC):
+        return True
+    if head[4:8] == b'ftyp':
+        return True  # MP4/M4A
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return True
+    if head[:4] == b'FORM' and head[8:12] in (b'AIFF', b'AIFC'):
+        return True
+    # MP3/AAC sin ID3: puede haber relleno, basura o una etiqueta suelta antes de la primera trama
+    return _find_mpeg_audio(head)
+
+
+def is_audio_file(file_path: str, sniff: bool = True) -> bool:
+    """
+    Clasifica por extensión (búsqueda en un conjunto) y, si sniff es True, confirma
+    leyendo los primeros bytes: descarta archivos corruptos o mal nombrados y acepta
+    audio con extensiones poco comunes o sin extensión.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in AUDIO_EXTENSIONS:
+        if not sniff:
+            return True
+    elif not sniff or (extension and extension not in EXTRA_AUDIO_EXTENSIONS):
+        return False
+
+    try:
+        with open(file_path, 'rb') as f:
+            head = f.read(SNIFF_SIZE)
+    except OSError:
+        return False
+    return sniff_audio(head)
@@ -0,0 +1,540 @@
+from PyQt5.QtCore import Qt, QAbstractItemModel, QModelIndex
+from PyQt5.QtGui import QColor, QFont, QBrush
+from model.model import (SONGS_ADDED, SONGS_REMOVED, SONGS_MOVED, SONGS_UPDATED,
+                         DESTINATION_RENAMED, PLAYLIST_RESET, SONGS_RESTORED)
+from model.columns import SIZE, DURATION, BITRATE
+from utils.utils import get_folder_color, format_size, format_duration
+
+COLUMN_HEADERS = ["Título", "Artista", "Álbum", "Género", "Ruta", "kbps", "Duración", "Tamaño"]
+
+SIZE_COLUMN = COLUMN_HEADERS.index("Tamaño")
+
+# Columnas que se ordenan por su valor numérico y no por el texto mostrado
+NUMERIC_SORT_COLUMNS = {
+    COLUMN_HEADERS.index("kbps"): BITRATE,
+    COLUMN_HEADERS.index("Duración"): DURATION,
+    SIZE_COLUMN: SIZE,
+}
+
+SONG_ROLE = Qt.UserRole + 1
+
+# Con más huecos que estos, una baja en bloque se notifica como un único cambio de disposición
+MAX_REMOVED_RANGES = 32
+
+
+def lighten_color(hex_color, factor=0.3):
+    """Aclara un color hex"""
+    hex_color = hex_color.lstrip('#')
+    r = int(hex_color[0:2], 16)
+    g = int(hex_color[2:4], 16)
+    b = int(hex_color[4:6], 16)
+
+    r = min(255, int(r + (255 - r) * factor))
+    g = min(255, int(g + (255 - g) * factor))
+    b = min(255, int(b + (255 - b) * factor))
+
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+class DestinationGroup:
+    """Nodo de primer nivel: un destino con sus canciones en el orden mostrado"""
+
+    def __init__(self, name):
+        self.songs = []
+        self._rows = None
+        self.set_name(name)
+
+    def set_name(self, name):
+        self.name = name
+        # Los pinceles se crean una sola vez por grupo, no por celda
+        bg_color, text_color = get_folder_color(name)
+        self.background = QBrush(QColor(bg_color))
+        self.song_background = QBrush(QColor(lighten_color(bg_color)))
+        self.foreground = QBrush(QColor(text_color))
+
+    def row_of(self, song):
+        """Fila de la canción dentro del grupo según su id estable"""
+        if self._rows is None:
+            self._rows = {s.song_id: row for row, s in enumerate(self.songs)}
+        return self._rows.get(song.song_id)
+
+    def append(self, songs):
+        start = len(self.songs)
+        self.songs.extend(songs)
+        if self._rows is not None:
+            for offset, song in enumerate(songs):
+                self._rows[song.song_id] = start + offset
+
+    def invalidate_rows(self):
+        self._rows = None
+
+
+class PlaylistTreeModel(QAbstractItemModel):
+    """
+    Modelo de árbol (destino -> canciones) respaldado por un Playlist.
+    Escucha los eventos del Playlist y emite inserciones, eliminaciones y
+    dataChanged solo para las filas afectadas, sin reconstruir el árbol.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.playlist = None
+        self.base_1024 = True
+        self._groups = []
+        self._group_rows = {}  # DestinationGroup -> fila
+        self._groups_by_name = {}
+        self._song_groups = {}  # song_id -> DestinationGroup
+        # Puntero interno de los índices de primer nivel
+        self._root = object()
+
+        self._group_font = QFont()
+        self._group_font.setBold(True)
+        self._group_font.setPointSize(self._group_font.pointSize() + 1)
+
+    # --- Conexión con el Playlist ---
+
+    def set_playlist(self, playlist):
+        if self.playlist is not None:
+            self.playlist.remove_listener(self.on_playlist_changed)
+        self.playlist = playlist
+        if playlist is not None:
+            playlist.add_listener(self.on_playlist_changed)
+        self._reset()
+
+    def set_base_1024(self, base_1024):
+        if base_1024 == self.base_1024:
+            return
+        self.base_1024 = base_1024
+        self._refresh_group_sizes(self._groups)
+        for group_row, group in enumerate(self._groups):
+            if group.songs:
+                parent = self.index(group_row, 0)
+                self.dataChanged.emit(self.index(0, SIZE_COLUMN, parent),
+                                      self.index(len(group.songs) - 1, SIZE_COLUMN, parent),
+                                      [Qt.DisplayRole])
+
+    def on_playlist_changed(self, event, *args):
+        if event == SONGS_ADDED:
+            self._insert_songs(args[0])
+        elif event == SONGS_REMOVED:
+            self._remove_songs(args[0])
+        elif event == SONGS_MOVED:
+            self._move_songs(args[0])
+        elif event == SONGS_UPDATED:
+            self._update_songs(args[0])
+        elif event == DESTINATION_RENAMED:
+            self._rename_destination(*args)
+        elif event == SONGS_RESTORED:
+            self._restore_songs(args[0])
+        elif event == PLAYLIST_RESET:
+            self._reset()
+
+    # --- Acceso a los nodos ---
+
+    def is_group(self, index):
+        return index.isValid() and index.internalPointer() is self._root
+
+    def group_at(self, index):
+        if self.is_group(index):
+            return self._groups[index.row()]
+        return None
+
+    def song_at(self, index):
+        if index.isValid() and not self.is_group(index):
+            return index.internalPointer().songs[index.row()]
+        return None
+
+    def group_index(self, group):
+        return self.createIndex(self._group_rows[group], 0, self._root)
+
+    def song_index(self, song, column=0):
+        group = self._song_groups.get(song.song_id)
+        if group is None:
+            return QModelIndex()
+        return self.createIndex(group.row_of(song), column, group)
+
+    # --- API de QAbstractItemModel ---
+
+    def index(self, row, column, parent=QModelIndex()):
+        # Comprobación directa de límites: la vista llama a index() por cada fila visible
+        if row < 0 or not 0 <= column < len(COLUMN_HEADERS):
+            return QModelIndex()
+        if not parent.isValid():
+            if row < len(self._groups):
+                return self.createIndex(row, column, self._root)
+        elif parent.internalPointer() is self._root and parent.column() == 0:
+            group = self._groups[parent.row()]
+            if row < len(group.songs):
+                return self.createIndex(row, column, group)
+        return QModelIndex()
+
+    def parent(self, index):
+        if not index.isValid() or self.is_group(index):
+            return QModelIndex()
+        return self.group_index(index.internalPointer())
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return len(self._groups)
+        if self.is_group(parent) and parent.column() == 0:
+            return len(self._groups[parent.row()].songs)
+        return 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(COLUMN_HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return COLUMN_HEADERS[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        if self.is_group(index):
+            group = self._groups[index.row()]
+            if role == Qt.DisplayRole:
+                if index.column() == 0:
+                    return group.name
+                if index.column() == SIZE_COLUMN and self.playlist is not None:
+                    # Subtotal mantenido por el Playlist, sin recorrer las canciones
+                    return format_size(self.playlist.get_destination_size(group.name), self.base_1024)
+                return None
+            if role == Qt.BackgroundRole:
+                return group.background
+            if role == Qt.ForegroundRole:
+                return group.foreground
+            if role == Qt.FontRole and index.column() == 0:
+                return self._group_font
+            return None
+
+        group = index.internalPointer()
+        song = group.songs[index.row()]
+        if role == Qt.DisplayRole:
+            return self._song_text(song, index.column())
+        if role == Qt.BackgroundRole:
+            return group.song_background
+        if role == Qt.ForegroundRole:
+            return group.foreground
+        if role == SONG_ROLE:
+            return song
+        return None
+
+    def _song_text(self, song, column):
+        if column == 4:
+            return song.file_path
+        if column == 7:
+            return song.size_formatted(self.base_1024)
+        if not song.has_metadata:
+            # Marcador provisional (o datos de #EXTINF) hasta que el cargador lea los tags
+            hint = song.hint
+            if hint:
+                if column == 0:
+                    return hint.title or song.file_name
+                if column == 1:
+                    return hint.artist or ""
+                if column == 6:
+                    return format_duration(hint.duration)
+            return song.file_name if column == 0 else ""
+        if column == 0:
+            return song.title
+        if column == 1:
+            return song.artist
+        if column == 2:
+            return song.album
+        if column == 3:
+            return song.genre
+        if column == 5:
+            return str(song.bitrate)
+        if column == 6:
+            return song.duration_formatted
+        return None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        key = self._sort_key(column)
+        reverse = order == Qt.DescendingOrder
+
+        self.layoutAboutToBeChanged.emit()
+        old_persistent, anchors = self._persistent_anchors()
+
+        if column == 0:
+            self._groups.sort(key=lambda group: group.name.lower(), reverse=reverse)
+            self._index_groups()
+        numeric_column = NUMERIC_SORT_COLUMNS.get(column)
+        for group in self._groups:
+            if numeric_column is not None:
+                # Orden numérico vectorizado sobre las columnas del Playlist
+                order = self.playlist.columns.order(numeric_column, [song.song_id for song in group.songs], reverse)
+                group.songs[:] = [group.songs[position] for position in order]
+            else:
+                group.songs.sort(key=key, reverse=reverse)
+            group.invalidate_rows()
+
+        self._restore_persistent(old_persistent, anchors)
+        self.layoutChanged.emit()
+
+    def _persistent_anchors(self):
+        """Recuerda a qué nodo apunta cada índice persistente antes de cambiar la disposición"""
+        old_persistent = self.persistentIndexList()
+        anchors = []
+        for index in old_persistent:
+            if self.is_group(index):
+                anchors.append((self._groups[index.row()], None, index.column()))
+            else:
+                group = index.internalPointer()
+                anchors.append((group, group.songs[index.row()], index.column()))
+        return old_persistent, anchors
+
+    def _restore_persistent(self, old_persistent, anchors):
+        """Mueve los índices persistentes a la nueva fila de su nodo (o los invalida si ya no está)"""
+        new_persistent = []
+        for group, song, column_index in anchors:
+            if song is not None:
+                # La canción puede haber vuelto a otro grupo (deshacer un cambio de destino)
+                group = self._song_groups.get(song.song_id, group)
+            group_row = self._group_rows.get(group)
+            row = group_row if song is None or group_row is None else group.row_of(song)
+            if row is None:
+                new_persistent.append(QModelIndex())
+            elif song is None:
+                new_persistent.append(self.createIndex(row, column_index, self._root))
+            else:
+                new_persistent.append(self.createIndex(row, column_index, group))
+        self.changePersistentIndexList(old_persistent, new_persistent)
+
+    def _sort_key(self, column):
+        return lambda song: (self._song_text(song, column) or "").lower()
+
+    # --- Actualizaciones incrementales ---
+
+    def _reset(self):
+        self.beginResetModel()
+        self._groups = []
+        self._group_rows = {}
+        self._groups_by_name = {}
+        self._song_groups = {}
+        if self.playlist is not None:
+            for name, songs in self.playlist.get_songs_by_destination().items():
+                group = DestinationGroup(name)
+                group.append(songs)
+                self._add_group(group)
+        self.endResetModel()
+
+    def _refresh_group_sizes(self, groups):
+        for group in groups:
+            row = self._group_rows.get(group)
+            if row is not None:
+                index = self.createIndex(row, SIZE_COLUMN, self._root)
+                self.dataChanged.emit(index, index, [Qt.DisplayRole])
+    
+    def _index_groups(self):
+        """Rehace el índice grupo -> fila tras reordenar o filtrar self._groups"""
+        self._group_rows = {group: row for row, group in enumerate(self._groups)}
+    
+    def _add_group(self, group):
+        self._group_rows[group] = len(self._groups)
+        self._groups.append(group)
+        self._groups_by_name[group.name] = group
+        for song in group.songs:
+            self._song_groups[song.song_id] = group
+
+    @staticmethod
+    def _group_name(song):
+        return song.destination if song.destination else "/"
+
+    def _insert_songs(self, songs):
+        by_group = {}
+        for song in songs:
+            by_group.setdefault(self._group_name(song), []).append(song)
+
+        for name, group_songs in by_group.items():
+            group = self._groups_by_name.get(name)
+            if group is None:
+                group = DestinationGroup(name)
+                group.append(group_songs)
+                row = len(self._groups)
+                self.beginInsertRows(QModelIndex(), row, row)
+                self._add_group(group)
+                self.endInsertRows()
+            else:
+                parent = self.group_index(group)
+                start = len(group.songs)
+                self.beginInsertRows(parent, start, start + len(group_songs) - 1)
+                group.append(group_songs)
+                for song in group_songs:
+                    self._song_groups[song.song_id] = group
+                self.endInsertRows()
+                self._refresh_group_sizes([group])
+
+    def _remove_songs(self, songs):
+        by_group = {}
+        for song in songs:
+            group = self._song_groups.get(song.song_id)
+            if group is not None:
+                by_group.setdefault(id(group), (group, set()))[1].add(song.song_id)
+
+        plans = []
+        for group, song_ids in by_group.values():
+            if len(song_ids) == len(group.songs):
+                plans.append((group, song_ids, None))
+            else:
+                rows = [row for row, song in enumerate(group.songs) if song.song_id in song_ids]
+                plans.append((group, song_ids, self._contiguous_ranges(rows)))
+        if sum(len(ranges) for _, _, ranges in plans if ranges) > MAX_REMOVED_RANGES:
+            self._remove_songs_in_layout(plans)
+            return
+
+        for group, song_ids, ranges in plans:
+            if ranges is None:
+                # Se eliminan todas las canciones: quitar el grupo completo
+                self._remove_group(group)
+                continue
+
+            parent = self.group_index(group)
+            # Eliminar por rangos contiguos, de abajo hacia arriba
+            for first, last in reversed(ranges):
+                self.beginRemoveRows(parent, first, last)
+                for song in group.songs[first:last + 1]:
+                    del self._song_groups[song.song_id]
+                del group.songs[first:last + 1]
+                group.invalidate_rows()
+                self.endRemoveRows()
+            self._refresh_group_sizes([group])
+
+    def _remove_songs_in_layout(self, plans):
+        """
+        Baja en bloque con muchos huecos: cada grupo se reconstruye en una pasada y la
+        vista recibe un solo layoutChanged en lugar de una señal por rango. Expansión
+        y selección de lo que queda se conservan con los índices persistentes.
+        """
+        self.layoutAboutToBeChanged.emit()
+        old_persistent, anchors = self._persistent_anchors()
+
+        changed = []
+        for group, song_ids, ranges in plans:
+            for song in group.songs:
+                if song.song_id in song_ids:
+                    del self._song_groups[song.song_id]
+            group.songs[:] = [song for song in group.songs if song.song_id not in song_ids]
+            group.invalidate_rows()
+            if group.songs:
+                changed.append(group)
+            else:
+                del self._groups_by_name[group.name]
+        if len(changed) != len(plans):
+            self._groups = [group for group in self._groups if group.songs]
+            self._index_groups()
+
+        self._restore_persistent(old_persistent, anchors)
+        self.layoutChanged.emit()
+        self._refresh_group_sizes(changed)
+
+    def _restore_songs(self, songs):
+        """
+        Canciones devueltas a su sitio (deshacer): los grupos afectados se rehacen en
+        el orden del Playlist con un solo layoutChanged; los demás no se tocan.
+        """
+        names = {self._group_name(song) for song in songs}
+        names.update(group.name for group in (self._song_groups.get(song.song_id) for song in songs)
+                     if group is not None)
+
+        self.layoutAboutToBeChanged.emit()
+        old_persistent, anchors = self._persistent_anchors()
+
+        # Primero se vacían todos: una canción puede pasar de un grupo afectado a otro
+        for name in names:
+            group = self._groups_by_name.get(name)
+            if group is not None:
+                for song in group.songs:
+                    del self._song_groups[song.song_id]
+                group.songs.clear()
+                group.invalidate_rows()
+
+        changed = []
+        for name in names:
+            if name == "/":
+                song_ids = self.playlist.get_group_song_ids("") + self.playlist.get_group_song_ids("/")
+            else:
+                song_ids = self.playlist.get_group_song_ids(name)
+            group = self._groups_by_name.get(name)
+            if not song_ids:
+                if group is not None:
+                    del self._groups_by_name[name]
+                continue
+            if group is None:
+                group = DestinationGroup(name)
+                self._groups.append(group)
+                self._groups_by_name[name] = group
+            group.append(self.playlist.get_songs(song_ids))
+            for song in group.songs:
+                self._song_groups[song.song_id] = group
+            changed.append(group)
+        self._groups = [group for group in self._groups if group.songs]
+        self._index_groups()
+
+        self._restore_persistent(old_persistent, anchors)
+        self.layoutChanged.emit()
+        self._refresh_group_sizes(changed)
+
+    def _remove_group(self, group):
+        row = self._group_rows[group]
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._groups[row]
+        del self._group_rows[group]
+        for following in range(row, len(self._groups)):
+            self._group_rows[self._groups[following]] = following
+        del self._groups_by_name[group.name]
+        for song in group.songs:
+            del self._song_groups[song.song_id]
+        self.endRemoveRows()
+
+    def _move_songs(self, songs):
+        self._remove_songs(songs)
+        self._insert_songs(songs)
+
+    def _update_songs(self, songs):
+        last_column = len(COLUMN_HEADERS) - 1
+        groups = set()
+        for song in songs:
+            index = self.song_index(song)
+            if index.isValid():
+                self.dataChanged.emit(index, index.sibling(index.row(), last_column), [Qt.DisplayRole])
+                groups.add(index.internalPointer())
+        self._refresh_group_sizes(groups)
+
+    def _rename_destination(self, old_destination, new_destination, songs):
+        old_name = old_destination if old_destination else "/"
+        new_name = new_destination if new_destination else "/"
+        group = self._groups_by_name.get(old_name)
+        if (group is None or new_name in self._groups_by_name
+                or len(group.songs) != len(songs)):
+            # El grupo se fusiona con otro existente: mover las canciones
+            self._move_songs(songs)
+            return
+
+        # Renombrar en sitio: el grupo conserva su fila, su expansión y su selección
+        del self._groups_by_name[old_name]
+        group.set_name(new_name)
+        self._groups_by_name[new_name] = group
+        index = self.group_index(group)
+        self.dataChanged.emit(index, index.sibling(index.row(), len(COLUMN_HEADERS) - 1))
+        if group.songs:
+            self.dataChanged.emit(self.index(0, 0, index),
+                                  self.index(len(group.songs) - 1, len(COLUMN_HEADERS) - 1, index),
+                                  [Qt.BackgroundRole, Qt.ForegroundRole])
+
+    @staticmethod
+    def _contiguous_ranges(rows):
+        ranges = []
+        for row in rows:
+            if ranges and ranges[-1][1] == row - 1:
+                ranges[-1][1] = row
+            else:
+                ranges.append([row, row])
+        return ranges
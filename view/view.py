@@ -1,13 +1,32 @@
 import os
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-                             QTreeWidget, QTreeWidgetItem, QLabel, QProgressBar,
+                             QTreeView, QLabel, QProgressBar,
                              QPushButton, QMenu, QAction, QMessageBox, QFileDialog,
                              QAbstractItemView, QSplitter, QFrame, QHeaderView,
                              QMenuBar, QInputDialog, QApplication, QCheckBox,
-                             QDialog, QLineEdit, QTextEdit, QGroupBox, QProgressDialog)
+                             QDialog, QLineEdit, QTextEdit, QGroupBox, QProgressDialog,
+                             QSpinBox, QComboBox, QTreeWidget, QTreeWidgetItem)
 from PyQt5.QtCore import Qt, pyqtSignal, QMimeData
-from PyQt5.QtGui import QColor, QFont, QDragEnterEvent, QDropEvent, QBrush
-from utils.utils import get_folder_color, find_suitable_usb_size, format_size, bytes_to_mb
+from PyQt5.QtGui import QColor, QDragEnterEvent, QDropEvent, QBrush, QKeySequence
+from utils.utils import find_suitable_usb_size, format_size, bytes_to_mb, format_duration
+from view.playlist_model import PlaylistTreeModel
+from utils.copy_plan import ORDER_FOLDER, ORDER_LARGEST_FIRST, ORDER_PLAYLIST
+from model.session import SESSION_EXTENSION
+from model.duplicates import MATCH_PATH, MATCH_CONTENT, MATCH_METADATA
+
+SESSION_FILTER = f"Sesión MusicUSB (*{SESSION_EXTENSION})"
+
+COPY_ORDER_LABELS = {
+    ORDER_FOLDER: "Por carpeta",
+    ORDER_LARGEST_FIRST: "Más grandes primero",
+    ORDER_PLAYLIST: "Orden de la playlist",
+}
+
+DUPLICATE_REASON_LABELS = {
+    MATCH_PATH: "Misma ruta",
+    MATCH_CONTENT: "Mismo contenido",
+    MATCH_METADATA: "Mismo artista, título y duración",
+}
 
 class USBCopyDialog(QDialog):
     def __init__(self, parent=None):
@@ -57,8 +76,78 @@ class USBCopyDialog(QDialog):
         cover_layout.addWidget(self.browse_cover_btn)
         metadata_layout.addLayout(cover_layout)
         
+        cover_size_layout = QHBoxLayout()
+        cover_size_layout.addWidget(QLabel("Tamaño máximo de portada:"))
+        self.cover_size_spin = QSpinBox()
+        self.cover_size_spin.setRange(0, 4000)
+        self.cover_size_spin.setSingleStep(100)
+        self.cover_size_spin.setSuffix(" px")
+        self.cover_size_spin.setSpecialValueText("Original")
+        self.cover_size_spin.setValue(0)
+        cover_size_layout.addWidget(self.cover_size_spin)
+        cover_size_layout.addStretch()
+        metadata_layout.addLayout(cover_size_layout)
+        
         layout.addWidget(metadata_group)
         
+        # Opciones de copia
+        options_group = QGroupBox("Opciones de copia")
+        options_layout = QVBoxLayout(options_group)
+        
+        streams_layout = QHBoxLayout()
+        streams_layout.addWidget(QLabel("Copias simultáneas:"))
+        self.streams_spin = QSpinBox()
+        self.streams_spin.setRange(1, 8)
+        self.streams_spin.setValue(2)
+        self.streams_spin.setToolTip("Usar 1 si la memoria USB se vuelve lenta con varias copias a la vez")
+        streams_layout.addWidget(self.streams_spin)
+        streams_layout.addStretch()
+        options_layout.addLayout(streams_layout)
+        
+        order_layout = QHBoxLayout()
+        order_layout.addWidget(QLabel("Orden de copia:"))
+        self.order_combo = QComboBox()
+        for order, label in COPY_ORDER_LABELS.items():
+            self.order_combo.addItem(label, order)
+        self.order_combo.setToolTip("Por carpeta suele ser lo más rápido en memorias FAT32/exFAT")
+        order_layout.addWidget(self.order_combo)
+        order_layout.addStretch()
+        options_layout.addLayout(order_layout)
+        
+        self.batch_small_checkbox = QCheckBox("Agrupar archivos pequeños en un mismo flujo")
+        self.batch_small_checkbox.setChecked(False)
+        options_layout.addWidget(self.batch_small_checkbox)
+        
+        self.trim_to_fit_checkbox = QCheckBox("Si no cabe todo, copiar solo lo que quepa")
+        self.trim_to_fit_checkbox.setChecked(False)
+        self.trim_to_fit_checkbox.setToolTip("También omite archivos de más de 4 GB en memorias FAT32")
+        options_layout.addWidget(self.trim_to_fit_checkbox)
+        
+        self.tag_on_copy_checkbox = QCheckBox("Escribir etiquetas durante la copia (MP3/FLAC)")
+        self.tag_on_copy_checkbox.setChecked(True)
+        self.tag_on_copy_checkbox.setToolTip("Evita reescribir cada archivo en la USB después de copiarlo")
+        options_layout.addWidget(self.tag_on_copy_checkbox)
+        
+        # Opcional: sin marcar, la copia es la de siempre y no escribe manifiesto en la USB
+        self.sync_checkbox = QCheckBox("Sincronizar: copiar solo archivos nuevos o modificados")
+        self.sync_checkbox.setChecked(False)
+        options_layout.addWidget(self.sync_checkbox)
+        
+        self.delete_orphans_checkbox = QCheckBox("Borrar de la USB canciones que ya no están en la playlist")
+        self.delete_orphans_checkbox.setChecked(False)
+        options_layout.addWidget(self.delete_orphans_checkbox)
+        
+        self.verify_hash_checkbox = QCheckBox("Comparar contenido (más lento)")
+        self.verify_hash_checkbox.setChecked(False)
+        options_layout.addWidget(self.verify_hash_checkbox)
+        
+        self.sync_checkbox.toggled.connect(self.delete_orphans_checkbox.setEnabled)
+        self.sync_checkbox.toggled.connect(self.verify_hash_checkbox.setEnabled)
+        self.delete_orphans_checkbox.setEnabled(self.sync_checkbox.isChecked())
+        self.verify_hash_checkbox.setEnabled(self.sync_checkbox.isChecked())
+        
+        layout.addWidget(options_group)
+        
         # Botones
         button_layout = QHBoxLayout()
         self.ok_btn = QPushButton("Copiar")
@@ -84,7 +173,16 @@ class USBCopyDialog(QDialog):
             'album': self.album_edit.text().strip(),
             'genre': self.genre_edit.text().strip(),
             'comment': self.comment_edit.toPlainText().strip(),
-            'cover_path': self.cover_path_edit.text().strip()
+            'cover_path': self.cover_path_edit.text().strip(),
+            'cover_max_size': self.cover_size_spin.value(),
+            'streams': self.streams_spin.value(),
+            'copy_order': self.order_combo.currentData(),
+            'batch_small_files': self.batch_small_checkbox.isChecked(),
+            'trim_to_fit': self.trim_to_fit_checkbox.isChecked(),
+            'tag_on_copy': self.tag_on_copy_checkbox.isChecked(),
+            'sync': self.sync_checkbox.isChecked(),
+            'delete_orphans': self.sync_checkbox.isChecked() and self.delete_orphans_checkbox.isChecked(),
+            'verify_hash': self.sync_checkbox.isChecked() and self.verify_hash_checkbox.isChecked()
         }
 class USBCopyProgressDialog(QDialog):
     pause_state_changed = pyqtSignal(bool)  # Señal para pausa
@@ -104,6 +202,16 @@ class USBCopyProgressDialog(QDialog):
         self.main_label = QLabel("Preparando copia...")
         layout.addWidget(self.main_label)
         
+        # Orden planificado y duración estimada
+        self.plan_label = QLabel("")
+        layout.addWidget(self.plan_label)
+        
+        # Avisos (p.ej. archivos omitidos por falta de espacio)
+        self.warning_label = QLabel("")
+        self.warning_label.setStyleSheet("color: #e74c3c;")
+        self.warning_label.setWordWrap(True)
+        layout.addWidget(self.warning_label)
+        
         # Barra de progreso
         self.progress_bar = QProgressBar()
         self.progress_bar.setMinimum(0)
@@ -111,6 +219,11 @@ class USBCopyProgressDialog(QDialog):
         self.progress_bar.setValue(0)
         layout.addWidget(self.progress_bar)
         
+        # Bytes copiados, velocidad y tiempo restante
+        self.speed_label = QLabel("")
+        self.bytes_text = ""
+        layout.addWidget(self.speed_label)
+        
         # Etiqueta del archivo actual
         self.current_file_label = QLabel("")
         self.current_file_label.setWordWrap(True)
@@ -141,12 +254,87 @@ class USBCopyProgressDialog(QDialog):
         self.pause_state_changed.emit(self.is_paused)
     
     def update_progress(self, current, total, current_file):
-        percentage = int((current / total) * 100) if total > 0 else 0
-        self.progress_bar.setValue(percentage)
         if not self.is_paused:
             self.main_label.setText(f"Copiando... {current}/{total} archivos")
         self.current_file_label.setText(f"Archivo: {os.path.basename(current_file)}")
+    
+    def show_sync_summary(self, to_copy, unchanged, removed):
+        summary = f"{to_copy} archivos por copiar, {unchanged} sin cambios"
+        if removed:
+            summary += f", {removed} eliminados de la USB"
+        self.current_file_label.setText(summary)
+    
+    def show_plan(self, order, file_count, folder_count, estimated_seconds):
+        self.plan_label.setText(
+            f"{file_count} archivos en {folder_count} carpetas "
+            f"({COPY_ORDER_LABELS.get(order, order).lower()}) — "
+            f"tiempo estimado {format_duration(int(estimated_seconds))}")
+    
+    def show_trimmed(self, skipped, skipped_bytes):
+        self.warning_label.setText(
+            f"{skipped} archivos ({format_size(skipped_bytes)}) no caben en la USB y se omitirán")
+    
+    def update_bytes(self, bytes_done, total_bytes):
+        # La barra avanza por bytes, no por archivos, para que no dé saltos irregulares
+        percentage = int((bytes_done / total_bytes) * 100) if total_bytes > 0 else 0
+        self.progress_bar.setValue(percentage)
+        self.bytes_text = f"{format_size(bytes_done)} de {format_size(total_bytes)}"
+    
+    def update_throughput(self, bytes_per_second, eta_seconds):
+        text = self.bytes_text
+        if bytes_per_second > 0:
+            text += f" — {format_size(bytes_per_second)}/s"
+        if eta_seconds >= 0:
+            text += f" — quedan {format_duration(int(eta_seconds))}"
+        self.speed_label.setText(text)
+
 
+class DuplicatesDialog(QDialog):
+    """Lista los grupos de duplicados; aceptar elimina todas las copias menos la primera"""
+    
+    def __init__(self, groups, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Canciones duplicadas")
+        self.setModal(True)
+        self.resize(800, 500)
+        self.init_ui(groups)
+    
+    def init_ui(self, groups):
+        layout = QVBoxLayout(self)
+        
+        extra = sum(len(group.extra_songs) for group in groups)
+        wasted = sum(group.wasted_bytes for group in groups)
+        layout.addWidget(QLabel(
+            f"{len(groups)} grupos: {extra} copias sobrantes ({format_size(wasted)}). "
+            f"Se conserva la primera canción de cada grupo."))
+        
+        self.tree = QTreeWidget()
+        self.tree.setHeaderLabels(["Canción", "Destino", "Tamaño"])
+        self.tree.setUniformRowHeights(True)
+        for group in groups:
+            item = QTreeWidgetItem([
+                f"{DUPLICATE_REASON_LABELS.get(group.reason, group.reason)} — {len(group.songs)} copias",
+                "", format_size(group.wasted_bytes)])
+            for position, song in enumerate(group.songs):
+                child = QTreeWidgetItem([song.file_path, song.destination or "/", format_size(song.size)])
+                if position == 0:
+                    child.setText(0, f"{song.file_path} (se conserva)")
+                    child.setForeground(0, QBrush(QColor("#2ecc71")))
+                item.addChild(child)
+            self.tree.addTopLevelItem(item)
+        self.tree.expandAll()
+        self.tree.header().setSectionResizeMode(0, QHeaderView.Stretch)
+        layout.addWidget(self.tree)
+        
+        button_layout = QHBoxLayout()
+        self.remove_btn = QPushButton(f"Eliminar {extra} duplicados")
+        self.remove_btn.clicked.connect(self.accept)
+        self.close_btn = QPushButton("Cerrar")
+        self.close_btn.clicked.connect(self.reject)
+        button_layout.addStretch()
+        button_layout.addWidget(self.remove_btn)
+        button_layout.addWidget(self.close_btn)
+        layout.addLayout(button_layout)
 
 
 class PlaylistView(QMainWindow):
@@ -163,8 +351,14 @@ class PlaylistView(QMainWindow):
     new_playlist_requested = pyqtSignal()
     close_playlist_requested = pyqtSignal()
     copy_to_usb_requested = pyqtSignal(str, dict)
+    split_across_usbs_requested = pyqtSignal(str, str)  # capacidades en GB, ruta base de las playlists
     base_changed = pyqtSignal(bool)  # True = base 1024, False = base 1000
     pause_state_changed = pyqtSignal(bool)  # Nueva señal para pausa
+    cancel_scan_requested = pyqtSignal()
+    find_duplicates_requested = pyqtSignal(bool)  # True = confirmar con el hash completo
+    undo_requested = pyqtSignal()
+    redo_requested = pyqtSignal()
+    closing = pyqtSignal()  # La ventana se va a cerrar
     
     def __init__(self):
         super().__init__()
@@ -191,14 +385,26 @@ class PlaylistView(QMainWindow):
         load_action = QAction('Cargar Playlist', self)
         save_action = QAction('Guardar Playlist', self)
         close_action = QAction('Cerrar Playlist', self)
+        self.relative_paths_action = QAction('Guardar con rutas relativas', self)
+        self.relative_paths_action.setCheckable(True)
+        self.relative_paths_action.setToolTip("La playlist funciona en otro equipo si se copia junto con la música")
         copy_usb_action = QAction('Copiar a USB', self)
+        split_usb_action = QAction('Repartir en varias USB...', self)
+        duplicates_action = QAction('Buscar duplicados...', self)
+        self.full_hash_action = QAction('Comparar duplicados por contenido completo (lento)', self)
+        self.full_hash_action.setCheckable(True)
         
         file_menu.addAction(new_action)
         file_menu.addAction(load_action)
         file_menu.addAction(save_action)
         file_menu.addAction(close_action)
+        file_menu.addAction(self.relative_paths_action)
         file_menu.addSeparator()
         file_menu.addAction(copy_usb_action)
+        file_menu.addAction(split_usb_action)
+        file_menu.addSeparator()
+        file_menu.addAction(duplicates_action)
+        file_menu.addAction(self.full_hash_action)
         
         # Conectar acciones del menú
         new_action.triggered.connect(self.new_playlist_requested.emit)
@@ -206,19 +412,24 @@ class PlaylistView(QMainWindow):
         save_action.triggered.connect(self.save_playlist_requested.emit)
         close_action.triggered.connect(self.close_playlist_requested.emit)
         copy_usb_action.triggered.connect(self.on_copy_to_usb)
+        split_usb_action.triggered.connect(self.on_split_across_usbs)
+        duplicates_action.triggered.connect(
+            lambda: self.find_duplicates_requested.emit(self.full_hash_action.isChecked()))
         
-        # TreeWidget para mostrar canciones agrupadas
-        self.song_tree = QTreeWidget()
-        self.song_tree.setColumnCount(8)
-        self.song_tree.setHeaderLabels([
-            "Título", "Artista", "Álbum", "Género", 
-            "Ruta", "kbps", "Duración", "Tamaño"
-        ])
+        # Árbol para mostrar canciones agrupadas, respaldado por un modelo incremental
+        self.tree_model = PlaylistTreeModel(self)
+        self.song_tree = QTreeView()
+        self.song_tree.setModel(self.tree_model)
+        self.song_tree.setUniformRowHeights(True)
         
         # Configurar el árbol
         self.song_tree.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.song_tree.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.song_tree.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.song_tree.setSortingEnabled(True)
+        # El orden se aplica desde on_header_clicked para no ordenar dos veces
+        self.song_tree.setSortingEnabled(False)
+        self.song_tree.header().setSectionsClickable(True)
+        self.song_tree.header().setSortIndicatorShown(True)
         self.song_tree.header().setSectionsMovable(True)
         self.song_tree.header().setSectionResizeMode(QHeaderView.Interactive)
         
@@ -226,7 +437,7 @@ class PlaylistView(QMainWindow):
         self.song_tree.header().sectionClicked.connect(self.on_header_clicked)
         
         # Inicializar órdenes de clasificación (ascendente por defecto)
-        for i in range(self.song_tree.columnCount()):
+        for i in range(self.tree_model.columnCount()):
             self.sort_orders[i] = Qt.AscendingOrder
         
         # Información de la playlist
@@ -258,6 +469,11 @@ class PlaylistView(QMainWindow):
         size_layout.addWidget(self.size_label)
         self.size_value_label.setStyleSheet("font-weight: bold;")
         size_layout.addWidget(self.size_value_label)
+        size_layout.addSpacing(20)
+        size_layout.addWidget(QLabel("Duración total: "))
+        self.duration_value_label = QLabel("00:00")
+        self.duration_value_label.setStyleSheet("font-weight: bold;")
+        size_layout.addWidget(self.duration_value_label)
         size_layout.addStretch()
         
         # Información de espacio disponible
@@ -286,7 +502,10 @@ class PlaylistView(QMainWindow):
         
         # Conectar señales
         self.song_tree.customContextMenuRequested.connect(self.show_context_menu)
-        self.song_tree.itemSelectionChanged.connect(self.on_selection_changed)
+        self.song_tree.selectionModel().selectionChanged.connect(self.on_selection_changed)
+        # Los destinos nuevos aparecen expandidos; los existentes conservan su estado
+        self.tree_model.rowsInserted.connect(self.on_rows_inserted)
+        self.tree_model.modelReset.connect(self.song_tree.expandAll)
         
         # Habilitar drag and drop
         self.setAcceptDrops(True)
@@ -303,6 +522,23 @@ class PlaylistView(QMainWindow):
         
         self.copy_to_usb_requested.emit(usb_path, metadata_config)
     
+    def on_split_across_usbs(self):
+        """Pide las capacidades de las memorias y dónde guardar una playlist por memoria"""
+        capacities, ok = QInputDialog.getText(
+            self, "Repartir en varias USB",
+            "Capacidades en GB separadas por comas (p.ej. 16, 16, 32 o 3x16):"
+        )
+        if not ok or not capacities.strip():
+            return
+        
+        base_path = QFileDialog.getSaveFileName(
+            self, "Guardar playlists por USB", "", "Playlist Files (*.m3u)"
+        )[0]
+        if not base_path:
+            return
+        
+        self.split_across_usbs_requested.emit(capacities, base_path)
+    
     def get_usb_copy_config(self):
         """Muestra el diálogo para configurar la copia a USB"""
         dialog = USBCopyDialog(self)
@@ -332,6 +568,31 @@ class PlaylistView(QMainWindow):
             # Forzar actualización de la UI
             QApplication.processEvents()
     
+    def show_copy_sync_summary(self, to_copy, unchanged, removed):
+        """Muestra cuántos archivos se copiarán y cuántos ya estaban al día"""
+        if hasattr(self, 'progress_dialog') and self.progress_dialog:
+            self.progress_dialog.show_sync_summary(to_copy, unchanged, removed)
+    
+    def show_copy_plan(self, order, file_count, folder_count, estimated_seconds):
+        """Muestra el orden de copia planificado y la duración estimada"""
+        if hasattr(self, 'progress_dialog') and self.progress_dialog:
+            self.progress_dialog.show_plan(order, file_count, folder_count, estimated_seconds)
+    
+    def show_copy_trimmed(self, skipped, skipped_bytes):
+        """Avisa de los archivos que se omitirán por falta de espacio"""
+        if hasattr(self, 'progress_dialog') and self.progress_dialog:
+            self.progress_dialog.show_trimmed(skipped, skipped_bytes)
+    
+    def update_copy_bytes(self, bytes_done, total_bytes):
+        """Actualiza la barra de progreso según los bytes copiados"""
+        if hasattr(self, 'progress_dialog') and self.progress_dialog:
+            self.progress_dialog.update_bytes(bytes_done, total_bytes)
+    
+    def update_copy_throughput(self, bytes_per_second, eta_seconds):
+        """Muestra la velocidad de copia y el tiempo restante estimado"""
+        if hasattr(self, 'progress_dialog') and self.progress_dialog:
+            self.progress_dialog.update_throughput(bytes_per_second, eta_seconds)
+    
     def close_copy_progress(self):
         """Cierra el diálogo de progreso"""
         if hasattr(self, 'progress_dialog') and self.progress_dialog:
@@ -350,7 +611,11 @@ class PlaylistView(QMainWindow):
             self.sort_orders[column] = Qt.AscendingOrder
         
         # Ordenar por la columna seleccionada
-        self.song_tree.sortItems(column, self.sort_orders[column])
+        self.song_tree.sortByColumn(column, self.sort_orders[column])
+    
+    def closeEvent(self, event):
+        self.closing.emit()
+        super().closeEvent(event)
     
     def dragEnterEvent(self, event: QDragEnterEvent):
         if event.mimeData().hasUrls():
@@ -362,16 +627,20 @@ class PlaylistView(QMainWindow):
         self.files_dropped.emit(file_paths)
         event.acceptProposedAction()
     
+    def selected_rows(self):
+        """Índices (columna 0) de las filas seleccionadas en el árbol"""
+        return self.song_tree.selectionModel().selectedRows(0)
+    
     def show_context_menu(self, position):
         menu = QMenu()
-        selected_items = self.song_tree.selectedItems()
+        selected_rows = self.selected_rows()
         
-        if not selected_items:
+        if not selected_rows:
             return
         
         # Determinar si la selección incluye grupos o canciones individuales
-        has_groups = any(item.parent() is None for item in selected_items)
-        has_songs = any(item.parent() is not None for item in selected_items)
+        has_groups = any(self.tree_model.is_group(index) for index in selected_rows)
+        has_songs = any(not self.tree_model.is_group(index) for index in selected_rows)
         
         # Opciones para grupos
         if has_groups:
@@ -399,33 +668,33 @@ class PlaylistView(QMainWindow):
             delete_action.triggered.connect(self.delete_selected_requested.emit)
             menu.addAction(delete_action)
         
-        menu.exec_(self.song_tree.mapToGlobal(position))
+        menu.exec_(self.song_tree.viewport().mapToGlobal(position))
     
     def toggle_group_expansion(self):
-        selected_items = self.song_tree.selectedItems()
-        for item in selected_items:
-            if item.parent() is None:  # Es un grupo
-                item.setExpanded(not item.isExpanded())
+        for index in self.selected_rows():
+            if self.tree_model.is_group(index):  # Es un grupo
+                self.song_tree.setExpanded(index, not self.song_tree.isExpanded(index))
+    
+    def selected_group_name(self):
+        selected_rows = self.selected_rows()
+        if not selected_rows or not self.tree_model.is_group(selected_rows[0]):
+            return None
+        return self.tree_model.group_at(selected_rows[0]).name
     
     def on_rename_destination(self):
-        selected_items = self.song_tree.selectedItems()
-        if not selected_items or selected_items[0].parent() is not None:
+        old_destination = self.selected_group_name()
+        if old_destination is None:
             return
         
-        group_item = selected_items[0]
-        old_destination = group_item.text(0)
         new_dest = self.get_new_destination(old_destination)
         if new_dest:
             self.rename_destination_requested.emit(old_destination, new_dest)
     
     def on_delete_destination(self):
-        selected_items = self.song_tree.selectedItems()
-        if not selected_items or selected_items[0].parent() is not None:
+        destination = self.selected_group_name()
+        if destination is None:
             return
         
-        group_item = selected_items[0]
-        destination = group_item.text(0)
-        
         reply = QMessageBox.question(
             self, "Confirmar eliminación",
             f"¿Estás seguro de que quieres eliminar todas las canciones del destino '{destination}'?",
@@ -436,34 +705,26 @@ class PlaylistView(QMainWindow):
             self.remove_destination_requested.emit(destination)
     
     def on_change_destination(self):
-        selected_items = self.song_tree.selectedItems()
-        song_indices = []
-        
-        for item in selected_items:
-            if item.parent() is not None:  # Es una canción
-                if hasattr(item, 'song_index'):
-                    song_indices.append(item.song_index)
+        song_ids = self.get_selected_song_ids()
         
-        if song_indices:
+        if song_ids:
             # Pedir el nuevo destino
             new_dest = self.get_new_destination()
             if new_dest:
-                self.change_destination_requested.emit(song_indices, new_dest)
+                self.change_destination_requested.emit(song_ids, new_dest)
     
-    def get_selected_song_indices(self):
-        """Obtiene los índices de las canciones seleccionadas en el modelo"""
-        selected_items = self.song_tree.selectedItems()
-        indices = []
-        
-        for item in selected_items:
-            if hasattr(item, 'song_index') and item.song_index is not None:
-                indices.append(item.song_index)
-        
-        return indices
+    def get_selected_song_ids(self):
+        """Obtiene los ids de las canciones seleccionadas en el modelo"""
+        return [self.tree_model.song_at(index).song_id for index in self.selected_rows()
+                if not self.tree_model.is_group(index)]
     
-    def on_selection_changed(self):
-        selected_indices = self.get_selected_song_indices()
-        self.song_selection_changed.emit(selected_indices)
+    def on_selection_changed(self, selected=None, deselected=None):
+        self.song_selection_changed.emit(self.get_selected_song_ids())
+    
+    def on_rows_inserted(self, parent, first, last):
+        if not parent.isValid():
+            for row in range(first, last + 1):
+                self.song_tree.expand(self.tree_model.index(row, 0))
     
     def keyPressEvent(self, event):
         if event.key() == Qt.Key_Delete:
@@ -471,77 +732,33 @@ class PlaylistView(QMainWindow):
                 self.delete_unselected_requested.emit()
             else:
                 self.delete_selected_requested.emit()
+        elif event.key() == Qt.Key_Escape:
+            self.cancel_scan_requested.emit()
+        elif event.matches(QKeySequence.Undo):
+            self.undo_requested.emit()
+        elif event.matches(QKeySequence.Redo) or (
+                event.key() == Qt.Key_Y and event.modifiers() == Qt.ControlModifier):
+            # Ctrl+Y también en plataformas donde Rehacer es Ctrl+Shift+Z
+            self.redo_requested.emit()
         else:
             super().keyPressEvent(event)
     
+    def show_status(self, message, timeout=0):
+        """Mensaje en la barra de estado (timeout en ms, 0 = permanente)"""
+        self.statusBar().showMessage(message, timeout)
+    
+    def confirm_remove_duplicates(self, groups):
+        """Muestra los duplicados encontrados; devuelve True si se pidió eliminarlos"""
+        if not groups:
+            QMessageBox.information(self, "Canciones duplicadas", "No se encontraron duplicados")
+            return False
+        return DuplicatesDialog(groups, self).exec_() == QDialog.Accepted
+    
     def display_playlist(self, playlist):
-        self.song_tree.clear()
-        
-        # Limpiar los índices de canciones
-        self.song_indices_map = {}
-        
-        # Agrupar canciones por destino
-        songs_by_dest = playlist.get_songs_by_destination()
-        
-        # Crear grupos para cada destino
-        for destination, songs in songs_by_dest.items():
-            # Nombre del grupo (usar "/" para raíz)
-            group_name = destination if destination else "/"
-            
-            # Crear item de grupo
-            group_item = QTreeWidgetItem(self.song_tree)
-            group_item.setText(0, group_name)
-            group_item.setExpanded(True)  # Expandido por defecto
-            
-            # Aplicar color al grupo
-            bg_color, text_color = get_folder_color(destination)
-            for col in range(self.song_tree.columnCount()):
-                group_item.setBackground(col, QBrush(QColor(bg_color)))
-                group_item.setForeground(col, QBrush(QColor(text_color)))
-            
-            # Hacer que el grupo sea más visible
-            font = group_item.font(0)
-            font.setBold(True)
-            font.setPointSize(font.pointSize() + 1)
-            group_item.setFont(0, font)
-            
-            # Agregar canciones como hijos del grupo
-            for i, song in enumerate(songs):
-                song_item = QTreeWidgetItem(group_item)
-                
-                # Almacenar el índice de la canción en el modelo
-                song_index = playlist.songs.index(song)
-                song_item.song_index = song_index
-                self.song_indices_map[song_index] = song_item
-                
-                # Llenar las celdas con los datos de la canción
-                song_item.setText(0, song.title)
-                song_item.setText(1, song.artist)
-                song_item.setText(2, song.album)
-                song_item.setText(3, song.genre)
-                song_item.setText(4, song.file_path)
-                song_item.setText(5, str(song.bitrate))
-                song_item.setText(6, song.duration_formatted)
-                song_item.setText(7, song.size_formatted(self.base_1024))
-                
-                # Aplicar color más claro para las canciones
-                lighter_bg = self.lighten_color(bg_color)
-                for col in range(self.song_tree.columnCount()):
-                    song_item.setBackground(col, QBrush(QColor(lighter_bg)))
-                    song_item.setForeground(col, QBrush(QColor(text_color)))
-    
-    def lighten_color(self, hex_color, factor=0.3):
-        """Aclara un color hex"""
-        hex_color = hex_color.lstrip('#')
-        r = int(hex_color[0:2], 16)
-        g = int(hex_color[2:4], 16)
-        b = int(hex_color[4:6], 16)
-        
-        r = min(255, int(r + (255 - r) * factor))
-        g = min(255, int(g + (255 - g) * factor))
-        b = min(255, int(b + (255 - b) * factor))
-        
-        return f"#{r:02x}{g:02x}{b:02x}"
+        """Asocia el árbol al playlist; los cambios posteriores llegan como eventos"""
+        self.tree_model.set_base_1024(self.base_1024)
+        if self.tree_model.playlist is not playlist:
+            self.tree_model.set_playlist(playlist)
     
     def update_playlist_info(self, playlist):
         total_size_mb = playlist.total_size_mb(self.base_1024)
@@ -560,6 +777,9 @@ class PlaylistView(QMainWindow):
         # Actualizar labels (siempre en MB)
         self.usb_size_label.setText(f"{usb_size_gb} GB")
         self.size_value_label.setText(f"{total_size_mb:.2f} MB")
+        hours, seconds = divmod(playlist.total_duration, 3600)
+        self.duration_value_label.setText(
+            f"{hours} h {seconds // 60:02d} min" if hours else format_duration(seconds))
         self.space_value_label.setText(f"{available_mb:.2f} MB")
         
         # Actualizar barra de progreso
@@ -591,12 +811,20 @@ class PlaylistView(QMainWindow):
         else:
             QMessageBox.information(self, title, message)
     
+    def use_relative_paths(self):
+        return self.relative_paths_action.isChecked()
+    
     def get_save_filename(self):
-        return QFileDialog.getSaveFileName(
-            self, "Guardar Playlist", "", "Playlist Files (*.m3u)"
-        )[0]
+        file_path, selected_filter = QFileDialog.getSaveFileName(
+            self, "Guardar Playlist", "", f"Playlist Files (*.m3u);;{SESSION_FILTER}"
+        )
+        # La sesión guarda también tamaños y metadatos para reabrir al instante
+        if file_path and selected_filter == SESSION_FILTER and not os.path.splitext(file_path)[1]:
+            file_path += SESSION_EXTENSION
+        return file_path
     
     def get_load_filename(self):
         return QFileDialog.getOpenFileName(
-            self, "Cargar Playlist", "", "Playlist Files (*.m3u)"
+            self, "Cargar Playlist", "",
+            f"Playlist Files (*.m3u *.m3u8);;{SESSION_FILTER};;Todos (*.m3u *.m3u8 *{SESSION_EXTENSION})"
         )[0]
\ No newline at end of file